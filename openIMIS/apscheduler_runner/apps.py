@@ -1,7 +1,7 @@
 import logging
+import sys
 
 from apscheduler.schedulers.background import BackgroundScheduler
-# from apscheduler.executors.pool import ProcessPoolExecutor, ThreadPoolExecutor
 from django.conf import settings
 from django.apps import AppConfig
 from copy import deepcopy
@@ -19,14 +19,40 @@ class ApschedulerRunnerConfig(AppConfig):
         self.setup_module_scheduled_tasks()
 
     def setup_module_scheduled_tasks(self):
-        if settings.SCHEDULER_AUTOSTART:
+        # With SCHEDULER_DEDICATED, only the run_scheduler command runs the jobs, which starts its own scheduler
+        if settings.SCHEDULER_AUTOSTART and not settings.SCHEDULER_DEDICATED and not self.__is_scheduler_command():
             self._setup_scheduler_background_task()
 
+    @staticmethod
+    def __is_scheduler_command():
+        return sys.argv[1:2] == ["run_scheduler"]
+
     def _setup_scheduler_background_task(self):
+        self.create_scheduler()
+        self.scheduler.start()
+
+    def create_scheduler(self):
+        """The scheduler with the tasks of all the modules, not started"""
+        from .history import record_job_runs, schedule_purge, unschedule_purge
+
         self.scheduler = BackgroundScheduler(deepcopy(settings.SCHEDULER_CONFIG))
+        record_job_runs(self.scheduler, store=bool(settings.SCHEDULER_RUN_HISTORY_DAYS))
+        if settings.SCHEDULER_RUN_HISTORY_DAYS:
+            schedule_purge(self.scheduler)
+        else:
+            unschedule_purge(self.scheduler)
         for app in settings.OPENIMIS_APPS:
             self.__add_module_tasks_to_scheduler(app)
-        self.scheduler.start()
+        self.__apply_job_executors()
+        return self.scheduler
+
+    def __apply_job_executors(self):
+        for job_id, executor in settings.SCHEDULER_JOB_EXECUTORS.items():
+            if self.scheduler.get_job(job_id):
+                self.scheduler.modify_job(job_id, executor=executor)
+                logger.debug(f"{job_id} runs in the {executor} executor")
+            else:
+                logger.warning(f"SCHEDULER_JOB_EXECUTORS: no scheduled job {job_id}")
 
     def __add_module_tasks_to_scheduler(self, app_):
         spec = importlib.util.find_spec(f"{app_}.scheduled_tasks")
@@ -35,8 +61,8 @@ class ApschedulerRunnerConfig(AppConfig):
                 app = __import__(f"{app_}.scheduled_tasks")
                 app.scheduled_tasks.schedule_tasks(self.scheduler)
                 logger.debug(f"{app_} tasks scheduled")
-            except Exception as exc:
-                logger.debug(f"{app_}: unknown exception occurred during registering scheduled tasks: {exc}")
+            except Exception:
+                logger.exception(f"{app_}: unknown exception occurred during registering scheduled tasks")
         else:
             logger.debug(f"{app_} has no scheduled_tasks module, skipping")
         
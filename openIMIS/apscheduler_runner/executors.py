@@ -0,0 +1,94 @@
+"""
+Process pool executor of the scheduled jobs, so that the CPU heavy jobs don't take the GIL from the requests served by
+the same process. Selected with SCHEDULER_PROCESS_POOL_WORKERS, for the jobs added with executor="processpool" (or
+moved there with SCHEDULER_JOB_EXECUTORS).
+
+The worker processes are spawned (not forked from a process running threads and holding DB connections) and set up
+Django without starting a scheduler of their own. A job running longer than its timeout is interrupted by SIGALRM.
+"""
+import concurrent.futures
+import logging
+import multiprocessing
+import os
+import signal
+
+from apscheduler.executors.base import run_job
+from apscheduler.executors.pool import BasePoolExecutor
+
+try:
+    from concurrent.futures.process import BrokenProcessPool
+except ImportError:
+    BrokenProcessPool = None
+
+logger = logging.getLogger(__name__)
+
+
+class JobTimeout(Exception):
+    pass
+
+
+def _initialize_worker():
+    os.environ["SCHEDULER_AUTOSTART"] = "False"
+    import django
+    django.setup()
+
+
+def _raise_timeout(signum, frame):
+    raise JobTimeout("The job exceeded its timeout")
+
+
+def _run_job(job, jobstore_alias, run_times, logger_name, timeout):
+    from django.db import close_old_connections
+
+    close_old_connections()
+    if timeout:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.alarm(timeout)
+    try:
+        return run_job(job, jobstore_alias, run_times, logger_name)
+    finally:
+        if timeout:
+            signal.alarm(0)
+        close_old_connections()
+
+
+class DjangoProcessPoolExecutor(BasePoolExecutor):
+    """
+    :param max_workers: the maximum number of worker processes
+    :param timeout: seconds a job can run, 0 for no limit
+    :param job_timeouts: timeouts of specific jobs, by job id
+    """
+
+    def __init__(self, max_workers=4, timeout=0, job_timeouts=None):
+        self.max_workers = int(max_workers)
+        self.timeout = int(timeout)
+        self.job_timeouts = {job_id: int(seconds) for job_id, seconds in (job_timeouts or {}).items()}
+        if (self.timeout or self.job_timeouts) and not hasattr(signal, "SIGALRM"):
+            logger.warning("Job timeouts require SIGALRM, they are ignored on this platform")
+            self.timeout, self.job_timeouts = 0, {}
+        super().__init__(self._create_pool())
+
+    def _create_pool(self):
+        return concurrent.futures.ProcessPoolExecutor(
+            self.max_workers, mp_context=multiprocessing.get_context("spawn"), initializer=_initialize_worker
+        )
+
+    def _do_submit_job(self, job, run_times):
+        def callback(f):
+            exc = f.exception()
+            if exc:
+                self._run_job_error(job.id, exc, exc.__traceback__)
+            else:
+                self._run_job_success(job.id, f.result())
+
+        timeout = self.job_timeouts.get(job.id, self.timeout)
+        arguments = (_run_job, job, job._jobstore_alias, run_times, self._logger.name, timeout)
+        try:
+            f = self._pool.submit(*arguments)
+        except BrokenProcessPool:
+            # e.g. a worker killed by the OOM killer
+            self._logger.warning("Process pool is broken; replacing pool with a fresh instance")
+            self._pool = self._create_pool()
+            f = self._pool.submit(*arguments)
+
+        f.add_done_callback(callback)
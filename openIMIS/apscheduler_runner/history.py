@@ -0,0 +1,154 @@
+"""
+Run history of the scheduled jobs: each run (or missed run) of a job is stored as a JobRun, kept
+SCHEDULER_RUN_HISTORY_DAYS days, and exposed by the schedulerJobRuns query. The same listener feeds the metrics of
+the runs (durations, rows processed, runs not run), also when the history is disabled.
+
+A job reports the rows it processed by returning their number, or a dict with a "rows_processed" entry.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+from django.utils import timezone
+
+from openIMIS import metrics
+
+from .models import JobRun
+
+logger = logging.getLogger(__name__)
+
+PURGE_JOB_ID = "apscheduler_runner_purge_job_runs"
+
+JOB_ROWS = metrics.REGISTRY.register(metrics.Counter(
+    "openimis_scheduler_job_rows_total", "Rows processed by the scheduled jobs, as they report them", ("job",)
+))
+JOBS_NOT_RUN = metrics.REGISTRY.register(metrics.Counter(
+    "openimis_scheduler_jobs_not_run_total",
+    "Scheduled runs missed (past their misfire grace time) or skipped (max instances running)", ("job", "status"),
+))
+
+
+def rows_processed(retval):
+    if isinstance(retval, dict):
+        retval = retval.get("rows_processed")
+    if isinstance(retval, int) and not isinstance(retval, bool):
+        return retval
+    return None
+
+
+def _db_datetime(value):
+    if value is not None and not settings.USE_TZ and timezone.is_aware(value):
+        return timezone.make_naive(value)
+    return value
+
+
+def _save(**fields):
+    close_old_connections()
+    try:
+        JobRun.objects.create(**fields)
+    except DatabaseError as exc:
+        logger.warning(f"Failed to record the run of the job {fields['job_id']}: {exc}")
+
+
+def record_job_runs(scheduler, store=True):
+    """Records the runs of the jobs of an apscheduler scheduler in the metrics, and stores them (see JobRun) if store"""
+    from apscheduler.events import (
+        EVENT_JOB_ERROR, EVENT_JOB_EXECUTED, EVENT_JOB_MAX_INSTANCES, EVENT_JOB_MISSED, EVENT_JOB_SUBMITTED,
+    )
+
+    started = {}
+
+    def save(**fields):
+        if store:
+            _save(**fields)
+
+    def listener(event):
+        record(event)
+        metrics.REGISTRY.ensure_writer()
+
+    def record(event):
+        if event.code == EVENT_JOB_SUBMITTED:
+            for run_time in event.scheduled_run_times:
+                started[(event.job_id, run_time)] = (timezone.now(), time.monotonic())
+            return
+        if event.code == EVENT_JOB_MAX_INSTANCES:
+            for run_time in event.scheduled_run_times:
+                logger.warning(f"Skipped the run of {event.job_id} at {run_time}: its previous run is not finished")
+                JOBS_NOT_RUN.inc(job=event.job_id, status=JobRun.SKIPPED)
+                save(job_id=event.job_id, scheduled_time=_db_datetime(run_time), end_time=timezone.now(),
+                      status=JobRun.SKIPPED)
+            return
+        if event.code == EVENT_JOB_MISSED:
+            logger.warning(f"Missed the run of {event.job_id} at {event.scheduled_run_time}")
+            JOBS_NOT_RUN.inc(job=event.job_id, status=JobRun.MISSED)
+            save(job_id=event.job_id, scheduled_time=_db_datetime(event.scheduled_run_time),
+                  end_time=timezone.now(), status=JobRun.MISSED)
+            return
+
+        end_time = timezone.now()
+        start_time, start = started.pop((event.job_id, event.scheduled_run_time), (None, None))
+        if start_time is None:
+            # The submission event is dispatched once the job is submitted, a short job can end before it
+            start_time = _db_datetime(event.scheduled_run_time)
+            duration = max(0.0, time.time() - event.scheduled_run_time.timestamp())
+        else:
+            duration = time.monotonic() - start
+        if event.code == EVENT_JOB_ERROR:
+            status, rows, error = JobRun.ERROR, None, repr(event.exception)[:1000]
+        else:
+            status, rows, error = JobRun.SUCCESS, rows_processed(event.retval), None
+            if rows is not None:
+                JOB_ROWS.inc(rows, job=event.job_id)
+        metrics.SCHEDULER_JOB_DURATION.observe(duration, job=event.job_id, status=status)
+        save(
+            job_id=event.job_id,
+            scheduled_time=_db_datetime(event.scheduled_run_time),
+            start_time=start_time,
+            end_time=end_time,
+            duration=duration,
+            status=status,
+            rows_processed=rows,
+            error=error,
+        )
+
+    scheduler.add_listener(
+        listener,
+        EVENT_JOB_SUBMITTED | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED | EVENT_JOB_MAX_INSTANCES,
+    )
+
+
+def purge_job_runs():
+    """Deletes the runs older than SCHEDULER_RUN_HISTORY_DAYS"""
+    if not settings.SCHEDULER_RUN_HISTORY_DAYS:
+        return 0
+    deleted, _ = JobRun.objects.filter(
+        end_time__lt=timezone.now() - timedelta(days=settings.SCHEDULER_RUN_HISTORY_DAYS)
+    ).delete()
+    logger.info(f"Purged {deleted} scheduled job runs")
+    return deleted
+
+
+def schedule_purge(scheduler):
+    scheduler.add_job(
+        f"{__name__}:purge_job_runs", "cron", id=PURGE_JOB_ID, hour=2, minute=45, replace_existing=True,
+    )
+
+
+def unschedule_purge(scheduler):
+    """
+    Removes the purge job from the job store once the history is disabled: the job store only holds the jobs once the
+    scheduler is started
+    """
+    from apscheduler.events import EVENT_SCHEDULER_STARTED
+    from apscheduler.jobstores.base import JobLookupError
+
+    def remove_purge_job(event):
+        try:
+            scheduler.remove_job(PURGE_JOB_ID)
+            logger.info("Removed the purge job of the scheduled job runs, SCHEDULER_RUN_HISTORY_DAYS is 0")
+        except JobLookupError:
+            pass
+
+    scheduler.add_listener(remove_purge_job, EVENT_SCHEDULER_STARTED)
@@ -0,0 +1,79 @@
+"""
+Leader election of the scheduler processes (see the run_scheduler command): the leader holds a lock of the database
+for as long as its session lives, a PostgreSQL advisory lock or a SQL Server application lock. The lock is released
+when the leader stops or when its connection is lost (e.g. the process is killed), a standby process then takes over.
+
+The lock needs a session of its own on the database server for as long as it is held. A connection pooler in
+transaction mode (pgbouncer pool_mode=transaction) gives the server session back to its pool after each statement: the
+lock would be held by a session the other processes then use, and released by none. The lock is taken on the
+SCHEDULER_LOCK_DATABASE alias, which addresses the database itself when SCHEDULER_LOCK_DB_HOST is set (or use a pooler
+in session mode).
+"""
+import logging
+import zlib
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+LOCK_NAME = "openimis_scheduler"
+
+
+class SchedulerLock:
+    def __init__(self, name=LOCK_NAME, using=None):
+        self.name = name
+        self.using = using or settings.SCHEDULER_LOCK_DATABASE
+        self.connection = None
+
+    def acquire(self):
+        """Takes the lock if it is free, without waiting. Returns whether it is held"""
+        # A connection of its own, the lock must not be released by the close_old_connections() of the jobs
+        self.connection = connections.create_connection(self.using)
+        try:
+            with self.connection.cursor() as cursor:
+                acquired = self._try_lock(cursor)
+        except DatabaseError:
+            self.release()
+            raise
+        if not acquired:
+            self.release()
+        return acquired
+
+    def _try_lock(self, cursor):
+        vendor = self.connection.vendor
+        if vendor == "postgresql":
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", [zlib.crc32(self.name.encode())])
+            return cursor.fetchone()[0]
+        if vendor == "microsoft":
+            cursor.execute(
+                "SET NOCOUNT ON; DECLARE @result int; "
+                "EXEC @result = sp_getapplock @Resource = %s, @LockMode = 'Exclusive', @LockOwner = 'Session', "
+                "@LockTimeout = 0; SELECT @result",
+                [self.name],
+            )
+            return cursor.fetchone()[0] >= 0
+        logger.warning(f"No scheduler lock on {vendor} databases, make sure a single scheduler process is running")
+        return True
+
+    def is_held(self):
+        """The lock lives as long as the session that took it"""
+        if self.connection is None:
+            return False
+        try:
+            with self.connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            return True
+        except DatabaseError as exc:
+            logger.error(f"Lost the connection holding the scheduler lock: {exc}")
+            return False
+
+    def release(self):
+        if self.connection is None:
+            return
+        try:
+            # Closing the session releases its locks
+            self.connection.close()
+        except DatabaseError as exc:
+            logger.debug(f"Failed to close the connection of the scheduler lock: {exc}")
+        self.connection = None
@@ -0,0 +1,73 @@
+import logging
+import signal
+import threading
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError
+
+from apscheduler_runner.leader import SchedulerLock
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs the scheduled jobs of all the modules in this process. Several instances can run for availability: "
+        "a lock of the database elects the one running the jobs, the others wait to take over. "
+        "Set SCHEDULER_DEDICATED=True so that the web and Celery processes don't run them too. "
+        "The lock is held by a database session: behind a pooler in transaction mode (pgbouncer), set "
+        "SCHEDULER_LOCK_DB_HOST to reach the database directly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retry-interval", type=int, default=settings.SCHEDULER_LEADER_RETRY_SECONDS,
+            help="Seconds between the attempts to take the lock, and between the checks that it is still held",
+        )
+
+    def handle(self, *args, **options):
+        retry_interval = options["retry_interval"]
+        stop = threading.Event()
+
+        def request_stop(signum, frame):
+            logger.info(f"Received signal {signum}, stopping the scheduler")
+            stop.set()
+
+        signal.signal(signal.SIGTERM, request_stop)
+        signal.signal(signal.SIGINT, request_stop)
+
+        standby_logged = False
+        while not stop.is_set():
+            lock = SchedulerLock()
+            try:
+                acquired = lock.acquire()
+            except DatabaseError as exc:
+                logger.warning(f"Failed to take the scheduler lock: {exc}")
+                acquired = False
+            if not acquired:
+                if not standby_logged:
+                    logger.info("Another process runs the scheduler, standing by")
+                    standby_logged = True
+                stop.wait(retry_interval)
+                continue
+            standby_logged = False
+            self.__lead(lock, stop, retry_interval)
+
+    @staticmethod
+    def __lead(lock, stop, retry_interval):
+        logger.info("Took the scheduler lock, starting the scheduler")
+        scheduler = apps.get_app_config("apscheduler_runner").create_scheduler()
+        scheduler.start()
+        lost = False
+        try:
+            while not stop.wait(retry_interval):
+                if not lock.is_held():
+                    lost = True
+                    break
+        finally:
+            # Another process can take the lock as soon as the connection is lost, don't wait for the running jobs
+            scheduler.shutdown(wait=not lost)
+            lock.release()
+            logger.info("Scheduler stopped")
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobRun',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('job_id', models.CharField(max_length=191)),
+                ('scheduled_time', models.DateTimeField()),
+                ('start_time', models.DateTimeField(blank=True, null=True)),
+                ('end_time', models.DateTimeField()),
+                ('duration', models.FloatField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('success', 'Success'), ('error', 'Error'), ('missed', 'Missed'), ('skipped', 'Skipped')], max_length=8)),
+                ('rows_processed', models.IntegerField(blank=True, null=True)),
+                ('error', models.CharField(blank=True, max_length=1000, null=True)),
+            ],
+            options={
+                'ordering': ['-end_time'],
+                'indexes': [models.Index(fields=['job_id', '-end_time'], name='apscheduler_job_id_8c37c4_idx'), models.Index(fields=['end_time'], name='apscheduler_end_tim_5fc37f_idx')],
+            },
+        ),
+    ]
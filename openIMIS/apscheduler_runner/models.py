@@ -0,0 +1,33 @@
+from django.db import models
+
+
+class JobRun(models.Model):
+    """A run of a scheduled job, kept SCHEDULER_RUN_HISTORY_DAYS days (see history)"""
+    SUCCESS = "success"
+    ERROR = "error"
+    MISSED = "missed"
+    SKIPPED = "skipped"
+    STATUSES = (
+        (SUCCESS, "Success"),
+        (ERROR, "Error"),
+        (MISSED, "Missed"),
+        (SKIPPED, "Skipped"),
+    )
+
+    id = models.BigAutoField(primary_key=True)
+    job_id = models.CharField(max_length=191)
+    scheduled_time = models.DateTimeField()
+    # Null for the runs that didn't start (missed or skipped)
+    start_time = models.DateTimeField(null=True, blank=True)
+    end_time = models.DateTimeField()
+    duration = models.FloatField(null=True, blank=True)
+    status = models.CharField(max_length=8, choices=STATUSES)
+    rows_processed = models.IntegerField(null=True, blank=True)
+    error = models.CharField(max_length=1000, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["job_id", "-end_time"]),
+            models.Index(fields=["end_time"]),
+        ]
+        ordering = ["-end_time"]
@@ -0,0 +1,36 @@
+import graphene
+from django.core.exceptions import PermissionDenied
+from graphene_django import DjangoObjectType
+
+from .models import JobRun
+
+
+class JobRunGQLType(DjangoObjectType):
+    class Meta:
+        model = JobRun
+        fields = (
+            "job_id", "scheduled_time", "start_time", "end_time", "duration", "status", "rows_processed", "error",
+        )
+
+
+class Query(graphene.ObjectType):
+    scheduler_job_runs = graphene.List(
+        JobRunGQLType,
+        job_id=graphene.String(),
+        status=graphene.String(),
+        since=graphene.DateTime(),
+        first=graphene.Int(default_value=100),
+        description="Latest runs of the scheduled jobs, most recent first (administrators only)",
+    )
+
+    def resolve_scheduler_job_runs(self, info, job_id=None, status=None, since=None, first=100):
+        if not info.context.user.is_superuser:
+            raise PermissionDenied("Only the administrators can view the scheduled job runs")
+        runs = JobRun.objects.all()
+        if job_id:
+            runs = runs.filter(job_id=job_id)
+        if status:
+            runs = runs.filter(status=status.lower())
+        if since:
+            runs = runs.filter(end_time__gte=since)
+        return runs.order_by("-end_time")[:max(1, min(first, 1000))]
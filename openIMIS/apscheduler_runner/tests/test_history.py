@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta
+from unittest import mock
+
+from apscheduler.events import (
+    EVENT_JOB_ERROR, EVENT_JOB_EXECUTED, EVENT_JOB_MAX_INSTANCES, EVENT_JOB_MISSED, EVENT_JOB_SUBMITTED,
+    JobExecutionEvent, JobSubmissionEvent,
+)
+from apscheduler.schedulers.background import BackgroundScheduler
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from apscheduler_runner.history import (
+    PURGE_JOB_ID, purge_job_runs, record_job_runs, rows_processed, schedule_purge, unschedule_purge,
+)
+from apscheduler_runner.models import JobRun
+from apscheduler_runner.schema import Query
+from openIMIS import metrics
+
+
+class RecordJobRunsTest(TestCase):
+
+    def setUp(self):
+        scheduler = mock.Mock()
+        record_job_runs(scheduler)
+        self.listener = scheduler.add_listener.call_args[0][0]
+        self.run_time = timezone.now() - timedelta(seconds=1)
+
+    def test_success(self):
+        self.listener(JobSubmissionEvent(EVENT_JOB_SUBMITTED, "job", "default", [self.run_time]))
+        self.listener(JobExecutionEvent(
+            EVENT_JOB_EXECUTED, "job", "default", self.run_time, retval={"rows_processed": 42}
+        ))
+        run = JobRun.objects.get()
+        self.assertEqual((run.job_id, run.status, run.rows_processed, run.error), ("job", JobRun.SUCCESS, 42, None))
+        self.assertIsNotNone(run.start_time)
+        self.assertGreaterEqual(run.duration, 0)
+
+    def test_error_without_submission_event(self):
+        # A short job can end before its submission event is dispatched
+        self.listener(JobExecutionEvent(
+            EVENT_JOB_ERROR, "job", "default", self.run_time, exception=ValueError("boom")
+        ))
+        run = JobRun.objects.get()
+        self.assertEqual((run.status, run.error), (JobRun.ERROR, "ValueError('boom')"))
+        self.assertIsNotNone(run.start_time)
+
+    def test_missed_and_skipped(self):
+        self.listener(JobExecutionEvent(EVENT_JOB_MISSED, "job", "default", self.run_time))
+        self.listener(JobSubmissionEvent(EVENT_JOB_MAX_INSTANCES, "job", "default", [self.run_time]))
+        self.assertEqual(
+            sorted(JobRun.objects.values_list("status", flat=True)), sorted([JobRun.MISSED, JobRun.SKIPPED])
+        )
+
+    @mock.patch("openIMIS.metrics.ENABLED", True)
+    def test_metrics_without_history(self):
+        scheduler = mock.Mock()
+        record_job_runs(scheduler, store=False)
+        listener = scheduler.add_listener.call_args[0][0]
+        with mock.patch.object(metrics.SCHEDULER_JOB_DURATION, "observe") as observe:
+            listener(JobSubmissionEvent(EVENT_JOB_SUBMITTED, "job", "default", [self.run_time]))
+            listener(JobExecutionEvent(EVENT_JOB_EXECUTED, "job", "default", self.run_time))
+        observe.assert_called_once_with(mock.ANY, job="job", status=JobRun.SUCCESS)
+        self.assertFalse(JobRun.objects.exists())
+
+    def test_rows_processed(self):
+        self.assertEqual(rows_processed(3), 3)
+        self.assertEqual(rows_processed({"rows_processed": 4}), 4)
+        self.assertIsNone(rows_processed(True))
+        self.assertIsNone(rows_processed("5"))
+
+
+class PurgeJobRunsTest(TestCase):
+
+    def setUp(self):
+        for days in (1, 40):
+            run = JobRun.objects.create(
+                job_id="job", scheduled_time=datetime.now(), end_time=datetime.now(), status=JobRun.SUCCESS
+            )
+            JobRun.objects.filter(id=run.id).update(end_time=timezone.now() - timedelta(days=days))
+
+    @override_settings(SCHEDULER_RUN_HISTORY_DAYS=30)
+    def test_purge_old_runs(self):
+        self.assertEqual(purge_job_runs(), 1)
+        self.assertEqual(JobRun.objects.count(), 1)
+
+    @override_settings(SCHEDULER_RUN_HISTORY_DAYS=0)
+    def test_purge_disabled(self):
+        self.assertEqual(purge_job_runs(), 0)
+        self.assertEqual(JobRun.objects.count(), 2)
+
+    def test_purge_job_removed_when_disabled(self):
+        scheduler = BackgroundScheduler()
+        unschedule_purge(scheduler)
+        # Stands for the job persisted in the job store while the history was enabled
+        schedule_purge(scheduler)
+        scheduler.start(paused=True)
+        try:
+            self.assertIsNone(scheduler.get_job(PURGE_JOB_ID))
+        finally:
+            scheduler.shutdown(wait=False)
+
+
+class SchedulerJobRunsQueryTest(TestCase):
+
+    def test_first_is_clamped(self):
+        JobRun.objects.create(
+            job_id="job", scheduled_time=timezone.now(), end_time=timezone.now(), status=JobRun.SUCCESS
+        )
+        info = mock.Mock()
+        info.context.user.is_superuser = True
+        self.assertEqual(len(Query().resolve_scheduler_job_runs(info, first=-5)), 1)
@@ -0,0 +1,68 @@
+from unittest import mock
+
+from django.db import DatabaseError
+from django.test import SimpleTestCase, override_settings
+
+from apscheduler_runner.leader import SchedulerLock
+
+
+def _connection(vendor, result=None, error=None):
+    connection = mock.MagicMock(vendor=vendor)
+    cursor = connection.cursor.return_value.__enter__.return_value
+    cursor.fetchone.return_value = (result,)
+    cursor.execute.side_effect = error
+    return connection
+
+
+class SchedulerLockTest(SimpleTestCase):
+
+    def _acquire(self, connection):
+        lock = SchedulerLock()
+        with mock.patch("apscheduler_runner.leader.connections.create_connection", return_value=connection):
+            return lock, lock.acquire()
+
+    def test_postgresql_lock_taken(self):
+        connection = _connection("postgresql", True)
+        lock, acquired = self._acquire(connection)
+        self.assertTrue(acquired)
+        self.assertIs(lock.connection, connection)
+        cursor = connection.cursor.return_value.__enter__.return_value
+        self.assertIn("pg_try_advisory_lock", cursor.execute.call_args[0][0])
+
+    @override_settings(SCHEDULER_LOCK_DATABASE="scheduler_lock")
+    def test_lock_taken_on_the_lock_database(self):
+        with mock.patch("apscheduler_runner.leader.connections.create_connection") as create_connection:
+            create_connection.return_value = _connection("postgresql", True)
+            SchedulerLock().acquire()
+        create_connection.assert_called_once_with("scheduler_lock")
+
+    def test_postgresql_lock_held_by_another_process(self):
+        connection = _connection("postgresql", False)
+        lock, acquired = self._acquire(connection)
+        self.assertFalse(acquired)
+        self.assertIsNone(lock.connection)
+        connection.close.assert_called_once()
+
+    def test_sql_server_lock(self):
+        self.assertTrue(self._acquire(_connection("microsoft", 0))[1])
+        self.assertFalse(self._acquire(_connection("microsoft", -1))[1])
+
+    def test_other_databases_are_not_locked(self):
+        self.assertTrue(self._acquire(_connection("sqlite"))[1])
+
+    def test_connection_error_releases_the_connection(self):
+        connection = _connection("postgresql", error=DatabaseError("down"))
+        lock = SchedulerLock()
+        with mock.patch("apscheduler_runner.leader.connections.create_connection", return_value=connection):
+            with self.assertRaises(DatabaseError):
+                lock.acquire()
+        self.assertIsNone(lock.connection)
+
+    def test_lock_lost_with_the_connection(self):
+        connection = _connection("postgresql", True)
+        lock, _ = self._acquire(connection)
+        self.assertTrue(lock.is_held())
+        connection.cursor.return_value.__enter__.return_value.execute.side_effect = DatabaseError("lost")
+        self.assertFalse(lock.is_held())
+        lock.release()
+        self.assertFalse(lock.is_held())
@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class OpenIMISConfig(AppConfig):
+    """The instrumentation of the whole application (slow log, query budget, metrics), set up once the apps are loaded"""
+    name = 'openIMIS'
+
+    def ready(self):
+        from . import db_instrumentation, metrics
+        db_instrumentation.install()
+        metrics.install()
@@ -1,15 +1,19 @@
 from channels.auth import AuthMiddlewareStack
-import json
 import os
 import logging
 import django
 
 from channels.routing import ProtocolTypeRouter, URLRouter
+from channels.security.websocket import AllowedHostsOriginValidator, WebsocketDenier
 from importlib import import_module
+from urllib.parse import urlparse
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 from django.urls import path
 
+from .openimisconf import get_openimis_conf
+
 logger = logging.getLogger(__name__)
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'openIMIS.settings')
@@ -26,15 +30,9 @@ def SITE_ROOT():
         return "%s/" % root
 
 
-def load_openimis_conf():
-    conf_file_path = os.environ.get("OPENIMIS_CONF", "../openimis.json")
-    with open(conf_file_path) as conf_file:
-        return json.load(conf_file)
-
-
 def extract_websocket_urls(module):
     try:
-        module_import = import_module(F"{module['name']}.routing")
+        module_import = import_module(F"{module.name}.routing")
         module_routing = module_import.websocket_urlpatterns
 
         if module_routing is None:
@@ -43,27 +41,51 @@ def extract_websocket_urls(module):
 
     except ModuleNotFoundError as e:
         logger.log(level=logging.INFO,
-                   msg=F"Websocket routing for module {module['name']} not found, "
+                   msg=F"Websocket routing for module {module.name} not found, "
                        F"if you want to attach websocket endpoint add routing.py with websocket_urlpatterns "
                        F"to your module")
         return []
     except Exception as e:
         logger.log(level=logging.ERROR,
-                   msg=F"Failed to load websocket routing for module {module['name']}, reason:\n"
+                   msg=F"Failed to load websocket routing for module {module.name}, reason:\n"
                        F"{str(e)}")
         return []
 
 
 def openimis_websocket_endpoints():
-    OPENIMIS_CONF = load_openimis_conf()
-    module_routings_paths = map(extract_websocket_urls, OPENIMIS_CONF["modules"])
+    module_routings_paths = map(extract_websocket_urls, get_openimis_conf().modules)
     return [route for module_routings in module_routings_paths for route in module_routings if route]
 
 
+class SameOriginValidator:
+    """
+    Refuses the websockets opened by the pages of another site than the one they connect to. AllowedHostsOriginValidator
+    lets every page in with ALLOWED_HOSTS=["*"] (the default). The clients other than browsers don't send an Origin.
+    """
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        headers = dict(scope.get("headers", []))
+        origin = headers.get(b"origin")
+        host = headers.get(b"host", b"").decode("latin1")
+        if origin is not None and urlparse(origin.decode("latin1")).netloc != host:
+            return await WebsocketDenier()(scope, receive, send)
+        return await self.application(scope, receive, send)
+
+
+def websocket_origin_validator(application):
+    if "*" in settings.ALLOWED_HOSTS:
+        return SameOriginValidator(application)
+    return AllowedHostsOriginValidator(application)
+
 
 routings = openimis_websocket_endpoints()
 
 application = ProtocolTypeRouter({
     "http": get_asgi_application(),
-    "websocket": URLRouter(routings)
+    # The consumers authenticate the user with the session or JWT cookie, which the browsers send whatever page
+    # opens the websocket: only the pages of this site (or of ALLOWED_HOSTS) may open one
+    "websocket": websocket_origin_validator(AuthMiddlewareStack(URLRouter(routings)))
 })
@@ -0,0 +1,58 @@
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from graphql.language.parser import parse
+from graphql.utils.get_operation_ast import get_operation_ast
+
+logger = logging.getLogger(__name__)
+
+_query_executor = None
+
+
+def get_query_executor():
+    """
+    Thread pool used by the async GraphQL view to run read-only operations off the event loop.
+    Each thread keeps its own DB connection, so the pool size also bounds the connections used by queries.
+    """
+    global _query_executor
+    if _query_executor is None:
+        _query_executor = ThreadPoolExecutor(
+            max_workers=settings.GRAPHQL_ASYNC_QUERY_THREADS,
+            thread_name_prefix="graphql-query",
+        )
+    return _query_executor
+
+
+def is_read_only_operation(query, operation_name=None):
+    """
+    True when the operation selected in the document is a query. Unparsable documents are not considered read-only,
+    they are sent through the regular (thread sensitive) path which reports the syntax errors.
+    """
+    if not query:
+        return False
+    try:
+        operation = get_operation_ast(parse(query), operation_name)
+    except Exception:
+        return False
+    return operation is not None and operation.operation == "query"
+
+
+def async_resolver(resolver):
+    """
+    Allows a resolver to be written as a coroutine, e.g. to await remote services:
+
+        @async_resolver
+        async def resolve_remote_status(self, info, **kwargs):
+            ...
+
+    The coroutine runs on the server event loop when served by the async view, the ORM must still be used through
+    sync_to_async/database_sync_to_async from within the coroutine.
+    """
+    @functools.wraps(resolver)
+    def wrapper(*args, **kwargs):
+        return async_to_sync(resolver)(*args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,264 @@
+"""
+Two-tier cache backend: a small LRU in each process in front of a shared cache (Redis, memcached...), so the hot keys
+(e.g. the location trees) don't cost a network round trip on every read.
+
+The aliases of CACHE_TWO_TIER_ALIASES are wrapped in this backend by the settings. Django creates a cache instance per
+thread, the process tier of an alias is shared by all of them. A value is kept in the process for LOCAL_TIMEOUT seconds
+at most. The deletions, clear() and incr() replace the generation stored in the shared cache, which every process checks
+every GENERATION_CHECK_INTERVAL seconds: all its local values are dropped when it changed. A single delete() or incr()
+therefore flushes the process tier of the alias in every process, the aliases holding values deleted or incremented
+often (counters, invalidated entries) are better left out of CACHE_TWO_TIER_ALIASES.
+A value overwritten with set() can be served from the other processes until their copy expires (LOCAL_TIMEOUT).
+
+get_or_compute() protects the expensive computed values (aggregates, trees...) from cache stampedes.
+"""
+import logging
+import math
+import pickle
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.utils.module_loading import import_string
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = "__two_tier_generation__"
+
+LOCAL_HITS = metrics.REGISTRY.register(metrics.Counter(
+    "openimis_cache_local_hits_total", "Cache lookups served by the process tier of a two-tier cache", ("cache",)
+))
+
+
+class _ProcessTier:
+    def __init__(self):
+        self.entries = OrderedDict()  # key -> (expiry, pickled value)
+        self.lock = threading.Lock()
+        self.generation = None
+        self.generation_checked = 0
+
+
+_process_tiers = {}  # alias -> _ProcessTier
+_process_tiers_lock = threading.Lock()
+
+
+def _process_tier(alias):
+    with _process_tiers_lock:
+        return _process_tiers.setdefault(alias, _ProcessTier())
+
+
+class TwoTierCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        shared_params = dict(options["SHARED"])
+        self.shared = import_string(shared_params.pop("BACKEND"))(shared_params.pop("LOCATION", ""), shared_params)
+        self.alias = options.get("ALIAS", "")
+        self.local_max_entries = int(options.get("LOCAL_MAX_ENTRIES", 1000))
+        self.local_timeout = float(options.get("LOCAL_TIMEOUT", 5))
+        self.generation_check_interval = float(options.get("GENERATION_CHECK_INTERVAL", 1))
+        self._tier = _process_tier(self.alias)
+
+    # Process tier
+
+    def _check_generation(self):
+        tier = self._tier
+        now = time.monotonic()
+        if now - tier.generation_checked < self.generation_check_interval:
+            return
+        generation = self.shared.get(GENERATION_KEY)
+        with tier.lock:
+            if generation != tier.generation:
+                tier.entries.clear()
+                tier.generation = generation
+            tier.generation_checked = now
+
+    def _local_get(self, key):
+        tier = self._tier
+        with tier.lock:
+            entry = tier.entries.get(key)
+            if entry is None:
+                return self._missing_key
+            if entry[0] <= time.monotonic():
+                del tier.entries[key]
+                return self._missing_key
+            tier.entries.move_to_end(key)
+        LOCAL_HITS.inc(cache=self.alias)
+        return pickle.loads(entry[1])
+
+    def _local_set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        local_timeout = self.local_timeout if timeout is None else min(self.local_timeout, timeout)
+        if local_timeout <= 0:
+            self._local_delete(key)
+            return
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        tier = self._tier
+        with tier.lock:
+            tier.entries[key] = (time.monotonic() + local_timeout, pickled)
+            tier.entries.move_to_end(key)
+            while len(tier.entries) > self.local_max_entries:
+                tier.entries.popitem(last=False)
+
+    def _local_delete(self, key):
+        with self._tier.lock:
+            self._tier.entries.pop(key, None)
+
+    def _bump_generation(self):
+        # A new value rather than an increment, which would start over after a clear()
+        generation = uuid.uuid4().hex
+        self.shared.set(GENERATION_KEY, generation, timeout=None)
+        tier = self._tier
+        with tier.lock:
+            tier.entries.clear()
+            tier.generation = generation
+            tier.generation_checked = time.monotonic()
+
+    # Cache API
+
+    def get(self, key, default=None, version=None):
+        self._check_generation()
+        local_key = self.make_and_validate_key(key, version=version)
+        value = self._local_get(local_key)
+        if value is not self._missing_key:
+            return value
+        value = self.shared.get(key, self._missing_key, version=version)
+        if value is self._missing_key:
+            return default
+        self._local_set(local_key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        self._check_generation()
+        values = {}
+        missing = []
+        for key in keys:
+            value = self._local_get(self.make_and_validate_key(key, version=version))
+            if value is self._missing_key:
+                missing.append(key)
+            else:
+                values[key] = value
+        if missing:
+            shared_values = self.shared.get_many(missing, version=version)
+            for key, value in shared_values.items():
+                self._local_set(self.make_key(key, version=version), value)
+            values.update(shared_values)
+        return values
+
+    def has_key(self, key, version=None):
+        self._check_generation()
+        if self._local_get(self.make_and_validate_key(key, version=version)) is not self._missing_key:
+            return True
+        return self.shared.has_key(key, version=version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout=timeout, version=version)
+        self._local_set(self.make_and_validate_key(key, version=version), value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed_keys = self.shared.set_many(data, timeout=timeout, version=version)
+        for key, value in data.items():
+            if key not in failed_keys:
+                self._local_set(self.make_key(key, version=version), value, timeout)
+        return failed_keys
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout=timeout, version=version)
+        if added:
+            self._local_set(self.make_and_validate_key(key, version=version), value, timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout=timeout, version=version)
+
+    def delete(self, key, version=None):
+        deleted = self.shared.delete(key, version=version)
+        self._bump_generation()
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        self.shared.delete_many(keys, version=version)
+        self._bump_generation()
+
+    def incr(self, key, delta=1, version=None):
+        value = self.shared.incr(key, delta, version=version)
+        self._bump_generation()
+        return value
+
+    def decr(self, key, delta=1, version=None):
+        return self.incr(key, -delta, version=version)
+
+    def clear(self):
+        self.shared.clear()
+        self._bump_generation()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
+
+
+def get_or_compute(
+    key, compute, timeout, cache_alias="default", beta=1.0, lock_timeout=30, stale_timeout=None, wait_timeout=2,
+):
+    """
+    The cached value of compute(), recomputed by a single worker at a time:
+    - before it expires, each read recomputes it with a probability growing as the expiry gets closer and as the
+      computation gets longer (XFetch, beta > 1 favours earlier recomputations), so a hot value is usually refreshed
+      before it expires
+    - the worker recomputing it holds a lock key (for lock_timeout seconds at most), the others serve the current value,
+      which is kept stale_timeout seconds (timeout by default) after its expiry
+    - without value at all, the other workers wait for the one computing it, wait_timeout seconds at most (keep it
+      short on the request paths, a request shouldn't hang), then compute it themselves
+    """
+    cache = caches[cache_alias]
+    lock_key = f"{key}:lock"
+    entry = cache.get(key)
+    if entry is not None:
+        value, expiry, duration = entry
+        # 1 - random() is in ]0, 1], its log is <= 0
+        if time.time() - duration * beta * math.log(1 - random.random()) < expiry:
+            return value
+        if not cache.add(lock_key, 1, lock_timeout):
+            return value
+        try:
+            return _compute_and_store(cache, key, lock_key, compute, timeout, stale_timeout)
+        except Exception:
+            # The current value is still served until its stale expiry, the next reads retry the computation
+            logger.exception(f"Failed to recompute {key}, serving the current value")
+            return value
+
+    if cache.add(lock_key, 1, lock_timeout):
+        return _compute_and_store(cache, key, lock_key, compute, timeout, stale_timeout)
+    deadline = time.monotonic() + min(wait_timeout, lock_timeout)
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+    logger.warning(f"Gave up waiting for {key} to be computed by another worker, computing it")
+    # The lock is still another worker's, it isn't released
+    return _compute_and_store(cache, key, None, compute, timeout, stale_timeout)
+
+
+def _compute_and_store(cache, key, lock_key, compute, timeout, stale_timeout):
+    """
+    Computes and caches the value, then releases lock_key: the lock held by this call, None if it doesn't hold it.
+    """
+    try:
+        start = time.time()
+        value = compute()
+        duration = time.time() - start
+        stale_timeout = timeout if stale_timeout is None else stale_timeout
+        cache.set(key, (value, start + duration + timeout, duration), timeout + stale_timeout)
+        return value
+    finally:
+        # Releases the lock. Expiring it rather than deleting it, a deletion invalidates the process tiers of a
+        # two-tier cache
+        if lock_key is not None:
+            cache.touch(lock_key, 0)
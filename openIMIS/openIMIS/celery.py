@@ -1,4 +1,5 @@
 from __future__ import absolute_import, unicode_literals
+import fnmatch
 import os
 from celery import Celery
 
@@ -16,6 +17,39 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 # Load task modules from all registered Django app configs.
 app.autodiscover_tasks()
 
+DEFAULT_PRIORITY = 5
+MAX_PRIORITY = 9
+
+
+def _lookup(routes, name):
+    """The entry of the task: by name, then by the first matching pattern, then by module"""
+    if name in routes:
+        return routes[name]
+    for pattern, value in routes.items():
+        if fnmatch.fnmatchcase(name, pattern):
+            return value
+    return routes.get(name.split(".")[0])
+
+
+def route_task(name, args, kwargs, options, task=None, **kw):
+    """
+    Router of CELERY_TASK_ROUTES: queue and priority of the task from CELERY_QUEUE_ROUTES and CELERY_TASK_PRIORITIES.
+    The queue or priority given to apply_async() take precedence (a priority given there is passed as is to the broker).
+    """
+    from django.conf import settings
+
+    route = {}
+    queue = _lookup(settings.CELERY_QUEUE_ROUTES, name)
+    if queue:
+        route["queue"] = queue
+    priority = _lookup(settings.CELERY_TASK_PRIORITIES, name)
+    priority = DEFAULT_PRIORITY if priority is None else min(MAX_PRIORITY, max(0, int(priority)))
+    if app.conf.broker_url.startswith(("redis://", "rediss://")):
+        # 0 is the highest priority for Redis, the lowest for RabbitMQ
+        priority = MAX_PRIORITY - priority
+    route["priority"] = priority
+    return route
+
 
 @app.task(bind=True)
 def debug_task(self):
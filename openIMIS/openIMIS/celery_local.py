@@ -0,0 +1,56 @@
+"""
+Broker of CELERY_MODE=local: kombu's filesystem transport, each message being a file of the queue folder.
+kombu writes the message file in place, a worker listing the folder meanwhile can take it before it is complete: the
+messages are written to a temporary file first, then renamed into the queue folder.
+A worker takes a message by renaming it into the processed folder (in CELERY_LOCAL_DIR, on the same file system): a
+single worker can rename it, where kombu's move to the temporary folder of the host falls back to a copy and a delete
+across file systems, and two workers can then take the same message. The message is deleted once read, before the
+task runs: the tasks are delivered at most once.
+"""
+import os
+import uuid
+from queue import Empty
+from time import monotonic
+
+from kombu.exceptions import ChannelError
+from kombu.transport import filesystem
+from kombu.utils.encoding import bytes_to_str, str_to_bytes
+from kombu.utils.json import dumps, loads
+
+
+class Channel(filesystem.Channel):
+    def _put(self, queue, payload, **kwargs):
+        name = uuid.uuid4()
+        filename = os.path.join(self.data_folder_out, f"{int(round(monotonic() * 1000))}_{name}.{queue}.msg")
+        # Doesn't end with .<queue>.msg, the consumers skip it
+        temp_filename = os.path.join(self.data_folder_out, f".{name}.tmp")
+        try:
+            with open(temp_filename, "wb") as f:
+                f.write(str_to_bytes(dumps(payload)))
+            os.replace(temp_filename, filename)
+        except OSError as exc:
+            raise ChannelError(f"Cannot add file {filename!r} to directory: {exc}")
+
+    def _get(self, queue):
+        suffix = f".{queue}.msg"
+        for name in sorted(os.listdir(self.data_folder_in)):
+            if not name.endswith(suffix):
+                continue
+            filename = os.path.join(self.processed_folder, name)
+            try:
+                os.rename(os.path.join(self.data_folder_in, name), filename)
+            except OSError:
+                # Taken by another worker
+                continue
+            try:
+                with open(filename, "rb") as f:
+                    payload = f.read()
+                os.remove(filename)
+            except OSError as exc:
+                raise ChannelError(f"Cannot read file {filename!r} from queue: {exc}")
+            return loads(bytes_to_str(payload))
+        raise Empty()
+
+
+class Transport(filesystem.Transport):
+    Channel = Channel
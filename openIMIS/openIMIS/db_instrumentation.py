@@ -0,0 +1,245 @@
+"""
+Slow query and slow resolver log, DB statement spans for the tracer.
+
+Every SQL statement slower than DB_SLOW_QUERY_MS and every GraphQL resolver slower than GRAPHQL_SLOW_RESOLVER_MS is
+written as a JSON line to the openIMIS.slow_log logger, with the GraphQL operation and resolver path it ran for
+(see tracer.TracerMiddleware). Statements are grouped by fingerprint (the SQL without its literals): within each
+SLOW_LOG_SAMPLE_WINDOW seconds only the first occurrence of a fingerprint is logged, the next logged occurrence
+reports how many were skipped.
+
+The statements are also counted, per database for the metrics and per GraphQL operation (see collect_query_stats):
+the statements an operation repeats at least GRAPHQL_N_PLUS_ONE_THRESHOLD times (N+1 suspects) are attached to the
+trace, and GRAPHQL_QUERY_BUDGET_MODE warns about them and about the operations running more than GRAPHQL_QUERY_BUDGET
+statements ("warn") or fails those operations ("strict"). In strict mode the statements over the budget are refused as
+they are run (QueryBudgetExceeded), the GraphQL view rolls back a mutation going over it when it runs in a transaction
+(ATOMIC_MUTATIONS or ATOMIC_REQUESTS): otherwise its statements run before stay committed.
+"""
+import contextvars
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from . import metrics, tracer
+
+logger = logging.getLogger("openIMIS.slow_log")
+budget_logger = logging.getLogger(__name__)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+_PATH_INDEX = re.compile(r"\.\d+(?=\.|$)")
+# Never refused, a transaction must still be closed or rolled back once over the budget (Django's savepoints,
+# mssql-django's SAVE TRANSACTION)
+_TRANSACTION_CONTROL = ("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK", "SAVE TRANSACTION")
+
+_query_stats = contextvars.ContextVar("query_stats", default=None)
+
+_sampler_lock = threading.Lock()
+_sampler = {}  # fingerprint -> [window start, skipped occurrences]
+_sampler_pruned = time.monotonic()
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def fingerprint_sql(sql):
+    normalized = _STRING_LITERAL.sub("?", sql)
+    normalized = _NUMBER_LITERAL.sub("?", normalized)
+    normalized = _PLACEHOLDER_LIST.sub("(?+)", normalized)
+    normalized = _WHITESPACE.sub(" ", normalized).strip()
+    return hashlib.sha1(normalized.encode()).hexdigest()[:16]
+
+
+def _prune_sampler(now):
+    """
+    Drops the windows over for a whole SLOW_LOG_SAMPLE_WINDOW, once per window: the fingerprints (literals left in the
+    SQL, resolver paths) would otherwise pile up. A fingerprint not seen again in the window following its own loses its
+    count of skipped occurrences.
+    """
+    global _sampler_pruned
+    window_length = settings.SLOW_LOG_SAMPLE_WINDOW
+    if now - _sampler_pruned < window_length:
+        return
+    _sampler_pruned = now
+    for fingerprint in [key for key, window in _sampler.items() if now - window[0] >= 2 * window_length]:
+        del _sampler[fingerprint]
+
+
+def _sample(fingerprint):
+    """None if the occurrence should not be logged, the number of skipped occurrences otherwise"""
+    now = time.monotonic()
+    with _sampler_lock:
+        _prune_sampler(now)
+        window = _sampler.get(fingerprint)
+        if window is None or now - window[0] >= settings.SLOW_LOG_SAMPLE_WINDOW:
+            _sampler[fingerprint] = [now, 0]
+            return window[1] if window else 0
+        window[1] += 1
+        return None
+
+
+def _log(kind, fingerprint, duration_ms, **fields):
+    skipped = _sample(fingerprint)
+    if skipped is None:
+        return
+    entry = {
+        "ts": datetime.now().isoformat(),
+        "kind": kind,
+        "duration_ms": round(duration_ms, 1),
+        "fingerprint": fingerprint,
+        "operation": tracer.current_operation.get(),
+        "resolver": tracer.format_path(tracer.current_resolver_path.get()),
+        **fields,
+        "skipped": skipped,
+    }
+    logger.warning(json.dumps(entry, default=str))
+
+
+def log_slow_resolver(path, duration_ms):
+    if not settings.GRAPHQL_SLOW_RESOLVER_MS or duration_ms < settings.GRAPHQL_SLOW_RESOLVER_MS:
+        return
+    pattern = _PATH_INDEX.sub(".*", tracer.format_path(path))
+    _log("resolver", f"{tracer.current_operation.get()}:{pattern}", duration_ms)
+
+
+class QueryStats:
+    __slots__ = ("count", "statements")
+
+    def __init__(self):
+        self.count = 0
+        # SQL (with its parameters placeholders, the same for all the executions of an N+1) -> executions
+        self.statements = {}
+
+    def record(self, sql):
+        self.count += 1
+        self.statements[sql] = self.statements.get(sql, 0) + 1
+
+    def repeated_statements(self, threshold):
+        """(fingerprint, executions, sql) of the statements run at least threshold times, most executed first"""
+        if not threshold or self.count < threshold:
+            return []
+        by_fingerprint = {}
+        for sql, executions in self.statements.items():
+            entry = by_fingerprint.setdefault(fingerprint_sql(sql), [0, sql])
+            entry[0] += executions
+        repeated = [
+            (fingerprint, executions, sql)
+            for fingerprint, (executions, sql) in by_fingerprint.items()
+            if executions >= threshold
+        ]
+        return sorted(repeated, key=lambda statement: -statement[1])
+
+    def over_strict_budget(self):
+        """Whether the operation ran more statements than the budget, in strict mode"""
+        return (
+            settings.GRAPHQL_QUERY_BUDGET_MODE == "strict" and settings.GRAPHQL_QUERY_BUDGET
+            and self.count > settings.GRAPHQL_QUERY_BUDGET
+        )
+
+
+@contextmanager
+def collect_query_stats():
+    """Counts the SQL statements run in this context"""
+    stats = QueryStats()
+    token = _query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _query_stats.reset(token)
+
+
+def report_query_stats(operation_name, stats):
+    """Attaches the statements summary of a GraphQL operation to its trace and checks the query budget"""
+    repeated = stats.repeated_statements(settings.GRAPHQL_N_PLUS_ONE_THRESHOLD)
+    span = tracer.current_span()
+    if span is not None:
+        span.set_data("db.statements", stats.count)
+        if repeated:
+            span.set_data("db.repeated_statements", "\n".join(
+                f"{executions} x {fingerprint}: {sql[:200]}" for fingerprint, executions, sql in repeated
+            ))
+    if settings.GRAPHQL_QUERY_BUDGET_MODE == "off":
+        return
+    for fingerprint, executions, sql in repeated:
+        budget_logger.warning(
+            f"GraphQL operation {operation_name} ran {executions} times the statement {fingerprint}, "
+            f"probably once per item (N+1): {sql[:settings.SLOW_LOG_MAX_SQL_LENGTH]}"
+        )
+    if settings.GRAPHQL_QUERY_BUDGET and stats.count > settings.GRAPHQL_QUERY_BUDGET:
+        message = (
+            f"GraphQL operation {operation_name} ran {stats.count} SQL statements, "
+            f"over the budget of {settings.GRAPHQL_QUERY_BUDGET}"
+        )
+        if settings.GRAPHQL_QUERY_BUDGET_MODE == "strict":
+            raise QueryBudgetExceeded(message)
+        budget_logger.warning(message)
+
+
+def over_strict_budget():
+    """Whether the GraphQL operation being executed went over the budget, in strict mode"""
+    stats = _query_stats.get()
+    return stats is not None and stats.over_strict_budget()
+
+
+def query_wrapper(execute, sql, params, many, context):
+    stats = _query_stats.get()
+    if stats is not None:
+        stats.record(sql)
+        if stats.over_strict_budget() and not sql.lstrip().upper().startswith(_TRANSACTION_CONTROL):
+            raise QueryBudgetExceeded(
+                f"GraphQL operation {tracer.current_operation.get()} went over the budget of "
+                f"{settings.GRAPHQL_QUERY_BUDGET} SQL statements"
+            )
+    start = time.perf_counter()
+    try:
+        # Statements run outside of a traced request (scheduler, celery...) would each make a trace of their own
+        if tracer.DB_SPAN_BACKENDS and tracer.current_span() is not None:
+            with tracer.trace(op="db.query", description=sql[:settings.SLOW_LOG_MAX_SQL_LENGTH],
+                              backends=tracer.DB_SPAN_BACKENDS) as span:
+                span.set_tag("db", context["connection"].alias)
+                return execute(sql, params, many, context)
+        return execute(sql, params, many, context)
+    finally:
+        duration_ms = (time.perf_counter() - start) * 1000
+        metrics.DB_QUERIES.inc(db=context["connection"].alias)
+        if settings.DB_SLOW_QUERY_MS and duration_ms >= settings.DB_SLOW_QUERY_MS:
+            _log(
+                "sql",
+                fingerprint_sql(sql),
+                duration_ms,
+                db=context["connection"].alias,
+                many=many,
+                sql=sql[:settings.SLOW_LOG_MAX_SQL_LENGTH],
+            )
+
+
+def _install_wrapper(connection):
+    if query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_wrapper)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    _install_wrapper(connection)
+
+
+def install():
+    """Adds the query wrapper (slow log, DB spans and statement counts) to the current and future DB connections"""
+    if (
+        not settings.DB_SLOW_QUERY_MS and not tracer.DB_SPAN_BACKENDS and not metrics.ENABLED
+        and settings.GRAPHQL_QUERY_BUDGET_MODE == "off"
+    ):
+        return
+    connection_created.connect(_on_connection_created, dispatch_uid="openIMIS.query_wrapper")
+    for connection in connections.all(initialized_only=True):
+        _install_wrapper(connection)
@@ -0,0 +1,407 @@
+"""
+In-process metrics registry, exposed in the Prometheus text format on /metrics (see views.metrics).
+
+Counters and histograms are kept in memory by each process. With several worker processes (gunicorn), set
+METRICS_MULTIPROC_DIR: each process then writes its values to a file of that folder every METRICS_FLUSH_SECONDS and
+the process answering the scrape sums the files of all the processes. Callback gauges (e.g. the pending mutations) are
+computed by the process answering the scrape.
+The files are named after the pid and start of their process, a worker reusing the pid of a dead one doesn't overwrite
+its values. The process answering the scrape merges the files of the dead processes (of this host) into an archive
+file and removes them, so the counters never go down and the folder doesn't grow with the worker restarts.
+"""
+import atexit
+import bisect
+import glob
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: the files of the dead processes are kept, and still summed
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+ENABLED = settings.METRICS_ENABLED
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, math.inf)
+ARCHIVE_FILE = "metrics-archive.json"
+_PROCESS_FILE = re.compile(r"metrics-(\d+)-\d+\.json$")
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), self._copy(value)] for key, value in self._values.items()]
+
+    @staticmethod
+    def _copy(value):
+        return value
+
+    @staticmethod
+    def merge(value, other):
+        return value + other
+
+    def samples(self, values):
+        """(suffix, labels, value) of the exposition of the given values"""
+        raise NotImplementedError()
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        if not ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self, values):
+        for key, value in values.items():
+            yield "", dict(zip(self.labelnames, key)), value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        if not ENABLED:
+            return
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            # non cumulative count per bucket, then the sum of the observed values
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * (len(self.buckets) + 1)
+            entry[index] += 1
+            entry[-1] += value
+
+    @staticmethod
+    def _copy(value):
+        return list(value)
+
+    @staticmethod
+    def merge(value, other):
+        return [a + b for a, b in zip(value, other)]
+
+    def samples(self, values):
+        for key, entry in values.items():
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bucket, count in zip(self.buckets, entry):
+                cumulative += count
+                yield "_bucket", {**labels, "le": "+Inf" if bucket == math.inf else repr(float(bucket))}, cumulative
+            yield "_sum", labels, entry[-1]
+            yield "_count", labels, cumulative
+
+
+class CallbackGauge(Metric):
+    """A gauge computed when scraped, callback returns the value (or None to omit it)"""
+    type = "gauge"
+
+    def __init__(self, name, documentation, callback):
+        super().__init__(name, documentation)
+        self.callback = callback
+
+    def snapshot(self):
+        return []
+
+    def samples(self, values):
+        try:
+            value = self.callback()
+        except Exception as exc:
+            logger.debug(f"Failed to compute the metric {self.name}: {exc}")
+            return
+        if value is not None:
+            yield "", {}, value
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self._writer_pid = None
+        self._writer_lock = threading.Lock()
+        self._process_file = (None, None)  # pid, path
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def snapshot(self):
+        return {name: metric.snapshot() for name, metric in self.metrics.items() if metric.type != "gauge"}
+
+    def _process_file_path(self):
+        """The file of this process, keyed on its pid and start (the first write, a forked process gets its own)"""
+        pid, path = self._process_file
+        if pid != os.getpid():
+            pid = os.getpid()
+            path = os.path.join(settings.METRICS_MULTIPROC_DIR, f"metrics-{pid}-{time.time_ns()}.json")
+            self._process_file = (pid, path)
+        return path
+
+    def write_process_file(self):
+        path = self._process_file_path()
+        _write_json(path, self.snapshot())
+
+    def ensure_writer(self):
+        """Starts the thread writing the values of this process, once per process (it doesn't survive a fork)"""
+        if not settings.METRICS_MULTIPROC_DIR or self._writer_pid == os.getpid():
+            return
+        with self._writer_lock:
+            if self._writer_pid != os.getpid():
+                os.makedirs(settings.METRICS_MULTIPROC_DIR, exist_ok=True)
+                threading.Thread(target=self._write_periodically, name="metrics-writer", daemon=True).start()
+                self._writer_pid = os.getpid()
+
+    def _write_periodically(self):
+        while True:
+            time.sleep(settings.METRICS_FLUSH_SECONDS)
+            try:
+                self.write_process_file()
+            except OSError as exc:
+                logger.warning(f"Failed to write the metrics of the process: {exc}")
+
+    def collect(self):
+        """The values of all the processes, per metric name"""
+        if not settings.METRICS_MULTIPROC_DIR:
+            snapshots = [self.snapshot()]
+        else:
+            self.write_process_file()
+            try:
+                self.archive_dead_processes()
+            except OSError as exc:
+                logger.warning(f"Failed to archive the metrics of the dead processes: {exc}")
+            snapshots = [
+                _read_json(path) for path in glob.glob(os.path.join(settings.METRICS_MULTIPROC_DIR, "metrics-*.json"))
+            ]
+        return self._merge(snapshots)
+
+    def archive_dead_processes(self):
+        """Merges the files of the processes that exited into ARCHIVE_FILE, and removes them"""
+        if fcntl is None:
+            return
+        folder = settings.METRICS_MULTIPROC_DIR
+        dead = [path for path in glob.glob(os.path.join(folder, "metrics-*.json")) if _is_dead_process_file(path)]
+        if not dead:
+            return
+        # The processes answering the scrapes at the same time would overwrite each other's archive
+        with open(os.path.join(folder, "metrics.lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            # Already archived by another process meanwhile
+            dead = [path for path in dead if os.path.exists(path)]
+            if not dead:
+                return
+            archive_path = os.path.join(folder, ARCHIVE_FILE)
+            values = self._merge([_read_json(archive_path), *(_read_json(path) for path in dead)])
+            _write_json(archive_path, {
+                name: [[list(key), value] for key, value in entries.items()] for name, entries in values.items()
+            })
+            for path in dead:
+                os.remove(path)
+
+    def _merge(self, snapshots):
+        values = {name: {} for name in self.metrics}
+        for snapshot in snapshots:
+            for name, entries in snapshot.items():
+                metric = self.metrics.get(name)
+                if metric is None:
+                    continue
+                for key, value in entries:
+                    key = tuple(key)
+                    current = values[name].get(key)
+                    values[name][key] = value if current is None else metric.merge(current, value)
+        return values
+
+    def exposition(self):
+        lines = []
+        for name, values in self.collect().items():
+            metric = self.metrics[name]
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.type}")
+            for suffix, labels, value in metric.samples(values):
+                lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _is_dead_process_file(path):
+    """Whether the file is the one of a process which exited (not the archive)"""
+    match = _PROCESS_FILE.search(path)
+    if match is None:
+        return False
+    try:
+        os.kill(int(match.group(1)), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+
+def _read_json(path):
+    """The snapshot of a metrics file, empty if missing or being written"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as exc:
+        logger.debug(f"Skipping the metrics file {path}: {exc}")
+        return {}
+
+
+def _write_json(path, snapshot):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(snapshot, f)
+    os.replace(temp_path, path)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+REGISTRY = Registry()
+
+GRAPHQL_OPERATIONS = REGISTRY.register(Counter(
+    "openimis_graphql_operations_total", "GraphQL operations by operation name and status", ("operation", "status")
+))
+GRAPHQL_OPERATION_DURATION = REGISTRY.register(Histogram(
+    "openimis_graphql_operation_duration_seconds", "Duration of the GraphQL operations", ("operation",)
+))
+GRAPHQL_RESOLVER_DURATION = REGISTRY.register(Histogram(
+    "openimis_graphql_resolver_duration_seconds", "Duration of the GraphQL resolvers (except the default ones)",
+    ("field",)
+))
+GRAPHQL_DB_QUERIES = REGISTRY.register(Histogram(
+    "openimis_graphql_db_queries", "SQL statements run by a GraphQL operation", ("operation",),
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, math.inf),
+))
+DB_QUERIES = REGISTRY.register(Counter("openimis_db_queries_total", "SQL statements per database", ("db",)))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    "openimis_cache_requests_total", "Cache lookups by cache and result (hit or miss)", ("cache", "result")
+))
+SCHEDULER_JOB_DURATION = REGISTRY.register(Histogram(
+    "openimis_scheduler_job_duration_seconds", "Duration of the scheduled jobs by job and status", ("job", "status"),
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 300, 600, 1800, 3600, math.inf),
+))
+
+
+def _pending_mutations():
+    from core.models import MutationLog
+    return MutationLog.objects.filter(status=MutationLog.RECEIVED).count()
+
+
+PENDING_MUTATIONS = REGISTRY.register(CallbackGauge(
+    "openimis_mutations_pending", "Mutations received and not processed yet", _pending_mutations
+))
+
+
+# The operation names are chosen by the clients, the number of label values they can create is bounded
+MAX_OPERATION_LABELS = 500
+_operation_labels = set()
+_operation_labels_lock = threading.Lock()
+
+
+def _operation_label(operation_name, status):
+    """The name of the operation once validated (the name of an operation of a valid document), "other" otherwise"""
+    if status == "invalid":
+        return "other"
+    if not operation_name:
+        return "anonymous"
+    with _operation_labels_lock:
+        if operation_name not in _operation_labels:
+            if len(_operation_labels) >= MAX_OPERATION_LABELS:
+                return "other"
+            _operation_labels.add(operation_name)
+    return operation_name
+
+
+def record_graphql_operation(operation_name, status, duration, db_queries):
+    if not ENABLED:
+        return
+    operation = _operation_label(operation_name, status)
+    GRAPHQL_OPERATIONS.inc(operation=operation, status=status)
+    GRAPHQL_OPERATION_DURATION.observe(duration, operation=operation)
+    GRAPHQL_DB_QUERIES.observe(db_queries, operation=operation)
+    REGISTRY.ensure_writer()
+
+
+_MISSING = object()
+
+
+def _instrument_cache(cache, alias):
+    get, get_many = cache.get, cache.get_many
+
+    def instrumented_get(key, default=None, version=None):
+        value = get(key, _MISSING, version=version)
+        if value is _MISSING:
+            CACHE_REQUESTS.inc(cache=alias, result="miss")
+            return default
+        CACHE_REQUESTS.inc(cache=alias, result="hit")
+        return value
+
+    def instrumented_get_many(keys, version=None):
+        keys = list(keys)
+        values = get_many(keys, version=version)
+        CACHE_REQUESTS.inc(len(values), cache=alias, result="hit")
+        CACHE_REQUESTS.inc(len(keys) - len(values), cache=alias, result="miss")
+        return values
+
+    cache.get, cache.get_many = instrumented_get, instrumented_get_many
+    return cache
+
+
+def _instrument_caches():
+    from django.core.cache import caches
+
+    create_connection = caches.create_connection
+
+    def create_instrumented_connection(alias):
+        return _instrument_cache(create_connection(alias), alias)
+
+    caches.create_connection = create_instrumented_connection
+
+
+def install():
+    """Counts the cache lookups, the SQL statements are counted by db_instrumentation"""
+    if not ENABLED:
+        return
+    _instrument_caches()
+    if settings.METRICS_MULTIPROC_DIR:
+        atexit.register(REGISTRY.write_process_file)
@@ -1,19 +1,22 @@
+import hashlib
+import importlib.util
+import json
 import os
 import logging
-from importlib import resources
+import tempfile
 
-from .openimisconf import load_openimis_conf
+from .openimisconf import get_openimis_conf
 
 logger = logging.getLogger(__name__)
 
-
-def extract_app(module):
-    return "%s" % (module["name"])
+# Set LOCALE_PATHS_CACHE_FILE to an empty string to look the locale folders up at every start
+LOCALE_PATHS_CACHE_FILE = os.environ.get(
+    "LOCALE_PATHS_CACHE_FILE", os.path.join(tempfile.gettempdir(), "openimis-locale-paths.json")
+)
 
 
 def openimis_apps():
-    OPENIMIS_CONF = load_openimis_conf()
-    apps = [*map(extract_app, OPENIMIS_CONF["modules"])]
+    apps = get_openimis_conf().module_names
 
     # Add PEP+ module dynamically if it exists (for development)
     if os.path.exists('/app/openimis-be-pep_plus_py') and 'pep_plus' not in apps:
@@ -22,23 +25,77 @@ def openimis_apps():
     return apps
 
 
+def _module_dirs(mod_name):
+    """
+    Returns the package directory of the module and the directory it is installed in (site-packages or the folder
+    of the repository for editable installs), without importing the module
+    """
+    spec = importlib.util.find_spec(mod_name)
+    if spec is None or not spec.origin:
+        logger.error(f"Module \"{mod_name}\" not found.")
+        raise ModuleNotFoundError(f"Module \"{mod_name}\" not found.", name=mod_name)
+    package_dir = os.path.dirname(spec.origin)
+    return package_dir, os.path.dirname(package_dir)
+
+
+def _locale_cache_key(modules, app_dirs, package_dirs):
+    # The pip requirements pin the module versions. Installing, upgrading or removing a package also changes the mtime
+    # of the directory it's installed in, editing the root of a package (e.g. adding its locale folder) changes the
+    # mtime of its package directory. The working directory is only keyed by path: it may hold the cache file itself.
+    key = hashlib.sha1(os.path.abspath(".").encode())
+    for mod in modules:
+        key.update(f"{mod.name}={mod.pip or ''};".encode())
+    for path in [*app_dirs, *package_dirs]:
+        key.update(f"{os.path.abspath(path)}:{os.stat(path).st_mtime_ns};".encode())
+    return key.hexdigest()
+
+
+def _read_locale_cache(cache_key):
+    try:
+        with open(LOCALE_PATHS_CACHE_FILE) as cache_file:
+            cache = json.load(cache_file)
+        if cache.get("key") == cache_key:
+            return cache["paths"]
+    except (OSError, ValueError, KeyError):
+        pass
+    return None
+
+
+def _write_locale_cache(cache_key, paths):
+    tmp_path = f"{LOCALE_PATHS_CACHE_FILE}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w") as cache_file:
+            json.dump({"key": cache_key, "paths": paths}, cache_file)
+        os.replace(tmp_path, LOCALE_PATHS_CACHE_FILE)
+    except OSError as exc:
+        logger.warning(f"Locale folders cache couldn't be written to {LOCALE_PATHS_CACHE_FILE}: {exc}")
+
+
 def get_locale_folders():
     """
     Get locale folders for the modules in a reverse order to make it easy to override the translations
+    The folders are looked up once and kept in LOCALE_PATHS_CACHE_FILE until a module is installed or changed.
     """
     apps = []
+    package_dirs = []
     basedirs = []
     seen_paths = set()  # Track seen paths to avoid duplicates
 
-    for mod in load_openimis_conf()["modules"]:
-        mod_name = mod["name"]
-        try:
-            with resources.path(mod_name, "__init__.py") as path:
-                apps.append(path.parent.parent)
-        except ModuleNotFoundError:
-            raise logger.error(f"Module \"{mod_name}\" not found.")
+    modules = get_openimis_conf().modules
+    for mod in modules:
+        package_dir, app_dir = _module_dirs(mod.name)
+        package_dirs.append(package_dir)
+        apps.append(app_dir)
+
+    topdirs = ["."] + apps
+    cache_key = None
+    if LOCALE_PATHS_CACHE_FILE:
+        cache_key = _locale_cache_key(modules, apps, package_dirs)
+        cached_paths = _read_locale_cache(cache_key)
+        if cached_paths is not None:
+            return cached_paths
 
-    for topdir in ["."] + apps:
+    for topdir in topdirs:
         for dirpath, dirnames, filenames in os.walk(topdir, topdown=True):
             for dirname in dirnames:
                 if dirname == "locale":
@@ -47,4 +104,7 @@ def get_locale_folders():
                     if locale_path not in seen_paths:
                         basedirs.insert(0, locale_path)
                         seen_paths.add(locale_path)
+
+    if cache_key:
+        _write_locale_cache(cache_key, basedirs)
     return basedirs
@@ -1,17 +1,75 @@
+"""
+openimis.json: the list of openIMIS modules to install and load.
+
+The configuration is read once per process by get_openimis_conf(), from (in that order):
+- OPENIMIS_CONF_JSON, when it holds the JSON document itself (the Docker build uses it as a file name instead),
+- the file OPENIMIS_CONF points to,
+- ../openimis.json
+This module is also used by the scripts, outside of Django: it must only depend on the standard library.
+"""
+import functools
 import json
 import os
-import io
-
-def load_openimis_conf( conf_file_param = "../openimis.json" ):
-    conf_json_env = os.environ.get("OPENIMIS_CONF_JSON", "")
-    conf_file_path = os.environ.get("OPENIMIS_CONF", conf_file_param)
-    if not conf_file_param:
-        if conf_json_env:
-            conf_json_env = io.StringIO(conf_json_env) 
-        elif conf_file_path:
-            with open(conf_file_path) as conf_file:
-                return json.load(conf_file)
-    else:
-        with open(conf_file_param) as conf_file:
-            return json.load(conf_file)
+from dataclasses import dataclass
+
+DEFAULT_CONF_FILE = "../openimis.json"
+
+
+@dataclass(frozen=True)
+class OpenIMISModule:
+    name: str
+    pip: str = None
+
+
+class OpenIMISConf:
+    def __init__(self, raw, source):
+        self.raw = raw
+        self.source = source
+        self.modules = tuple(OpenIMISModule(name=module["name"], pip=module.get("pip")) for module in raw["modules"])
+
+    @property
+    def module_names(self):
+        return [module.name for module in self.modules]
+
+    def __repr__(self):
+        return f"<OpenIMISConf {self.source}: {', '.join(self.module_names)}>"
+
+
+def validate_openimis_conf(raw, source):
+    if not isinstance(raw, dict) or not isinstance(raw.get("modules"), list):
+        raise ValueError(f"{source}: expected an object with a \"modules\" list")
+    names = set()
+    for index, module in enumerate(raw["modules"]):
+        if not isinstance(module, dict) or not isinstance(module.get("name"), str) or not module["name"]:
+            raise ValueError(f"{source}: module #{index} has no \"name\"")
+        if module["name"] in names:
+            raise ValueError(f"{source}: module \"{module['name']}\" is declared twice")
+        names.add(module["name"])
+    return raw
+
+
+def _read_conf_file(conf_file_path):
+    with open(conf_file_path) as conf_file:
+        return validate_openimis_conf(json.load(conf_file), conf_file_path)
+
+
+@functools.lru_cache(maxsize=None)
+def get_openimis_conf():
+    """
+    The parsed and validated openimis.json, shared by the whole process.
+    Call get_openimis_conf.cache_clear() to read it again.
+    """
+    conf_json_env = os.environ.get("OPENIMIS_CONF_JSON", "").strip()
+    if conf_json_env.startswith("{"):
+        return OpenIMISConf(validate_openimis_conf(json.loads(conf_json_env), "OPENIMIS_CONF_JSON"), "OPENIMIS_CONF_JSON")
+    conf_file_path = os.environ.get("OPENIMIS_CONF", DEFAULT_CONF_FILE)
+    return OpenIMISConf(_read_conf_file(conf_file_path), conf_file_path)
+
 
+def load_openimis_conf(conf_file_param=None):
+    """
+    openimis.json as a dict, either the process configuration (see get_openimis_conf) or the given file
+    """
+    if conf_file_param:
+        return _read_conf_file(conf_file_param)
+    return get_openimis_conf().raw
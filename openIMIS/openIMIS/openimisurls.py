@@ -1,13 +1,12 @@
 from django.urls import include, path
 
-from .openimisconf import load_openimis_conf
+from .openimisconf import get_openimis_conf
 from .settings import SITE_ROOT
 
 
 def extract_url(module):
-    return path('%s%s/' % (SITE_ROOT(), module["name"]), include('%s.urls' % module["name"]))
+    return path('%s%s/' % (SITE_ROOT(), module.name), include('%s.urls' % module.name))
 
 
 def openimis_urls():
-    OPENIMIS_CONF = load_openimis_conf()
-    return [*map(extract_url, OPENIMIS_CONF["modules"])]
+    return [*map(extract_url, get_openimis_conf().modules)]
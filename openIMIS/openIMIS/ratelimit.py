@@ -0,0 +1,362 @@
+"""
+Token bucket rate limiting of the GraphQL endpoint, shared by all the worker processes.
+
+Each client (the user of a valid JWT or session, the IP address otherwise) has a bucket per root field listed in
+RATELIMIT_OPERATION_RATES and one bucket for all the other operations, refilled at RATELIMIT_RATE. A bucket holds up to
+the number of requests of its rate (the burst). Each root field of RATELIMIT_OPERATION_RATES selected by a request takes
+a token from its bucket, each operation selecting other fields takes one from the common bucket.
+The buckets are stored by RATELIMIT_BACKEND:
+- local: in a SQLite database in shared memory (RATELIMIT_LOCAL_PATH), for the processes of a single host
+- redis: in Redis (RATELIMIT_REDIS_URL), updated by a Lua script, for a cluster
+"""
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.exceptions import ImproperlyConfigured
+from django.http import JsonResponse
+from graphql.language import ast
+from graphql.language.parser import parse
+from graphql_jwt.settings import jwt_settings
+from graphql_jwt.utils import get_http_authorization, get_payload
+
+from . import metrics
+
+try:
+    import redis
+except ModuleNotFoundError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+_PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+# Bounds the memory of the caches below, whatever the clients send
+_CACHE_SIZE = 4096
+# How long a session is trusted once validated, a logout can take that long to end its bucket
+_SESSION_CACHE_SECONDS = 60
+
+RATE_LIMITED = metrics.REGISTRY.register(metrics.Counter(
+    "openimis_ratelimited_requests_total", "GraphQL requests refused by the rate limiter, by operation", ("operation",)
+))
+
+
+def parse_rate(rate):
+    """'150/m' -> (150 requests, 60 seconds), the period can be a multiple: '10/5m'"""
+    count, period = rate.split("/")
+    multiplier, unit = re.fullmatch(r"(\d*)([smhd])", period.strip()).groups()
+    return int(count), int(multiplier or 1) * _PERIODS[unit]
+
+
+class RateLimitBackend:
+    def take(self, key, capacity, refill_rate, cost):
+        """
+        Takes cost tokens from the bucket (capacity tokens, refilled by refill_rate tokens per second).
+        Returns 0 if they were available, the number of seconds to wait until they are otherwise.
+        """
+        raise NotImplementedError()
+
+    def give_back(self, key, capacity, refill_rate, cost):
+        """Puts back cost tokens taken from the bucket, it doesn't fill up beyond its capacity"""
+        self.take(key, capacity, refill_rate, -cost)
+
+
+class LocalBackend(RateLimitBackend):
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        # SQLite connections can't be used after a fork
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=OFF")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS bucket (key TEXT PRIMARY KEY, tokens REAL, updated REAL, expires REAL)"
+            )
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def take(self, key, capacity, refill_rate, cost):
+        connection = self._connection()
+        now = time.time()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute("SELECT tokens, updated FROM bucket WHERE key = ?", (key,)).fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + max(0, now - row[1]) * refill_rate)
+            wait = 0 if tokens >= cost else (cost - tokens) / refill_rate
+            if not wait:
+                tokens = min(capacity, tokens - cost)
+            # Once full again, the bucket is the same as a missing one
+            expires = now + (capacity - tokens) / refill_rate
+            connection.execute(
+                "INSERT INTO bucket (key, tokens, updated, expires) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated, "
+                "expires = excluded.expires",
+                (key, tokens, now, expires),
+            )
+            if random.random() < 0.001:
+                connection.execute("DELETE FROM bucket WHERE expires < ?", (now,))
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return wait
+
+
+class RedisBackend(RateLimitBackend):
+    # Uses the Redis clock so that all the servers share the same time (replicate_commands: Redis < 5 refuses writes
+    # after TIME otherwise)
+    SCRIPT = """
+        redis.replicate_commands()
+        local capacity = tonumber(ARGV[1])
+        local refill_rate = tonumber(ARGV[2])
+        local cost = tonumber(ARGV[3])
+        local time = redis.call("TIME")
+        local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+        local bucket = redis.call("HMGET", KEYS[1], "tokens", "updated")
+        local tokens = capacity
+        if bucket[1] then
+            tokens = math.min(capacity, tonumber(bucket[1]) + math.max(0, now - tonumber(bucket[2])) * refill_rate)
+        end
+        local wait = 0
+        if tokens >= cost then
+            tokens = math.min(capacity, tokens - cost)
+        else
+            wait = (cost - tokens) / refill_rate
+        end
+        redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "updated", tostring(now))
+        redis.call("EXPIRE", KEYS[1], math.ceil((capacity - tokens) / refill_rate) + 1)
+        return tostring(wait)
+    """
+
+    def __init__(self, url):
+        if redis is None:
+            raise ImproperlyConfigured("The redis rate limit backend requires the redis package")
+        self.client = redis.Redis.from_url(url, socket_timeout=1)
+        self.script = self.client.register_script(self.SCRIPT)
+
+    def take(self, key, capacity, refill_rate, cost):
+        return float(self.script(keys=[f"ratelimit:{key}"], args=[capacity, refill_rate, cost]))
+
+
+def load_backend(name):
+    if name == "local":
+        return LocalBackend(settings.RATELIMIT_LOCAL_PATH)
+    if name == "redis":
+        return RedisBackend(settings.RATELIMIT_REDIS_URL)
+    raise ImproperlyConfigured(f"Unknown rate limit backend {name}, expected local or redis")
+
+
+class _BoundedCache:
+    """Values by key, expiring, the least recently used ones dropped beyond _CACHE_SIZE"""
+
+    def __init__(self):
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._values[key]
+                return None
+            self._values.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, expires):
+        with self._lock:
+            self._values[key] = (value, expires)
+            self._values.move_to_end(key)
+            while len(self._values) > _CACHE_SIZE:
+                self._values.popitem(last=False)
+
+
+_validated_clients = _BoundedCache()
+_root_fields_cache = _BoundedCache()
+
+
+def _digest(value):
+    return hashlib.sha1(value.encode()).hexdigest()
+
+
+def _jwt_client(request):
+    token = get_http_authorization(request)
+    if not token:
+        return None
+    key = f"jwt:{_digest(token)}"
+    client = _validated_clients.get(key)
+    if client is None:
+        try:
+            payload = get_payload(token)
+        except Exception as exc:
+            # Any invalid token, the client is then identified by its address
+            logger.debug(f"Rate limiter ignoring an invalid JWT: {exc}")
+            return None
+        username = jwt_settings.JWT_PAYLOAD_GET_USERNAME_HANDLER(payload)
+        if not username:
+            return None
+        client = f"user:{username}"
+        _validated_clients.set(key, client, payload.get("exp") or time.time() + _SESSION_CACHE_SECONDS)
+    return client
+
+
+def _session_client(request):
+    session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not session_key:
+        return None
+    key = f"session:{_digest(session_key)}"
+    client = _validated_clients.get(key)
+    if client is None:
+        # The rate limiter runs before the SessionMiddleware, the session is loaded here
+        user_id = import_module(settings.SESSION_ENGINE).SessionStore(session_key).get(SESSION_KEY)
+        # "" for a session without user (anonymous, expired...), so that it isn't loaded on every request either
+        client = "" if user_id is None else f"user-id:{user_id}"
+        _validated_clients.set(key, client, time.time() + _SESSION_CACHE_SECONDS)
+    return client or None
+
+
+def _client_id(request):
+    """
+    The authenticated user, the client address otherwise. The token or session of the request is validated: a client
+    making up a new one on each request doesn't get a new bucket each time.
+    """
+    return _jwt_client(request) or _session_client(request) or f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def _collect_fields(selection_set, fragments, names, visited):
+    for selection in selection_set.selections:
+        if isinstance(selection, ast.Field):
+            names.append(selection.name.value)
+        elif isinstance(selection, ast.InlineFragment):
+            _collect_fields(selection.selection_set, fragments, names, visited)
+        elif isinstance(selection, ast.FragmentSpread):
+            name = selection.name.value
+            if name in fragments and name not in visited:
+                _collect_fields(fragments[name].selection_set, fragments, names, visited | {name})
+
+
+def _root_fields(query, operation_name):
+    """
+    Names of the root fields selected by the executed operation of the document (not their aliases, chosen by the
+    client). Empty if the document is invalid, it isn't executed then.
+    """
+    key = f"{_digest(query)}:{operation_name}"
+    fields = _root_fields_cache.get(key)
+    if fields is not None:
+        return fields
+    try:
+        document = parse(query)
+    except Exception:
+        return ()
+    operations = [
+        definition for definition in document.definitions if isinstance(definition, ast.OperationDefinition)
+    ]
+    if operation_name:
+        operations = [
+            operation for operation in operations if operation.name and operation.name.value == operation_name
+        ]
+    fields = []
+    if len(operations) == 1:
+        fragments = {
+            definition.name.value: definition
+            for definition in document.definitions if isinstance(definition, ast.FragmentDefinition)
+        }
+        _collect_fields(operations[0].selection_set, fragments, fields, frozenset())
+    fields = tuple(fields)
+    _root_fields_cache.set(key, fields, math.inf)
+    return fields
+
+
+def _operation_fields(entry):
+    if not isinstance(entry, dict) or not isinstance(entry.get("query"), str):
+        return ()
+    operation_name = entry.get("operationName")
+    return _root_fields(entry["query"], operation_name if isinstance(operation_name, str) else None)
+
+
+def _request_operations(request):
+    """The root fields of each operation of the request"""
+    if request.method == "GET":
+        return [_operation_fields(request.GET)]
+    if request.content_type == "application/graphql":
+        return [_operation_fields({"query": request.body.decode("utf-8", "replace")})]
+    if request.content_type != "application/json":
+        return [_operation_fields(request.POST)]
+    try:
+        body = json.loads(request.body)
+    except ValueError:
+        return [()]
+    return [_operation_fields(entry) for entry in body] if isinstance(body, list) else [_operation_fields(body)]
+
+
+class TokenBucketRateLimitMiddleware:
+    """Replaces core.middleware.GraphQLRateLimitMiddleware when RATELIMIT_BACKEND is set"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.backend = load_backend(settings.RATELIMIT_BACKEND)
+        self.default_rate = parse_rate(settings.RATELIMIT_RATE)
+        self.operation_rates = {
+            operation: parse_rate(rate) for operation, rate in settings.RATELIMIT_OPERATION_RATES.items()
+        }
+        root = f"/{settings.SITE_ROOT()}graphql"
+        self.paths = (root, f"{root}/batch")
+
+    def __call__(self, request):
+        if request.path in self.paths:
+            wait = self._take(request)
+            if wait:
+                response = JsonResponse({"detail": "Rate limit exceeded"}, status=429)
+                response["Retry-After"] = str(math.ceil(wait))
+                return response
+        return self.get_response(request)
+
+    def _take(self, request):
+        client = _client_id(request)
+        costs = {}
+        for fields in _request_operations(request):
+            budgeted = [field for field in fields if field in self.operation_rates]
+            for field in budgeted:
+                costs[field] = costs.get(field, 0) + 1
+            if not fields or len(budgeted) < len(fields):
+                costs["*"] = costs.get("*", 0) + 1
+        wait = 0
+        taken = []
+        for bucket, cost in costs.items():
+            count, period = self.operation_rates.get(bucket, self.default_rate)
+            bucket_args = (f"{client}:{bucket}", count, count / period, cost)
+            try:
+                bucket_wait = self.backend.take(*bucket_args)
+            except Exception as exc:
+                # Better to serve the requests than to refuse them all when the store is down
+                logger.warning(f"Rate limit backend {settings.RATELIMIT_BACKEND} failed: {exc}")
+                return 0
+            if bucket_wait:
+                RATE_LIMITED.inc(operation=bucket)
+                wait = max(wait, bucket_wait)
+            else:
+                taken.append(bucket_args)
+        if wait:
+            # The refused request isn't served, it doesn't use the tokens of the buckets which had enough
+            for bucket_args in taken:
+                try:
+                    self.backend.give_back(*bucket_args)
+                except Exception as exc:
+                    logger.warning(f"Rate limit backend {settings.RATELIMIT_BACKEND} failed: {exc}")
+        return wait
@@ -1,23 +1,165 @@
+import contextvars
+import functools
+import hashlib
+import logging
+import random
+import time
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from graphql_jwt.settings import jwt_settings
+
+logger = logging.getLogger(__name__)
+
 DASHBOARD_DATABASE = "dashboard_db"
 
 
+@functools.lru_cache(maxsize=None)
+def _dashboard_db_models():
+    """(app_label, model_name) of the models the apps declare in their AppConfig.dashboard_db_models"""
+    return frozenset(
+        (app_config.label, model_name.lower())
+        for app_config in apps.get_app_configs()
+        for model_name in getattr(app_config, "dashboard_db_models", [])
+    )
+
+
+def _dashboard_database():
+    # Without a dashboard_db, the reporting models are kept in the default database
+    return DASHBOARD_DATABASE if DASHBOARD_DATABASE in settings.DATABASES else "default"
+
+
 class DashboardDatabaseRouter:
+    def _is_dashboard_model(self, model):
+        return (model._meta.app_label, model._meta.model_name) in _dashboard_db_models()
+
     def db_for_read(self, model, **hints):
         if model._meta.app_label == "dashboard_etl":
             return DASHBOARD_DATABASE
+        if self._is_dashboard_model(model):
+            return _dashboard_database()
         return None
 
     def db_for_write(self, model, **hints):
         if model._meta.app_label == "dashboard_etl":
             return DASHBOARD_DATABASE
+        if self._is_dashboard_model(model):
+            return _dashboard_database()
         return None
 
     def allow_relation(self, obj1, obj2, **hints):
         if obj1._meta.app_label == "dashboard_etl" or obj2._meta.app_label == "dashboard_etl":
             return True
+        if self._is_dashboard_model(obj1) and self._is_dashboard_model(obj2):
+            return True
         return None
 
     def allow_migrate(self, db, app_label, model_name=None, **hints):
         if app_label == "dashboard_etl":
             return db == DASHBOARD_DATABASE
+        if (app_label, model_name) in _dashboard_db_models():
+            return db == _dashboard_database()
+        return None
+
+
+class ReplicaDatabaseRouter:
+    """
+    Sends the reads of the code running within read_from_replica() to one of the settings.DB_REPLICAS,
+    everything else (writes, migrations, reads outside of GraphQL queries) stays on the primary.
+    """
+    def db_for_read(self, model, **hints):
+        return _read_replica.get()
+
+    def db_for_write(self, model, **hints):
         return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the same data as the primary
+        databases = {"default", *settings.DB_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DB_REPLICAS:
+            return False
+        return None
+
+
+_read_replica = contextvars.ContextVar("read_replica", default=None)
+_replica_checks = {}  # alias -> (time of the check, usable)
+
+
+def _client_key(request):
+    # A client is identified by its token (or session) rather than by its user: the user of a JWT request is only
+    # known once the GraphQL middleware has run
+    token = request.META.get("HTTP_AUTHORIZATION") or request.COOKIES.get(jwt_settings.JWT_COOKIE_NAME)
+    if not token and getattr(request, "session", None) is not None:
+        token = request.session.session_key
+    if not token:
+        return None
+    return "db_replica_sticky_%s" % hashlib.sha1(token.encode()).hexdigest()
+
+
+def mark_primary_sticky(request):
+    """
+    Makes the following queries of the client read from the primary for DB_REPLICA_STICKY_SECONDS, in every process
+    (DB_REPLICA_STICKY_CACHE is shared)
+    """
+    if not settings.DB_REPLICAS or not settings.DB_REPLICA_STICKY_SECONDS:
+        return
+    key = _client_key(request)
+    if key:
+        caches[settings.DB_REPLICA_STICKY_CACHE].set(key, True, settings.DB_REPLICA_STICKY_SECONDS)
+
+
+def _replica_lag(alias):
+    replica = connections[alias]
+    if replica.vendor != "postgresql":
+        return 0
+    with replica.cursor() as cursor:
+        # Once the replica replayed everything it received, it is up to date even if the last transaction is old
+        cursor.execute(
+            "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+            "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+        )
+        return float(cursor.fetchone()[0] or 0)
+
+
+def _is_replica_usable(alias):
+    checked_at, usable = _replica_checks.get(alias, (None, True))
+    now = time.monotonic()
+    if checked_at is None or now - checked_at > settings.DB_REPLICA_LAG_CHECK_SECONDS:
+        try:
+            lag = _replica_lag(alias)
+            usable = lag <= settings.DB_REPLICA_MAX_LAG_SECONDS
+            if not usable:
+                logger.warning(f"Database replica {alias} is {lag:.1f}s behind, reading from the primary")
+        except Exception as exc:
+            usable = False
+            logger.warning(f"Database replica {alias} is not available, reading from the primary: {exc}")
+        _replica_checks[alias] = (now, usable)
+    return usable
+
+
+def choose_replica(request):
+    """The replica to read from for this request, None to stay on the primary"""
+    if not settings.DB_REPLICAS:
+        return None
+    key = _client_key(request)
+    if key and caches[settings.DB_REPLICA_STICKY_CACHE].get(key):
+        return None
+    replicas = [alias for alias in settings.DB_REPLICAS if _is_replica_usable(alias)]
+    return random.choice(replicas) if replicas else None
+
+
+@contextmanager
+def read_from_replica(alias):
+    token = _read_replica.set(alias)
+    try:
+        yield
+    finally:
+        _read_replica.reset(token)
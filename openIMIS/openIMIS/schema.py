@@ -1,62 +1,74 @@
+import importlib
+import time
+
 import graphene
 
 from core.models import Language
+from django.conf import settings
 from django.utils import translation
 
 from .openimisapps import openimis_apps
+from . import startup_trace
 from graphene_django.debug import DjangoDebug
 
 import logging
 
 logger = logging.getLogger(__name__)
 
-all_apps = openimis_apps()
-queries = []
-mutations = []
-bind_signals = []
-for app in all_apps:
+# Seconds spent importing the schema of each module and building the graphene.Schema, see build timings in the log
+SCHEMA_BUILD_TIMINGS = {"modules": {}, "schema": None}
+
+
+def _import_app_schema(app):
+    # If we only __import__ the module, the schema is not loaded and .schema will fail. Adding an import to force
+    # Python to load it would work but not from __init__.py because Django models are not loaded yet at that point.
+    # This code is executed on first access to the Graphene API
     try:
-        # If we only __import__ the module, the schema is not loaded and .schema will fail. Adding an import to force
-        # Python to load it would work but not from __init__.py because Django models are not loaded yet at that point.
-        # Importing claim.schema still returns the claim module but it forces the loading of schema.
-        # This code is executed on first access to the Graphene API
-        schema = __import__(f"{app}.schema")
-        if hasattr(schema.schema, "Query"):
-            queries.append(schema.schema.Query)
-            logger.debug(f"{app} queries loaded")
-        if hasattr(schema.schema, "bind_signals"):
-            bind_signals.append(schema.schema.bind_signals)
-            logger.debug(f"{app} signals bound")
+        return importlib.import_module(f"{app}.schema")
     except ModuleNotFoundError as exc:
-        # The module doesn't have a schema.py, just skip
-        logger.debug(f"{app} has no schema module, skipping")
-    except AttributeError as exc:
+        if exc.name == f"{app}.schema":
+            # The module doesn't have a schema.py, just skip
+            logger.debug(f"{app} has no schema module, skipping")
+        else:
+            logger.debug(f"{app} schema module couldn't be imported, skipping", exc_info=exc)
+    except AttributeError:
         logger.debug(f"{app} queries couldn't be loaded")
         raise  # This can be hiding actual compilation errors
     except Exception as exc:
-        logger.debug(f"{app} exception", exc)
+        logger.debug(f"{app} exception", exc_info=exc)
+    return None
 
-    try:
-        schema_module = __import__(f"{app}.schema")
-        if hasattr(schema_module.schema, "Mutation"):
-            mutation = schema_module.schema.Mutation
-            if mutation:
-                mutations.append(mutation)
-                logger.debug(f"{app} mutations loaded")
-        else:
-            logger.debug(f"{app} has a schema module but no Mutation class")
-    except ModuleNotFoundError as exc:
-        # The module doesn't have a schema.py, just skip
-        logger.debug(f"{app} has no schema module (mutation), skipping")
-    except AttributeError as exc:
-        # The module doesn't have a Query or Mutation, just ignore
-        logger.debug(f"{app} has a schema module and Mutation but failed nonetheless")
 
-    for binder in bind_signals:
+queries = []
+mutations = []
+bind_signals = []
+for app in [*openimis_apps(), *settings.GRAPHQL_SCHEMA_EXTRA_APPS]:
+    import_start = time.perf_counter()
+    with startup_trace.phase("schema.import", app):
+        schema_module = _import_app_schema(app)
+    SCHEMA_BUILD_TIMINGS["modules"][app] = time.perf_counter() - import_start
+    if schema_module is None:
+        continue
+    if hasattr(schema_module, "Query"):
+        queries.append(schema_module.Query)
+        logger.debug(f"{app} queries loaded")
+    if getattr(schema_module, "Mutation", None):
+        mutations.append(schema_module.Mutation)
+        logger.debug(f"{app} mutations loaded")
+    else:
+        logger.debug(f"{app} has a schema module but no Mutation class")
+    if hasattr(schema_module, "bind_signals"):
+        bind_signals.append(schema_module.bind_signals)
+
+# Bound once all the schemas are loaded, each binder exactly once
+for binder in bind_signals:
+    with startup_trace.phase("schema.bind_signals", binder.__module__):
         binder()
+    logger.debug(f"{binder.__module__} signals bound")
 
 
 class Query(*queries, graphene.ObjectType):
+    # Resolved by DjangoDebugMiddleware in DEV mode or for the staff users (see views.GraphQLView), null otherwise
     debug = graphene.Field(DjangoDebug, name="_debug")
     node = graphene.relay.Node.Field()
 
@@ -77,5 +89,18 @@ class GQLUserLanguageMiddleware:
         return next_middleware(root, info, **kwargs)
 
 
-# noinspection PyTypeChecker
-schema = graphene.Schema(query=Query, mutation=Mutation if len(mutations) > 0 else None)
+schema_start = time.perf_counter()
+with startup_trace.phase("schema.build"):
+    # noinspection PyTypeChecker
+    schema = graphene.Schema(query=Query, mutation=Mutation if len(mutations) > 0 else None)
+SCHEMA_BUILD_TIMINGS["schema"] = time.perf_counter() - schema_start
+
+slowest_modules = sorted(SCHEMA_BUILD_TIMINGS["modules"].items(), key=lambda timing: timing[1], reverse=True)[:5]
+logger.info(
+    "GraphQL schema built in %.3fs, module schemas imported in %.3fs (slowest: %s)",
+    SCHEMA_BUILD_TIMINGS["schema"],
+    sum(SCHEMA_BUILD_TIMINGS["modules"].values()),
+    ", ".join(f"{app} {seconds:.3f}s" for app, seconds in slowest_modules),
+)
+
+startup_trace.write_report()
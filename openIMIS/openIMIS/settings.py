@@ -5,17 +5,24 @@ import json
 import logging
 import os
 import sys
+import tempfile
 
 from dotenv import load_dotenv
 from .openimisapps import openimis_apps, get_locale_folders
+from . import startup_trace
 from datetime import timedelta
 from cryptography.hazmat.primitives import serialization
+from django.core.exceptions import ImproperlyConfigured
 
 
 load_dotenv()
 
+# Times the apps creation, models import and ready() hooks if STARTUP_TRACE_FILE is set
+startup_trace.install_app_hooks()
+
 # Makes openimis_apps available to other modules
-OPENIMIS_APPS = openimis_apps()
+with startup_trace.phase("settings.openimis_apps"):
+    OPENIMIS_APPS = openimis_apps()
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -24,6 +31,7 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DEBUG = os.environ.get("MODE", "PROD") == "DEV"
 DEFAULT_LOGGING_HANDLER = os.getenv("DJANGO_LOG_HANDLER", "console")
 DEFAULT_DB_LOGGING_HANDLER = os.getenv("DJANGO_DB_LOG_HANDLER", "db-queries")
+DEFAULT_SLOW_LOGGING_HANDLER = os.getenv("DJANGO_SLOW_LOG_HANDLER", "slow-log")
 LOGGING_LEVEL = os.getenv("DJANGO_LOG_LEVEL", "DEBUG" if DEBUG else "WARNING")
 if DEBUG:
     EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
@@ -34,6 +42,7 @@ LOGGING = {
     "formatters": {
         "standard": {"format": "%(asctime)s [%(levelname)s] %(name)s: %(message)s"},
         "short": {"format": "%(name)s: %(message)s"},
+        "message": {"format": "%(message)s"},
     },
     "handlers": {
         "db-queries": {
@@ -52,6 +61,13 @@ LOGGING = {
             "backupCount": 3,
             "formatter": "standard",
         },
+        "slow-log": {
+            "class": "logging.handlers.RotatingFileHandler",
+            "filename": os.environ.get("SLOW_LOG_FILE", "slow.log"),
+            "maxBytes": 1024 * 1024 * 5,  # 5 MB
+            "backupCount": 3,
+            "formatter": "message",
+        },
         "console": {"class": "logging.StreamHandler", "formatter": "short"},
     },
     "loggers": {
@@ -68,6 +84,12 @@ LOGGING = {
             "level": LOGGING_LEVEL,
             "handlers": [DEFAULT_LOGGING_HANDLER],
         },
+        # JSON lines of the slow queries and resolvers, see openIMIS.db_instrumentation
+        "openIMIS.slow_log": {
+            "level": "WARNING",
+            "propagate": False,
+            "handlers": [DEFAULT_SLOW_LOGGING_HANDLER],
+        },
     },
 }
 
@@ -103,6 +125,20 @@ if SENTRY_DSN is not None:
         )
 
 
+# Tracer backends (see openIMIS.tracer_backends), comma separated: memory, otlp and/or sentry
+TRACER_BACKENDS = [
+    backend.strip()
+    for backend in os.environ.get("TRACER_BACKENDS", "sentry" if IS_SENTRY_ENABLED else "").split(",")
+    if backend.strip()
+]
+TRACER_MEMORY_SIZE = int(os.environ.get("TRACER_MEMORY_SIZE", 5000))
+TRACER_OTLP_ENDPOINT = os.environ.get("TRACER_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+TRACER_OTLP_HEADERS = json.loads(os.environ.get("TRACER_OTLP_HEADERS", "{}"))
+TRACER_SERVICE_NAME = os.environ.get("TRACER_SERVICE_NAME", "openIMIS")
+# Share of the GraphQL operations whose resolvers are traced (the other spans are always recorded)
+GRAPHQL_TRACE_SAMPLE_RATE = float(os.environ.get("GRAPHQL_TRACE_SAMPLE_RATE", 1))
+
+
 def SITE_ROOT():
     root = os.environ.get("SITE_ROOT", "")
     if root == "":
@@ -171,7 +207,10 @@ INSTALLED_APPS = [
     "django_opensearch_dsl"
 ]
 INSTALLED_APPS += OPENIMIS_APPS
+INSTALLED_APPS += ["openIMIS.apps.OpenIMISConfig"]  # Instrumentation of the application (slow log, metrics...)
 INSTALLED_APPS += ["apscheduler_runner", "signal_binding"]  # Signal binding should be last installed module
+# Apps other than the openIMIS modules whose schema module is added to the GraphQL schema (see openIMIS.schema)
+GRAPHQL_SCHEMA_EXTRA_APPS = ["apscheduler_runner"]
 
 AUTHENTICATION_BACKENDS = []
 
@@ -240,6 +279,20 @@ RATELIMIT_RATE = os.getenv('RATELIMIT_RATE', '150/m')
 RATELIMIT_METHOD = os.getenv('RATELIMIT_METHOD', 'ALL')
 RATELIMIT_GROUP = os.getenv('RATELIMIT_GROUP', 'graphql')
 RATELIMIT_SKIP_TIMEOUT = os.getenv('RATELIMIT_SKIP_TIMEOUT', 'False')
+# Token bucket rate limiter shared by the worker processes (see openIMIS.ratelimit), replaces core's rate limiter when
+# set: local (processes of a single host) or redis (cluster)
+RATELIMIT_BACKEND = os.getenv("RATELIMIT_BACKEND", "")
+RATELIMIT_LOCAL_PATH = os.getenv(
+    "RATELIMIT_LOCAL_PATH",
+    os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "openimis-ratelimit.sqlite3"),
+)
+RATELIMIT_REDIS_URL = os.getenv("RATELIMIT_REDIS_URL", "redis://localhost:6379/0")
+# Separate budgets of the expensive root fields (queries and mutations), e.g. {"exportInsurees": "5/m"}
+RATELIMIT_OPERATION_RATES = json.loads(os.getenv("RATELIMIT_OPERATION_RATES", "{}"))
+if RATELIMIT_BACKEND:
+    MIDDLEWARE[MIDDLEWARE.index("core.middleware.GraphQLRateLimitMiddleware")] = (
+        "openIMIS.ratelimit.TokenBucketRateLimitMiddleware"
+    )
 
 if DEBUG:
     # Attach profiler middleware
@@ -283,9 +336,42 @@ GRAPHENE = {
         "openIMIS.tracer.TracerMiddleware",
         "openIMIS.schema.GQLUserLanguageMiddleware",
         "graphql_jwt.middleware.JSONWebTokenMiddleware",
-        "graphene_django.debug.DjangoDebugMiddleware",  # adds a _debug query to graphQL with sql debug info
     ],
 }
+# graphene_django.debug.DjangoDebugMiddleware is added by the GraphQL view to the operations selecting _debug, in DEV
+# mode or for the staff users
+
+# Serve /graphql with the async view (only useful under ASGI, see openIMIS.asgi). Read-only operations are then
+# executed in a dedicated thread pool instead of the single thread shared by all sync views.
+GRAPHQL_ASYNC_VIEW = os.environ.get("GRAPHQL_ASYNC_VIEW", "False").lower() == "true"
+GRAPHQL_ASYNC_QUERY_THREADS = int(os.environ.get("GRAPHQL_ASYNC_QUERY_THREADS", 16))
+# Maximum number of operations accepted by /graphql/batch in a single request
+GRAPHQL_BATCH_MAX_OPERATIONS = int(os.environ.get("GRAPHQL_BATCH_MAX_OPERATIONS", 20))
+
+# Slow query/resolver log (see openIMIS.db_instrumentation), thresholds in milliseconds, 0 to disable
+DB_SLOW_QUERY_MS = float(os.environ.get("DB_SLOW_QUERY_MS", 500))
+GRAPHQL_SLOW_RESOLVER_MS = float(os.environ.get("GRAPHQL_SLOW_RESOLVER_MS", 1000))
+# Within this number of seconds, only the first occurrence of a slow statement or resolver is logged
+SLOW_LOG_SAMPLE_WINDOW = float(os.environ.get("SLOW_LOG_SAMPLE_WINDOW", 60))
+SLOW_LOG_MAX_SQL_LENGTH = int(os.environ.get("SLOW_LOG_MAX_SQL_LENGTH", 2000))
+# Statements executed this many times by a GraphQL operation are reported as N+1 suspects, 0 to disable
+GRAPHQL_N_PLUS_ONE_THRESHOLD = int(os.environ.get("GRAPHQL_N_PLUS_ONE_THRESHOLD", 10))
+# Maximum number of SQL statements of a GraphQL operation, 0 for no budget. GRAPHQL_QUERY_BUDGET_MODE: off, warn (log
+# the operations over budget and the N+1 suspects) or strict (the statements over budget are refused, the operation
+# fails and a mutation is rolled back if it runs in a transaction: ATOMIC_MUTATIONS or ATOMIC_REQUESTS)
+GRAPHQL_QUERY_BUDGET = int(os.environ.get("GRAPHQL_QUERY_BUDGET", 100))
+GRAPHQL_QUERY_BUDGET_MODE = os.environ.get(
+    "GRAPHQL_QUERY_BUDGET_MODE", "warn" if DEBUG or "test" in sys.argv else "off"
+).lower()
+
+# Metrics exposed on /<SITE_ROOT>metrics (see openIMIS.metrics). With several worker processes, each process writes its values
+# every METRICS_FLUSH_SECONDS in METRICS_MULTIPROC_DIR, where they are summed when scraped.
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "True").lower() == "true"
+METRICS_MULTIPROC_DIR = os.environ.get("METRICS_MULTIPROC_DIR", "")
+METRICS_FLUSH_SECONDS = float(os.environ.get("METRICS_FLUSH_SECONDS", 5))
+# The scrapes must send it as a bearer token (Authorization: Bearer <token>). Without it, only the staff users can read
+# the metrics
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
 
 GRAPHQL_JWT = {
     "JWT_VERIFY_EXPIRATION": True,
@@ -430,6 +516,64 @@ if "DASHBOARD_DB_ENGINE" in os.environ:
         "PORT": os.environ.get("DASHBOARD_DB_PORT", DEFAULT_PORT)
     }
 
+# Read replicas of the default database, one per DB_REPLICA_<NAME>_HOST variable (e.g. DB_REPLICA_1_HOST), used by
+# the GraphQL queries (see routers.ReplicaDatabaseRouter). The other settings are taken from the default database
+# unless overridden by DB_REPLICA_<NAME>_PORT, _NAME, _USER and _PASSWORD.
+DB_REPLICAS = []
+for replica_host_var in sorted(var for var in os.environ if var.startswith("DB_REPLICA_") and var.endswith("_HOST")):
+    replica_name = replica_host_var[len("DB_REPLICA_"):-len("_HOST")]
+    replica_alias = "replica_%s" % replica_name.lower()
+    DATABASES[replica_alias] = {
+        **DATABASES["default"],
+        "HOST": os.environ[replica_host_var],
+        "PORT": os.environ.get("DB_REPLICA_%s_PORT" % replica_name, DATABASES["default"]["PORT"]),
+        "NAME": os.environ.get("DB_REPLICA_%s_NAME" % replica_name, DATABASES["default"]["NAME"]),
+        "USER": os.environ.get("DB_REPLICA_%s_USER" % replica_name, DATABASES["default"]["USER"]),
+        "PASSWORD": os.environ.get("DB_REPLICA_%s_PASSWORD" % replica_name, DATABASES["default"]["PASSWORD"]),
+        "TEST": {"MIRROR": "default"},
+    }
+    DB_REPLICAS.append(replica_alias)
+# Clients read from the primary for that long after a mutation, to see their own writes
+DB_REPLICA_STICKY_SECONDS = int(os.environ.get("DB_REPLICA_STICKY_SECONDS", "5"))
+# Cache remembering the clients reading from the primary, it must be shared by the processes (not the default LocMem)
+DB_REPLICA_STICKY_CACHE = os.environ.get("DB_REPLICA_STICKY_CACHE", "default")
+# Replicas lagging more than that behind the primary are not used, the lag is checked every DB_REPLICA_LAG_CHECK_SECONDS
+DB_REPLICA_MAX_LAG_SECONDS = float(os.environ.get("DB_REPLICA_MAX_LAG_SECONDS", "5"))
+DB_REPLICA_LAG_CHECK_SECONDS = float(os.environ.get("DB_REPLICA_LAG_CHECK_SECONDS", "10"))
+
+# The scheduler lock (see apscheduler_runner.leader) lives as long as the database session holding it, which a pooler in
+# transaction mode (pgbouncer pool_mode=transaction) doesn't keep: SCHEDULER_LOCK_DB_HOST and SCHEDULER_LOCK_DB_PORT
+# then address the database itself, the other settings are the ones of the default database.
+SCHEDULER_LOCK_DATABASE = "default"
+if os.environ.get("SCHEDULER_LOCK_DB_HOST"):
+    SCHEDULER_LOCK_DATABASE = "scheduler_lock"
+    DATABASES[SCHEDULER_LOCK_DATABASE] = {
+        **DATABASES["default"],
+        "HOST": os.environ["SCHEDULER_LOCK_DB_HOST"],
+        "PORT": os.environ.get("SCHEDULER_LOCK_DB_PORT", DATABASES["default"]["PORT"]),
+        "TEST": {"MIRROR": "default"},
+    }
+
+# Persistent connections: number of seconds a connection is reused across requests (0 closes it at the end of each
+# request, "None" never closes it). Health checks make sure a reused connection is still alive before the request.
+# Django 4.2 has no connection pool, use pgbouncer in front of PostgreSQL to bound the number of server connections.
+DB_CONN_MAX_AGE = os.environ.get("DB_CONN_MAX_AGE", "0")
+DB_CONN_MAX_AGE = None if DB_CONN_MAX_AGE.lower() == "none" else int(DB_CONN_MAX_AGE)
+DB_CONN_HEALTH_CHECKS = os.environ.get("DB_CONN_HEALTH_CHECKS", "True").lower() == "true"
+DB_CONNECT_TIMEOUT = os.environ.get("DB_CONNECT_TIMEOUT")
+
+for database in DATABASES.values():
+    if "sqlite" in database["ENGINE"]:
+        continue
+    database["CONN_MAX_AGE"] = DB_CONN_MAX_AGE
+    database["CONN_HEALTH_CHECKS"] = DB_CONN_HEALTH_CHECKS
+    if DB_CONNECT_TIMEOUT:
+        database["OPTIONS"] = dict(database.get("OPTIONS", {}))
+        if "postgresql" in database["ENGINE"]:
+            database["OPTIONS"].setdefault("connect_timeout", int(DB_CONNECT_TIMEOUT))
+        elif "mssql" in database["ENGINE"]:
+            database["OPTIONS"].setdefault("connection_timeout", int(DB_CONNECT_TIMEOUT))
+
 if "sql_server.pyodbc" in DATABASES["default"]['ENGINE'] or "mssql" in DATABASES["default"]['ENGINE']:
     MSSQL = True
 
@@ -440,7 +584,7 @@ else:
     # https://docs.djangoproject.com/en/2.1/ref/settings/#databases
 
 
-DATABASE_ROUTERS = ["openIMIS.routers.DashboardDatabaseRouter"]
+DATABASE_ROUTERS = ["openIMIS.routers.DashboardDatabaseRouter", "openIMIS.routers.ReplicaDatabaseRouter"]
 
 
 
@@ -450,6 +594,68 @@ CELERY_BROKER_URL = os.environ.get("CELERY_BROKER_URL", "amqp://rabitmq")
 if 'CELERY_RESULT_BACKEND' in os.environ:
     CELERY_RESULT_BACKEND = os.environ.get("CELERY_RESULT_BACKEND")
 
+# Tasks are routed to the interactive (default, e.g. the mutations), bulk or reports queue by
+# openIMIS.celery.route_task, so the long ones don't delay the short ones. CELERY_QUEUE_ROUTES maps a task name, a task
+# name pattern or a module to its queue, CELERY_TASK_PRIORITIES to its priority, from 0 (lowest) to 9 (highest,
+# default 5).
+CELERY_QUEUE_ROUTES = json.loads(os.environ.get(
+    "CELERY_QUEUE_ROUTES", '{"report": "reports", "*export*": "bulk", "*import*": "bulk"}'
+))
+CELERY_TASK_PRIORITIES = json.loads(os.environ.get(
+    "CELERY_TASK_PRIORITIES", '{"core.tasks.openimis_mutation_async": 7}'
+))
+CELERY_TASK_DEFAULT_QUEUE = "interactive"
+CELERY_TASK_QUEUE_MAX_PRIORITY = 9
+CELERY_TASK_ROUTES = ("openIMIS.celery.route_task",)
+if CELERY_BROKER_URL.startswith(("redis://", "rediss://")):
+    # Redis emulates the priorities with a list per priority step
+    CELERY_BROKER_TRANSPORT_OPTIONS = {
+        "priority_steps": list(range(10)), "sep": ":", "queue_order_strategy": "priority",
+    }
+# A worker reserves a single task at a time, so a long task doesn't hold short ones that another worker could run
+CELERY_WORKER_PREFETCH_MULTIPLIER = int(os.environ.get("CELERY_WORKER_PREFETCH_MULTIPLIER", 1))
+# Acknowledged once done: the task is run again if its worker dies. Only for idempotent tasks, hence off by default
+CELERY_TASK_ACKS_LATE = os.environ.get("CELERY_TASK_ACKS_LATE", "False").lower() == "true"
+CELERY_RESULT_COMPRESSION = os.environ.get("CELERY_RESULT_COMPRESSION", "gzip") or None
+CELERY_RESULT_EXPIRES = int(os.environ.get("CELERY_RESULT_EXPIRES", 86400))
+
+# CELERY_MODE:
+# - broker (default): RabbitMQ or Redis at CELERY_BROKER_URL
+# - local: the queues are files of the CELERY_LOCAL_DIR folder, shared by the web and worker processes of a single host
+#   (e.g. a district install without broker). Set CELERY_RESULT_BACKEND=file://<folder> to keep the task results.
+#   A task is removed from the queue as soon as a worker takes it, before it is acknowledged: it is run at most once,
+#   and lost if the worker is killed while running it (CELERY_TASK_ACKS_LATE has no effect).
+# - eager: the tasks run in the process calling them, no worker nor broker (the default of the unit tests, run by
+#   manage.py test or pytest)
+CELERY_MODE = os.environ.get(
+    "CELERY_MODE", "eager" if "test" in sys.argv or "pytest" in sys.modules else "broker"
+).lower()
+if CELERY_MODE == "eager":
+    CELERY_BROKER_URL = "memory://"
+    CELERY_TASK_ALWAYS_EAGER = True
+    CELERY_TASK_EAGER_PROPAGATES = True
+elif CELERY_MODE == "local":
+    CELERY_LOCAL_DIR = os.environ.get("CELERY_LOCAL_DIR", os.path.join(tempfile.gettempdir(), "openimis-celery"))
+    CELERY_BROKER_URL = "filesystem://"
+    CELERY_BROKER_TRANSPORT = "openIMIS.celery_local:Transport"
+    CELERY_BROKER_TRANSPORT_OPTIONS = {
+        # The producers write to the folder the consumers read
+        "data_folder_in": os.path.join(CELERY_LOCAL_DIR, "queue"),
+        "data_folder_out": os.path.join(CELERY_LOCAL_DIR, "queue"),
+        "control_folder": os.path.join(CELERY_LOCAL_DIR, "control"),
+        # The messages taken by a worker are moved there: in the same file system, so that the move is atomic
+        "store_processed": True,
+        "processed_folder": os.path.join(CELERY_LOCAL_DIR, "processed"),
+        "polling_interval": 0.05,
+    }
+    for folder in ("queue", "control", "processed"):
+        os.makedirs(os.path.join(CELERY_LOCAL_DIR, folder), exist_ok=True)
+    # The worker polls the folder and only acknowledges the tasks between two polls: with a single reserved task per
+    # process, it waits for the poll timeout once they are all busy
+    CELERY_WORKER_PREFETCH_MULTIPLIER = int(os.environ.get("CELERY_WORKER_PREFETCH_MULTIPLIER", 4))
+elif CELERY_MODE != "broker":
+    raise ImproperlyConfigured(f"Unknown CELERY_MODE {CELERY_MODE}, expected broker, local or eager")
+
 if 'CACHE_BACKEND' in os.environ and 'CACHE_URL' in os.environ:
     CACHE_BACKEND = os.environ.get('CACHE_BACKEND')
     CACHE_URL = os.environ.get("CACHE_URL")
@@ -485,17 +691,67 @@ CACHES = {
     }
 }
 
+# Aliases served by a two-tier cache (see openIMIS.cache): a small LRU in each process in front of the cache above
+CACHE_TWO_TIER_ALIASES = [
+    alias.strip() for alias in os.environ.get("CACHE_TWO_TIER_ALIASES", "").split(",") if alias.strip()
+]
+for alias in CACHE_TWO_TIER_ALIASES:
+    CACHES[alias] = {
+        "BACKEND": "openIMIS.cache.TwoTierCache",
+        "KEY_PREFIX": CACHES[alias].get("KEY_PREFIX", ""),
+        "OPTIONS": {
+            "ALIAS": alias,
+            "SHARED": CACHES[alias],
+            "LOCAL_MAX_ENTRIES": int(os.environ.get("CACHE_TWO_TIER_MAX_ENTRIES", 1000)),
+            "LOCAL_TIMEOUT": float(os.environ.get("CACHE_TWO_TIER_TIMEOUT", 5)),
+            "GENERATION_CHECK_INTERVAL": float(os.environ.get("CACHE_TWO_TIER_CHECK_INTERVAL", 1)),
+        },
+    }
+
+if DB_REPLICAS and DB_REPLICA_STICKY_SECONDS:
+    sticky_cache = CACHES.get(DB_REPLICA_STICKY_CACHE, {})
+    sticky_cache = sticky_cache.get("OPTIONS", {}).get("SHARED", sticky_cache)
+    # With a cache of each process, the next request of a client after a mutation would read from a replica
+    if sticky_cache.get("BACKEND") in (
+        None, "django.core.cache.backends.locmem.LocMemCache", "django.core.cache.backends.dummy.DummyCache",
+    ):
+        raise ImproperlyConfigured(
+            f"DB_REPLICA_STICKY_CACHE ({DB_REPLICA_STICKY_CACHE}) must be a cache shared by the processes "
+            "(e.g. CACHE_BACKEND=django_redis.cache.RedisCache) when DB_REPLICAS are configured, "
+            "or set DB_REPLICA_STICKY_SECONDS=0"
+        )
+
+# Jobs added with executor="processpool" run in SCHEDULER_PROCESS_POOL_WORKERS spawned processes (see
+# apscheduler_runner.executors), interrupted after SCHEDULER_JOB_TIMEOUT seconds (or their SCHEDULER_JOB_TIMEOUTS entry,
+# by job id). With 0 worker, they run in threads like the others.
+SCHEDULER_PROCESS_POOL_WORKERS = int(os.environ.get("SCHEDULER_PROCESS_POOL_WORKERS", 0))
+SCHEDULER_JOB_TIMEOUT = int(os.environ.get("SCHEDULER_JOB_TIMEOUT", 0))
+SCHEDULER_JOB_TIMEOUTS = json.loads(os.environ.get("SCHEDULER_JOB_TIMEOUTS", "{}"))
+# Executor of specific jobs, by job id, e.g. {"openimis_renewal_batch": "processpool"}
+SCHEDULER_JOB_EXECUTORS = json.loads(os.environ.get("SCHEDULER_JOB_EXECUTORS", "{}"))
+
 # This scheduler config will:
 # - Store jobs in the project database
-# - Execute jobs in threads inside the application process, for production use, we could use a dedicated process
+# - Execute jobs in threads inside the application process, or in a process pool (see above)
 SCHEDULER_CONFIG = {
     "apscheduler.jobstores.default": {
         "class": "django_apscheduler.jobstores:DjangoJobStore"
     },
-    "apscheduler.executors.processpool": {"type": "threadpool"},
+    "apscheduler.executors.processpool": {
+        "class": "apscheduler_runner.executors:DjangoProcessPoolExecutor",
+        "max_workers": SCHEDULER_PROCESS_POOL_WORKERS,
+        "timeout": SCHEDULER_JOB_TIMEOUT,
+        "job_timeouts": SCHEDULER_JOB_TIMEOUTS,
+    } if SCHEDULER_PROCESS_POOL_WORKERS else {"type": "threadpool"},
 }
 
 SCHEDULER_AUTOSTART = os.environ.get("SCHEDULER_AUTOSTART", "True").lower() == "true"
+# With SCHEDULER_DEDICATED, the web and Celery processes never run the scheduled jobs: `manage.py run_scheduler` does,
+# in its own process(es), one of them elected by a database lock (see apscheduler_runner.leader)
+SCHEDULER_DEDICATED = os.environ.get("SCHEDULER_DEDICATED", "False").lower() == "true"
+SCHEDULER_LEADER_RETRY_SECONDS = int(os.environ.get("SCHEDULER_LEADER_RETRY_SECONDS", 15))
+# Days of run history of the scheduled jobs (apscheduler_runner.models.JobRun), 0 to record none
+SCHEDULER_RUN_HISTORY_DAYS = int(os.environ.get("SCHEDULER_RUN_HISTORY_DAYS", 30))
 
 # Normally, one creates a "scheduler" method that calls the appropriate scheduler.add_job but since we are in a
 # modular architecture and calling only once from the core module, this has to be dynamic.
@@ -562,9 +818,10 @@ USE_L10N = True
 USE_TZ = False
 
 # List of places to look for translations, this could include an external translation module
-LOCALE_PATHS = get_locale_folders() + [
-    os.path.join(BASE_DIR, "locale"),
-]
+with startup_trace.phase("settings.get_locale_folders"):
+    LOCALE_PATHS = get_locale_folders() + [
+        os.path.join(BASE_DIR, "locale"),
+    ]
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/2.1/howto/static-files/
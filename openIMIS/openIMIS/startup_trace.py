@@ -0,0 +1,153 @@
+"""
+Startup tracing, enabled by setting STARTUP_TRACE_FILE.
+
+Records the wall time and the number of modules imported by each startup phase: the settings helpers, the import,
+models loading and ready() hook of every Django app and the GraphQL schema construction. The report is written as
+JSON to STARTUP_TRACE_FILE ({pid} is replaced by the process id) once the apps are ready, when the schema is built
+and when the process exits. If STARTUP_TRACE_BASELINE points to a previous report, the phases that got slower than
+the baseline are flagged in the report and logged as warnings.
+
+Phases can be nested (e.g. schema.build inside the first request), their durations and import counts are inclusive.
+"""
+import atexit
+import json
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+REPORT_FILE = os.environ.get("STARTUP_TRACE_FILE", "")
+BASELINE_FILE = os.environ.get("STARTUP_TRACE_BASELINE", "")
+# A phase is a regression when it is both TOLERANCE (relative) and MIN_DELTA_MS slower than in the baseline
+TOLERANCE = float(os.environ.get("STARTUP_TRACE_TOLERANCE", "0.2"))
+MIN_DELTA_MS = float(os.environ.get("STARTUP_TRACE_MIN_DELTA_MS", "50"))
+
+ENABLED = bool(REPORT_FILE)
+
+_trace_start = time.perf_counter()
+_phases = []
+
+
+@contextmanager
+def phase(name, module=None):
+    if not ENABLED:
+        yield
+        return
+    modules_before = len(sys.modules)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        _phases.append({
+            "phase": name,
+            "module": module,
+            "start_ms": round((start - _trace_start) * 1000, 3),
+            "duration_ms": round((end - start) * 1000, 3),
+            "imports": len(sys.modules) - modules_before,
+        })
+
+
+def _timed(name, module, func):
+    def wrapper(*args, **kwargs):
+        with phase(name, module):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def install_app_hooks():
+    """
+    Times the creation (module import), import_models() and ready() of every AppConfig. Has to be called before
+    django.setup(), i.e. from the settings.
+    """
+    if not ENABLED:
+        return
+    from django.apps import apps
+    from django.apps.config import AppConfig
+
+    create = AppConfig.create.__func__
+
+    def traced_create(cls, entry):
+        with phase("app.create", entry):
+            app_config = create(cls, entry)
+        app_config.import_models = _timed("app.import_models", app_config.name, app_config.import_models)
+        ready = _timed("app.ready", app_config.name, app_config.ready)
+
+        def traced_ready():
+            ready()
+            # The last app to be ready ends the Django setup
+            if app_config is list(apps.app_configs.values())[-1]:
+                write_report()
+
+        app_config.ready = traced_ready
+        return app_config
+
+    AppConfig.create = classmethod(traced_create)
+
+
+def _phase_totals(phases):
+    totals = {}
+    for entry in phases:
+        key = (entry["phase"], entry["module"])
+        totals[key] = totals.get(key, 0) + entry["duration_ms"]
+    return totals
+
+
+def _find_regressions():
+    if not BASELINE_FILE:
+        return []
+    try:
+        with open(BASELINE_FILE) as baseline_file:
+            baseline = _phase_totals(json.load(baseline_file)["phases"])
+    except (OSError, ValueError, KeyError) as exc:
+        logger.warning(f"Startup trace baseline {BASELINE_FILE} couldn't be read: {exc}")
+        return []
+
+    regressions = []
+    for (name, module), duration in _phase_totals(_phases).items():
+        baseline_duration = baseline.get((name, module))
+        if baseline_duration is None:
+            continue
+        if duration > baseline_duration * (1 + TOLERANCE) and duration - baseline_duration > MIN_DELTA_MS:
+            regressions.append({
+                "phase": name,
+                "module": module,
+                "duration_ms": round(duration, 3),
+                "baseline_ms": round(baseline_duration, 3),
+            })
+    return regressions
+
+
+def write_report():
+    if not ENABLED:
+        return
+    regressions = _find_regressions()
+    for regression in regressions:
+        logger.warning(
+            "Startup regression: %(phase)s %(module)s took %(duration_ms).1fms (baseline %(baseline_ms).1fms)",
+            regression,
+        )
+    report = {
+        "pid": os.getpid(),
+        "argv": sys.argv,
+        "created": datetime.now().isoformat(),
+        "elapsed_ms": round((time.perf_counter() - _trace_start) * 1000, 3),
+        "modules_loaded": len(sys.modules),
+        "baseline": BASELINE_FILE or None,
+        "regressions": regressions,
+        "phases": _phases,
+    }
+    path = REPORT_FILE.format(pid=os.getpid())
+    try:
+        with open(path, "w") as report_file:
+            json.dump(report, report_file, indent=2)
+    except OSError as exc:
+        logger.warning(f"Startup trace couldn't be written to {path}: {exc}")
+
+
+if ENABLED:
+    atexit.register(write_report)
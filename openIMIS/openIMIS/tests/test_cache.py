@@ -0,0 +1,113 @@
+import threading
+import time
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from openIMIS import cache as two_tier
+from openIMIS.cache import TwoTierCache, get_or_compute
+
+SHARED = {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "two-tier-tests"}
+
+
+def _cache(alias, **options):
+    return TwoTierCache("", {"OPTIONS": {
+        "ALIAS": alias, "SHARED": SHARED, "LOCAL_TIMEOUT": 60, "GENERATION_CHECK_INTERVAL": 0, **options
+    }})
+
+
+class TwoTierCacheTest(SimpleTestCase):
+
+    def setUp(self):
+        two_tier._process_tiers.clear()
+        self.cache = _cache("first")
+        self.cache.shared.clear()
+
+    def test_process_tier_is_shared_by_the_instances_of_an_alias(self):
+        # Django creates an instance per thread
+        other_thread = _cache("first")
+        self.cache.set("key", "value")
+        self.cache.shared.delete("key")
+        self.assertEqual(other_thread.get("key"), "value")
+
+    def test_delete_invalidates_the_other_processes(self):
+        other_process = _cache("second")
+        self.cache.set("key", "value")
+        self.assertEqual(other_process.get("key"), "value")
+        self.cache.delete("key")
+        self.assertIsNone(other_process.get("key"))
+
+    def test_incr_invalidates_the_other_processes(self):
+        other_process = _cache("second")
+        self.cache.set("counter", 1)
+        self.assertEqual(other_process.get("counter"), 1)
+        self.cache.incr("counter")
+        self.assertEqual(other_process.get("counter"), 2)
+
+    def test_set_is_served_stale_until_the_local_timeout(self):
+        other_process = _cache("second")
+        self.cache.set("key", "old")
+        self.assertEqual(other_process.get("key"), "old")
+        self.cache.set("key", "new")
+        self.assertEqual(other_process.get("key"), "old")
+        self.assertEqual(_cache("third", LOCAL_TIMEOUT=0).get("key"), "new")
+
+    def test_lru_is_bounded(self):
+        small = _cache("small", LOCAL_MAX_ENTRIES=2)
+        for key in ("a", "b", "c"):
+            small.set(key, key)
+        self.assertEqual(list(two_tier._process_tiers["small"].entries), [small.make_key(key) for key in ("b", "c")])
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class GetOrComputeTest(SimpleTestCase):
+
+    def setUp(self):
+        caches["default"].clear()
+        self.calls = 0
+
+    def _compute(self, duration=0.2):
+        self.calls += 1
+        time.sleep(duration)
+        return self.calls
+
+    def test_single_flight_on_cold_miss(self):
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(get_or_compute("key", self._compute, 60)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, [1] * 5)
+
+    def test_waiters_give_up_after_wait_timeout(self):
+        caches["default"].add("key:lock", 1, 30)
+        start = time.monotonic()
+        self.assertEqual(get_or_compute("key", lambda: "computed", 60, wait_timeout=0.1), "computed")
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_serves_current_value_while_another_worker_recomputes(self):
+        get_or_compute("key", lambda: "old", 60)
+        caches["default"].add("key:lock", 1, 30)
+        # Always recomputed (beta), the lock is held by another worker
+        self.assertEqual(get_or_compute("key", lambda: "new", 60, beta=1e9), "old")
+
+    def test_waiter_giving_up_keeps_the_other_worker_lock(self):
+        caches["default"].add("key:lock", 1, 30)
+        get_or_compute("key", lambda: "computed", 60, wait_timeout=0.1)
+        self.assertTrue(caches["default"].has_key("key:lock"))
+
+    def test_serves_current_value_when_recomputation_fails(self):
+        get_or_compute("key", lambda: "old", 60)
+
+        def fail():
+            raise RuntimeError("database down")
+
+        with self.assertLogs("openIMIS.cache", "ERROR"):
+            self.assertEqual(get_or_compute("key", fail, 60, beta=1e9), "old")
+        # The lock is released, the next read retries
+        self.assertFalse(caches["default"].has_key("key:lock"))
@@ -0,0 +1,112 @@
+import os
+import tempfile
+from unittest import mock
+
+from celery import Celery
+from celery.contrib.testing.worker import start_worker
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from openIMIS.celery import DEFAULT_PRIORITY, MAX_PRIORITY, app, route_task
+
+
+@app.task(name="openIMIS.tests.test_celery.create_groups")
+def create_groups(names, fail=False):
+    """Shaped like a mutation: writes in a transaction, fails on invalid input"""
+    with transaction.atomic():
+        for name in names:
+            Group.objects.create(name=name)
+        if fail:
+            raise ValueError("invalid input")
+    return len(names)
+
+
+@override_settings(
+    CELERY_QUEUE_ROUTES={"report": "reports", "*export*": "bulk", "core.tasks.openimis_mutation_async": "interactive"},
+    CELERY_TASK_PRIORITIES={"core.tasks.openimis_mutation_async": 7, "*import*": 20},
+)
+class RouteTaskTest(SimpleTestCase):
+
+    def setUp(self):
+        self.broker_url = self._patch_broker_url("amqp://guest@localhost//")
+
+    def _patch_broker_url(self, url):
+        patcher = mock.patch.object(type(app.conf), "broker_url", new_callable=mock.PropertyMock, return_value=url)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def _route(self, name):
+        return route_task(name, (), {}, {})
+
+    def test_route_by_name(self):
+        self.assertEqual(self._route("core.tasks.openimis_mutation_async"), {"queue": "interactive", "priority": 7})
+
+    def test_route_by_pattern(self):
+        self.assertEqual(self._route("insuree.tasks.export_insurees"), {"queue": "bulk", "priority": DEFAULT_PRIORITY})
+
+    def test_route_by_module(self):
+        self.assertEqual(self._route("report.tasks.generate"), {"queue": "reports", "priority": DEFAULT_PRIORITY})
+
+    def test_default_queue(self):
+        self.assertEqual(self._route("claim.tasks.process"), {"priority": DEFAULT_PRIORITY})
+
+    def test_priority_bounded(self):
+        self.assertEqual(self._route("policy.tasks.import_policies")["priority"], MAX_PRIORITY)
+
+    def test_redis_priority_inverted(self):
+        self.broker_url.return_value = "redis://localhost:6379/0"
+        self.assertEqual(self._route("core.tasks.openimis_mutation_async")["priority"], MAX_PRIORITY - 7)
+
+
+class EagerModeTest(TestCase):
+    """The unit tests run the tasks in CELERY_MODE=eager: in the caller, without broker nor worker"""
+
+    def test_eager_mode_in_tests(self):
+        self.assertEqual(settings.CELERY_MODE, "eager")
+        self.assertTrue(app.conf.task_always_eager)
+
+    def test_task_runs_when_queued(self):
+        result = create_groups.delay(["district officers", "claim officers"])
+        self.assertEqual(result.get(), 2)
+        self.assertEqual(Group.objects.count(), 2)
+
+    def test_task_errors_are_raised_to_the_caller(self):
+        with self.assertRaises(ValueError):
+            create_groups.delay(["district officers"], fail=True)
+        self.assertFalse(Group.objects.exists())
+
+
+@app.task(name="openIMIS.tests.test_celery.echo")
+def echo(payload):
+    return payload
+
+
+class LocalModeTest(SimpleTestCase):
+    """CELERY_MODE=local: a task queued in the folder is run by a worker and its result read back"""
+
+    def test_round_trip(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        for name in ("queue", "control", "processed", "results"):
+            os.makedirs(os.path.join(folder.name, name))
+        local_app = Celery("openimis-local-test", broker="filesystem://", set_as_current=False)
+        local_app.conf.update(
+            broker_transport="openIMIS.celery_local:Transport",
+            broker_transport_options={
+                "data_folder_in": os.path.join(folder.name, "queue"),
+                "data_folder_out": os.path.join(folder.name, "queue"),
+                "control_folder": os.path.join(folder.name, "control"),
+                "store_processed": True,
+                "processed_folder": os.path.join(folder.name, "processed"),
+                "polling_interval": 0.05,
+            },
+            result_backend=f"file://{os.path.join(folder.name, 'results')}",
+        )
+        task = local_app.task(name="openIMIS.tests.test_celery.echo")(echo.run)
+        with start_worker(local_app, pool="threads", concurrency=2, perform_ping_check=False):
+            results = [task.delay(index) for index in range(5)]
+            self.assertEqual([result.get(timeout=10) for result in results], list(range(5)))
+        # The messages taken by the worker are removed from the queue
+        self.assertEqual(os.listdir(os.path.join(folder.name, "queue")), [])
@@ -0,0 +1,29 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from openIMIS import db_instrumentation
+
+
+@override_settings(SLOW_LOG_SAMPLE_WINDOW=60)
+class SampleTest(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.multiple(db_instrumentation, _sampler={}, _sampler_pruned=0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_first_occurrence_of_each_window_is_logged(self):
+        with mock.patch("openIMIS.db_instrumentation.time.monotonic", side_effect=[1000, 1010, 1020, 1070]):
+            self.assertEqual(db_instrumentation._sample("a"), 0)
+            self.assertIsNone(db_instrumentation._sample("a"))
+            self.assertIsNone(db_instrumentation._sample("a"))
+            self.assertEqual(db_instrumentation._sample("a"), 2)
+
+    def test_windows_over_are_pruned(self):
+        with mock.patch("openIMIS.db_instrumentation.time.monotonic", side_effect=[1000, 1070, 1130]):
+            db_instrumentation._sample("a")
+            db_instrumentation._sample("b")
+            db_instrumentation._sample("c")
+        # a is two windows old, b's window is over but its skipped occurrences would be reported with the next one
+        self.assertEqual(list(db_instrumentation._sampler), ["b", "c"])
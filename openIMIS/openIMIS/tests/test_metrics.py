@@ -0,0 +1,72 @@
+import glob
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from openIMIS import metrics
+
+
+class OperationLabelTest(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch("openIMIS.metrics._operation_labels", set())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_invalid_operations(self):
+        self.assertEqual(metrics._operation_label("madeUp", "invalid"), "other")
+        self.assertEqual(metrics._operation_label(None, "ok"), "anonymous")
+        self.assertEqual(metrics._operation_label("insurees", "error"), "insurees")
+
+    @mock.patch("openIMIS.metrics.MAX_OPERATION_LABELS", 2)
+    def test_labels_are_bounded(self):
+        labels = [metrics._operation_label(name, "ok") for name in ("a", "b", "c", "a")]
+        self.assertEqual(labels, ["a", "b", "other", "a"])
+
+
+class ProcessFilesTest(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.folder = directory.name
+        override = override_settings(METRICS_MULTIPROC_DIR=self.folder)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.registry = metrics.Registry()
+        self.counter = self.registry.register(metrics.Counter("requests_total", "Requests"))
+
+    def _write_process_file(self, pid, value):
+        path = os.path.join(self.folder, f"metrics-{pid}-1.json")
+        with open(path, "w") as f:
+            json.dump({"requests_total": [[[], value]]}, f)
+        return path
+
+    @mock.patch("openIMIS.metrics.ENABLED", True)
+    def test_files_are_keyed_on_pid_and_start(self):
+        self.counter.inc(2)
+        self.registry.write_process_file()
+        [path] = glob.glob(os.path.join(self.folder, "metrics-*.json"))
+        self.assertRegex(os.path.basename(path), rf"^metrics-{os.getpid()}-\d+\.json$")
+
+    def test_dead_processes_are_archived(self):
+        # Above the highest pid of Linux (pid_max), never running
+        first = self._write_process_file(4194305, 3)
+        second = self._write_process_file(4194306, 4)
+        self.assertEqual(self.registry.collect()["requests_total"], {(): 7})
+        self.assertFalse(os.path.exists(first) or os.path.exists(second))
+        # Archived again with the next dead processes, the total never goes down
+        self._write_process_file(4194307, 1)
+        self.assertEqual(self.registry.collect()["requests_total"], {(): 8})
+        self.assertEqual(
+            sorted(os.path.basename(path) for path in glob.glob(os.path.join(self.folder, "metrics-*.json"))),
+            sorted([metrics.ARCHIVE_FILE, os.path.basename(self.registry._process_file_path())]),
+        )
+
+    def test_running_processes_are_not_archived(self):
+        path = self._write_process_file(os.getppid(), 3)
+        self.assertEqual(self.registry.collect()["requests_total"], {(): 3})
+        self.assertTrue(os.path.exists(path))
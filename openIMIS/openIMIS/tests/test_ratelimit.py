@@ -0,0 +1,168 @@
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.contrib.sessions.backends.signed_cookies import SessionStore
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from graphql_jwt.exceptions import JSONWebTokenError
+from graphql_jwt.settings import jwt_settings
+
+from openIMIS import ratelimit
+from openIMIS.ratelimit import LocalBackend, TokenBucketRateLimitMiddleware, _client_id, _root_fields
+
+
+class _RecordingBackend:
+    def __init__(self):
+        self.taken = []
+
+    def take(self, key, capacity, refill_rate, cost):
+        self.taken.append((key, cost))
+        return 0
+
+
+def _bearer(token):
+    return f"{jwt_settings.JWT_AUTH_HEADER_PREFIX} {token}"
+
+
+def _reset_caches():
+    ratelimit._validated_clients = ratelimit._BoundedCache()
+    ratelimit._root_fields_cache = ratelimit._BoundedCache()
+
+
+class ClientIdTest(SimpleTestCase):
+
+    def setUp(self):
+        _reset_caches()
+        self.factory = RequestFactory()
+
+    def test_anonymous_is_keyed_on_address(self):
+        request = self.factory.post("/api/graphql", REMOTE_ADDR="10.0.0.1")
+        self.assertEqual(_client_id(request), "ip:10.0.0.1")
+
+    @mock.patch("openIMIS.ratelimit.get_payload", side_effect=JSONWebTokenError("Error decoding signature"))
+    def test_invalid_token_is_keyed_on_address(self, get_payload):
+        first = self.factory.post("/api/graphql", REMOTE_ADDR="10.0.0.1", HTTP_AUTHORIZATION=_bearer("forged-1"))
+        second = self.factory.post("/api/graphql", REMOTE_ADDR="10.0.0.1", HTTP_AUTHORIZATION=_bearer("forged-2"))
+        self.assertEqual(_client_id(first), "ip:10.0.0.1")
+        self.assertEqual(_client_id(second), "ip:10.0.0.1")
+
+    @mock.patch("openIMIS.ratelimit.get_payload", return_value={"username": "admin", "exp": 4102444800})
+    def test_valid_token_is_keyed_on_user(self, get_payload):
+        request = self.factory.post("/api/graphql", REMOTE_ADDR="10.0.0.1", HTTP_AUTHORIZATION=_bearer("valid"))
+        self.assertEqual(_client_id(request), "user:admin")
+        self.assertEqual(_client_id(request), "user:admin")
+        # Validated once, then cached until the token expires
+        get_payload.assert_called_once_with("valid")
+
+    @override_settings(SESSION_ENGINE="django.contrib.sessions.backends.signed_cookies")
+    def test_session_is_keyed_on_user(self):
+        session = SessionStore()
+        session["_auth_user_id"] = "42"
+        session.save()
+        request = self.factory.post("/api/graphql", REMOTE_ADDR="10.0.0.1")
+        request.COOKIES["sessionid"] = session.session_key
+        self.assertEqual(_client_id(request), "user-id:42")
+
+    @override_settings(SESSION_ENGINE="django.contrib.sessions.backends.signed_cookies")
+    def test_unknown_session_is_keyed_on_address(self):
+        request = self.factory.post("/api/graphql", REMOTE_ADDR="10.0.0.1")
+        request.COOKIES["sessionid"] = "made-up"
+        self.assertEqual(_client_id(request), "ip:10.0.0.1")
+
+    @override_settings(SESSION_ENGINE="django.contrib.sessions.backends.signed_cookies")
+    def test_session_without_user_is_loaded_once(self):
+        request = self.factory.post("/api/graphql", REMOTE_ADDR="10.0.0.1")
+        request.COOKIES["sessionid"] = "anonymous"
+        with mock.patch.object(SessionStore, "load", return_value={}) as load:
+            self.assertEqual(_client_id(request), "ip:10.0.0.1")
+            self.assertEqual(_client_id(request), "ip:10.0.0.1")
+        load.assert_called_once()
+
+
+class RootFieldsTest(SimpleTestCase):
+
+    def setUp(self):
+        _reset_caches()
+
+    def test_aliases_and_operation_names_are_ignored(self):
+        self.assertEqual(_root_fields("query cheap { cheap: exportInsurees { id } }", None), ("exportInsurees",))
+
+    def test_fragments_are_followed(self):
+        query = """
+            query { ...Root ... on Query { insurees { id } } }
+            fragment Root on Query { exportInsurees { id } ...Root }
+        """
+        self.assertEqual(_root_fields(query, None), ("exportInsurees", "insurees"))
+
+    def test_executed_operation_is_selected(self):
+        query = "query a { insurees { id } } query b { exportInsurees { id } }"
+        self.assertEqual(_root_fields(query, "b"), ("exportInsurees",))
+        self.assertEqual(_root_fields(query, None), ())
+
+    def test_invalid_document(self):
+        self.assertEqual(_root_fields("query {", None), ())
+
+
+@override_settings(
+    RATELIMIT_BACKEND="local", RATELIMIT_RATE="150/m", RATELIMIT_OPERATION_RATES={"exportInsurees": "5/m"}
+)
+class TokenBucketRateLimitMiddlewareTest(SimpleTestCase):
+
+    def setUp(self):
+        _reset_caches()
+        self.backend = _RecordingBackend()
+        with mock.patch("openIMIS.ratelimit.load_backend", return_value=self.backend):
+            self.middleware = TokenBucketRateLimitMiddleware(lambda request: HttpResponse("ok"))
+        self.factory = RequestFactory()
+
+    def _post(self, body):
+        request = self.factory.post(
+            self.middleware.paths[0], data=json.dumps(body), content_type="application/json", REMOTE_ADDR="10.0.0.1"
+        )
+        return self.middleware(request)
+
+    def test_budgeted_root_field(self):
+        self._post({"query": "query insurees { exportInsurees { id } }", "operationName": "insurees"})
+        self.assertEqual(self.backend.taken, [("ip:10.0.0.1:exportInsurees", 1)])
+
+    def test_batch(self):
+        self._post([
+            {"query": "{ exportInsurees { id } }"},
+            {"query": "{ a: exportInsurees { id } b: exportInsurees { id } }"},
+            {"query": "{ insurees { id } }"},
+        ])
+        self.assertEqual(self.backend.taken, [("ip:10.0.0.1:exportInsurees", 3), ("ip:10.0.0.1:*", 1)])
+
+    def test_mixed_operation_takes_both_budgets(self):
+        self._post({"query": "{ exportInsurees { id } insurees { id } }"})
+        self.assertEqual(self.backend.taken, [("ip:10.0.0.1:exportInsurees", 1), ("ip:10.0.0.1:*", 1)])
+
+
+@override_settings(
+    RATELIMIT_BACKEND="local", RATELIMIT_RATE="1/m", RATELIMIT_OPERATION_RATES={"exportInsurees": "5/m"}
+)
+class LocalBackendRefusalTest(SimpleTestCase):
+
+    def setUp(self):
+        _reset_caches()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.backend = LocalBackend(os.path.join(directory.name, "ratelimit.sqlite3"))
+        with mock.patch("openIMIS.ratelimit.load_backend", return_value=self.backend):
+            self.middleware = TokenBucketRateLimitMiddleware(lambda request: HttpResponse("ok"))
+        self.factory = RequestFactory()
+
+    def _post(self, query):
+        request = self.factory.post(
+            self.middleware.paths[0], data=json.dumps({"query": query}), content_type="application/json",
+            REMOTE_ADDR="10.0.0.1",
+        )
+        return self.middleware(request)
+
+    def test_refused_request_gives_the_tokens_back(self):
+        self.assertEqual(self._post("{ insurees { id } }").status_code, 200)
+        # The exportInsurees bucket has tokens, the default one is empty
+        self.assertEqual(self._post("{ exportInsurees { id } insurees { id } }").status_code, 429)
+        self.assertEqual(self.backend.take("ip:10.0.0.1:exportInsurees", 5, 5 / 60, 5), 0)
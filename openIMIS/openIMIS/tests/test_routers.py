@@ -0,0 +1,64 @@
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from openIMIS.routers import (
+    DASHBOARD_DATABASE, DashboardDatabaseRouter, _client_key, choose_replica, mark_primary_sticky,
+)
+
+DASHBOARD_MODELS = frozenset({("pep_plus", "factsessao")})
+
+
+@mock.patch("openIMIS.routers._dashboard_db_models", return_value=DASHBOARD_MODELS)
+class DashboardDatabaseRouterTest(SimpleTestCase):
+
+    def setUp(self):
+        self.router = DashboardDatabaseRouter()
+
+    @override_settings(DATABASES={"default": {}, DASHBOARD_DATABASE: {}})
+    def test_allow_migrate_with_dashboard_database(self, dashboard_db_models):
+        self.assertTrue(self.router.allow_migrate(DASHBOARD_DATABASE, "pep_plus", "factsessao"))
+        self.assertFalse(self.router.allow_migrate("default", "pep_plus", "factsessao"))
+        self.assertTrue(self.router.allow_migrate(DASHBOARD_DATABASE, "dashboard_etl", "anything"))
+        self.assertFalse(self.router.allow_migrate("default", "dashboard_etl", "anything"))
+        # Left to the other routers and to Django, as before the dashboard models
+        self.assertIsNone(self.router.allow_migrate(DASHBOARD_DATABASE, "pep_plus", "sessaopep"))
+        self.assertIsNone(self.router.allow_migrate(DASHBOARD_DATABASE, "core", "user"))
+        self.assertIsNone(self.router.allow_migrate("default", "core", "user"))
+
+    @override_settings(DATABASES={"default": {}})
+    def test_allow_migrate_without_dashboard_database(self, dashboard_db_models):
+        self.assertTrue(self.router.allow_migrate("default", "pep_plus", "factsessao"))
+        self.assertIsNone(self.router.allow_migrate("default", "core", "user"))
+
+
+@override_settings(
+    DB_REPLICAS=["replica_1"], DB_REPLICA_STICKY_SECONDS=5, DB_REPLICA_STICKY_CACHE="sticky",
+    CACHES={
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "default"},
+        "sticky": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "sticky"},
+    },
+)
+@mock.patch("openIMIS.routers._is_replica_usable", return_value=True)
+class ReplicaStickinessTest(SimpleTestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        caches["sticky"].clear()
+
+    def _request(self, token):
+        return self.factory.post("/api/graphql", HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def test_reads_from_primary_after_mutation(self, is_replica_usable):
+        self.assertEqual(choose_replica(self._request("a")), "replica_1")
+        mark_primary_sticky(self._request("a"))
+        self.assertIsNone(choose_replica(self._request("a")))
+        # Only that client
+        self.assertEqual(choose_replica(self._request("b")), "replica_1")
+
+    def test_stickiness_is_stored_in_the_shared_cache(self, is_replica_usable):
+        request = self._request("c")
+        mark_primary_sticky(request)
+        self.assertTrue(caches["sticky"].get(_client_key(request)))
+        self.assertIsNone(caches["default"].get(_client_key(request)))
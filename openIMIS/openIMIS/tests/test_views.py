@@ -0,0 +1,99 @@
+import json
+from unittest import mock
+
+import graphene
+from django.contrib.auth.models import Group
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.debug import DjangoDebugMiddleware
+
+from openIMIS import db_instrumentation
+from openIMIS.tracer import TracerMiddleware
+from openIMIS.views import OpenIMISGraphQLView
+
+
+class CreateGroup(graphene.Mutation):
+    class Arguments:
+        name = graphene.String(required=True)
+        fail = graphene.Boolean()
+        copies = graphene.Int()
+
+    ok = graphene.Boolean()
+
+    def mutate(self, info, name, fail=False, copies=1):
+        for copy in range(copies):
+            Group.objects.create(name=f"{name}-{copy}" if copy else name)
+        if fail:
+            # What the form and serializer mutations of graphene-django do on validation errors
+            setattr(info.context, MUTATION_ERRORS_FLAG, True)
+        return CreateGroup(ok=not fail)
+
+
+class Query(graphene.ObjectType):
+    groups = graphene.List(graphene.String)
+
+    def resolve_groups(self, info):
+        return list(Group.objects.order_by("name").values_list("name", flat=True))
+
+
+class Mutation(graphene.ObjectType):
+    create_group = CreateGroup.Field()
+
+
+SCHEMA = graphene.Schema(query=Query, mutation=Mutation)
+CREATE_GROUP = (
+    "mutation ($name: String!, $fail: Boolean, $copies: Int) "
+    "{ createGroup(name: $name, fail: $fail, copies: $copies) { ok } }"
+)
+
+
+class BatchRollbackTest(TestCase):
+
+    def _batch(self, operations):
+        request = RequestFactory().post("/graphql/batch", data=json.dumps(operations), content_type="application/json")
+        with mock.patch.dict(connection.settings_dict, {"ATOMIC_MUTATIONS": True}):
+            response = OpenIMISGraphQLView.as_view(schema=SCHEMA, batch=True)(request)
+        return json.loads(response.content)
+
+    def test_failed_mutation_only_rolls_back_itself(self):
+        self._batch([
+            {"id": 1, "query": CREATE_GROUP, "variables": {"name": "before"}},
+            {"id": 2, "query": CREATE_GROUP, "variables": {"name": "failed", "fail": True}},
+            {"id": 3, "query": CREATE_GROUP, "variables": {"name": "after"}},
+        ])
+        self.assertEqual(list(Group.objects.order_by("name").values_list("name", flat=True)), ["after", "before"])
+
+
+@override_settings(GRAPHQL_QUERY_BUDGET=5, GRAPHQL_QUERY_BUDGET_MODE="strict")
+class StrictQueryBudgetTest(TestCase):
+
+    def setUp(self):
+        db_instrumentation.install()
+
+    def _post(self, operation):
+        request = RequestFactory().post("/graphql", data=json.dumps(operation), content_type="application/json")
+        with mock.patch.dict(connection.settings_dict, {"ATOMIC_MUTATIONS": True}):
+            response = OpenIMISGraphQLView.as_view(schema=SCHEMA)(request)
+        return json.loads(response.content)
+
+    def test_mutation_over_budget_is_stopped_and_rolled_back(self):
+        response = self._post({"query": CREATE_GROUP, "variables": {"name": "group", "copies": 20}})
+        self.assertIn("budget of 5 SQL statements", response["errors"][0]["message"])
+        self.assertFalse(Group.objects.exists())
+
+    def test_mutation_within_budget(self):
+        response = self._post({"query": CREATE_GROUP, "variables": {"name": "group", "copies": 2}})
+        self.assertNotIn("errors", response)
+        self.assertEqual(Group.objects.count(), 2)
+
+
+class MiddlewarePromiseTest(TestCase):
+
+    def test_resolvers_results_not_wrapped_with_our_middlewares(self):
+        view = OpenIMISGraphQLView(schema=SCHEMA, middleware=[TracerMiddleware()])
+        self.assertFalse(view.get_middleware(RequestFactory().post("/graphql")).wrap_in_promise)
+
+    def test_resolvers_results_wrapped_with_other_middlewares(self):
+        view = OpenIMISGraphQLView(schema=SCHEMA, middleware=[TracerMiddleware(), DjangoDebugMiddleware()])
+        self.assertTrue(view.get_middleware(RequestFactory().post("/graphql")).wrap_in_promise)
@@ -1,13 +1,30 @@
+"""
+Tracing of the GraphQL requests: trace() opens a span, nested in the span currently open in the same context, and
+feeds it to the backends selected by TRACER_BACKENDS (see tracer_backends). Without backend, trace() costs close to
+nothing.
+"""
+import contextvars
+import functools
 import logging
+import random
+import secrets
+import sys
+import time
 from contextlib import contextmanager
-from .settings import IS_SENTRY_ENABLED
+
+from graphene.types.resolver import attr_resolver, dict_or_attr_resolver, dict_resolver
+from graphql.type.definition import GraphQLEnumType, GraphQLScalarType, get_named_type
+
+from .settings import (
+    GRAPHQL_TRACE_SAMPLE_RATE, IS_SENTRY_ENABLED, TRACER_BACKENDS, TRACER_MEMORY_SIZE, TRACER_OTLP_ENDPOINT,
+    TRACER_OTLP_HEADERS, TRACER_SERVICE_NAME,
+)
+from .tracer_backends import load_backends
+from . import db_instrumentation, metrics
 
 logger = logging.getLogger(__name__)
 
-try:
-    import sentry_sdk
-except ModuleNotFoundError:
-    sentry_sdk = None
+MAX_DATA_LENGTH = 1000
 
 
 class FakeSpan:
@@ -18,18 +35,190 @@ class FakeSpan:
         pass
 
 
+FAKE_SPAN = FakeSpan()
+
+
+class Span:
+    def __init__(self, op, description=None, parent=None):
+        self.op = op
+        self.description = description
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.start_time = time.time_ns()
+        self.end_time = None
+        self.tags = {}
+        self.data = {}
+        self.error = None
+        # The spans opened by the backends (e.g. Sentry) for this span
+        self.backend_spans = []
+
+    def set_tag(self, key, value):
+        self.tags[key] = value
+        for backend_span in self.backend_spans:
+            backend_span.set_tag(key, value if isinstance(value, (str, bool, int, float)) else str(value))
+
+    def set_data(self, key, value, sensitive=False):
+        """
+        Sensitive data (e.g. a request body, with passwords and personal data) is only passed to the Sentry spans,
+        subject to its scrubbing, not to the memory buffer (served by /tracer/traces) nor to the OTLP collector
+        """
+        if not sensitive:
+            self.data[key] = value if isinstance(value, (bool, int, float)) else str(value)[:MAX_DATA_LENGTH]
+        for backend_span in self.backend_spans:
+            backend_span.set_data(key, value)
+
+    @property
+    def duration_ms(self):
+        return (self.end_time - self.start_time) / 1e6 if self.end_time else None
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "op": self.op,
+            "description": self.description,
+            "start_time": self.start_time,
+            "duration_ms": self.duration_ms,
+            "tags": {
+                key: value if isinstance(value, (str, bool, int, float)) else str(value)
+                for key, value in self.tags.items()
+            },
+            "data": self.data,
+            "error": self.error,
+        }
+
+
+BACKENDS = load_backends(
+    TRACER_BACKENDS, TRACER_MEMORY_SIZE, TRACER_OTLP_ENDPOINT, TRACER_OTLP_HEADERS, TRACER_SERVICE_NAME,
+    IS_SENTRY_ENABLED,
+)
+# Backends receiving the DB statements spans, see db_instrumentation
+DB_SPAN_BACKENDS = [backend for backend in BACKENDS if backend.records_db_spans]
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+def current_span():
+    return _current_span.get()
+
+
+def get_backend(name):
+    for backend in BACKENDS:
+        if backend.name == name:
+            return backend
+    return None
+
+
 @contextmanager
-def trace(*args, **kwargs):
-    if IS_SENTRY_ENABLED:
-        with sentry_sdk.start_span(*args, **kwargs) as span:
-            yield span
-    else:
-        yield FakeSpan()
+def trace(op=None, description=None, backends=None):
+    backends = BACKENDS if backends is None else backends
+    if not backends:
+        yield FAKE_SPAN
+        return
+    span = Span(op, description, _current_span.get())
+    token = _current_span.set(span)
+    for backend in backends:
+        backend.start(span)
+    exc_info = (None, None, None)
+    try:
+        yield span
+    except BaseException as exc:
+        span.error = repr(exc)
+        exc_info = sys.exc_info()
+        raise
+    finally:
+        span.end_time = time.time_ns()
+        _current_span.reset(token)
+        for backend in reversed(backends):
+            try:
+                backend.finish(span, exc_info)
+            except Exception as exc:
+                logger.debug(f"Tracer backend {backend.name} failed to record {op}: {exc}")
+
+
+# The GraphQL operation and the field being resolved, for the SQL statements they run (see db_instrumentation)
+current_operation = contextvars.ContextVar("current_operation", default=None)
+current_resolver_path = contextvars.ContextVar("current_resolver_path", default=None)
+
+
+def format_path(path):
+    return ".".join([str(x) for x in path]) if path else None
+
+
+class ResolverPath:
+    """info.path, only joined when printed"""
+    __slots__ = ("path",)
+
+    def __init__(self, path):
+        self.path = path
+
+    def __str__(self):
+        return format_path(self.path)
+
+    __repr__ = __str__
+
+
+def _operation_name(info):
+    operation = info.operation
+    if operation.name is not None:
+        return operation.name.value
+    return operation.operation
+
+
+_DEFAULT_RESOLVERS = (attr_resolver, dict_resolver, dict_or_attr_resolver)
+_trivial_fields = {}
+
+
+def _is_trivial_field(info):
+    """
+    Scalar and enum fields resolved by the default (attribute or key lookup) resolver, there is nothing to time there
+    """
+    key = (info.parent_type.name, info.field_name)
+    trivial = _trivial_fields.get(key)
+    if trivial is None:
+        field = info.parent_type.fields.get(info.field_name)
+        resolver = getattr(field, "resolver", None)
+        trivial = (
+            resolver is None
+            or (isinstance(resolver, functools.partial) and resolver.func in _DEFAULT_RESOLVERS)
+        ) and isinstance(get_named_type(info.return_type), (GraphQLScalarType, GraphQLEnumType))
+        _trivial_fields[key] = trivial
+    return trivial
+
+
+def _is_sampled(info):
+    """Head sampling: all the resolvers of an operation are traced, or none"""
+    if GRAPHQL_TRACE_SAMPLE_RATE >= 1:
+        return True
+    sampling = getattr(info.context, "_tracer_sampling", None)
+    if sampling is None or sampling[0] is not info.operation:
+        sampling = (info.operation, random.random() < GRAPHQL_TRACE_SAMPLE_RATE)
+        try:
+            info.context._tracer_sampling = sampling
+        except AttributeError:
+            pass
+    return sampling[1]
 
 
 class TracerMiddleware:
     def resolve(self, next, root, info, **kwargs):
-        path = ".".join([str(x) for x in info.path])
-        with trace(op="graphql.resolve") as span:
-            span.set_tag("path", path)
+        if _is_trivial_field(info):
+            return next(root, info, **kwargs)
+
+        operation_token = current_operation.set(_operation_name(info))
+        path_token = current_resolver_path.set(info.path)
+        start = time.perf_counter()
+        try:
+            if BACKENDS and _is_sampled(info):
+                with trace(op="graphql.resolve") as span:
+                    span.set_tag("path", ResolverPath(info.path))
+                    return next(root, info, **kwargs)
             return next(root, info, **kwargs)
+        finally:
+            duration = time.perf_counter() - start
+            metrics.GRAPHQL_RESOLVER_DURATION.observe(duration, field=f"{info.parent_type.name}.{info.field_name}")
+            db_instrumentation.log_slow_resolver(info.path, duration * 1000)
+            current_resolver_path.reset(path_token)
+            current_operation.reset(operation_token)
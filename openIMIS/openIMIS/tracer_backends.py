@@ -0,0 +1,190 @@
+"""
+Tracer backends, selected by TRACER_BACKENDS (comma separated):
+- memory: keeps the last TRACER_MEMORY_SIZE finished spans in the process, see recent_traces()
+- otlp: sends the spans in the OTLP/HTTP JSON format to TRACER_OTLP_ENDPOINT (e.g. a local OpenTelemetry collector)
+- sentry: mirrors the spans in Sentry (requires SENTRY_DSN)
+"""
+import atexit
+import collections
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import urllib.request
+
+logger = logging.getLogger(__name__)
+
+try:
+    import sentry_sdk
+except ModuleNotFoundError:
+    sentry_sdk = None
+
+
+class TracerBackend:
+    name = None
+    # DB statement spans are recorded by the Sentry Django integration itself
+    records_db_spans = True
+
+    def start(self, span):
+        pass
+
+    def finish(self, span, exc_info):
+        pass
+
+
+class MemoryBackend(TracerBackend):
+    name = "memory"
+
+    def __init__(self, size):
+        self.spans = collections.deque(maxlen=size)
+
+    def finish(self, span, exc_info):
+        self.spans.append(span.to_dict())
+
+    def recent_traces(self, limit=50):
+        """The spans of the last `limit` traces, grouped by trace, most recent first"""
+        traces = collections.OrderedDict()
+        for span in reversed(list(self.spans)):
+            if span["trace_id"] not in traces:
+                if len(traces) >= limit:
+                    continue
+                traces[span["trace_id"]] = []
+            traces[span["trace_id"]].append(span)
+        return [
+            {"trace_id": trace_id, "spans": sorted(spans, key=lambda span: span["start_time"])}
+            for trace_id, spans in traces.items()
+        ]
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OTLPBackend(TracerBackend):
+    """
+    Exports the spans from a background thread, in batches. When the collector doesn't keep up, the spans that
+    don't fit in the queue are dropped rather than slowing the requests down.
+    """
+    name = "otlp"
+    batch_size = 512
+    flush_interval = 5
+
+    def __init__(self, endpoint, service_name, headers=None, queue_size=10000):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.headers = {"Content-Type": "application/json", **(headers or {})}
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self._pid = None
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def finish(self, span, exc_info):
+        self._ensure_worker()
+        try:
+            self.queue.put_nowait(self._to_otlp(span))
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_worker(self):
+        # The worker thread doesn't survive a fork (e.g. gunicorn workers), start one per process
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                threading.Thread(target=self._run, name="tracer-otlp-exporter", daemon=True).start()
+                self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self._export(batch)
+
+    def flush(self):
+        batch = []
+        while True:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self._export(batch)
+
+    def _export(self, otlp_spans):
+        payload = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{"scope": {"name": "openIMIS.tracer"}, "spans": otlp_spans}],
+        }]}
+        request = urllib.request.Request(
+            self.endpoint, data=json.dumps(payload).encode(), headers=self.headers, method="POST"
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=5) as response:
+                response.read()
+        except Exception as exc:
+            logger.warning(f"Failed to export {len(otlp_spans)} spans to {self.endpoint}: {exc}")
+
+    def _to_otlp(self, span):
+        attributes = {**span.data, **span.tags}
+        if span.description:
+            attributes["description"] = span.description
+        otlp_span = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.op,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(span.start_time),
+            "endTimeUnixNano": str(span.end_time),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()],
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+        }
+        if span.parent_id:
+            otlp_span["parentSpanId"] = span.parent_id
+        return otlp_span
+
+
+class SentryBackend(TracerBackend):
+    name = "sentry"
+    records_db_spans = False
+
+    def start(self, span):
+        context_manager = sentry_sdk.start_span(op=span.op, description=span.description)
+        span.backend_spans.append(context_manager.__enter__())
+        span.sentry_context_manager = context_manager
+
+    def finish(self, span, exc_info):
+        span.sentry_context_manager.__exit__(*exc_info)
+
+
+def load_backends(names, memory_size, otlp_endpoint, otlp_headers, service_name, sentry_enabled):
+    backends = []
+    for name in names:
+        if name == "memory":
+            backends.append(MemoryBackend(memory_size))
+        elif name == "otlp":
+            backends.append(OTLPBackend(otlp_endpoint, service_name, otlp_headers))
+        elif name == "sentry":
+            if sentry_enabled:
+                backends.append(SentryBackend())
+            else:
+                logger.warning("The sentry tracer backend requires SENTRY_DSN and sentry_sdk, it is disabled")
+        else:
+            logger.error(f"Unknown tracer backend {name}, expected memory, otlp or sentry")
+    return backends
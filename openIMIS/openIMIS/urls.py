@@ -17,18 +17,31 @@ from django.urls import  re_path as url, include
 from django.contrib import admin
 from django.urls import path
 from django.views.decorators.csrf import csrf_exempt
-from .views import OpenIMISGraphQLView
+from .views import AsyncOpenIMISGraphQLView, OpenIMISGraphQLView, metrics_view, recent_traces
+from . import metrics, tracer
 from graphql_jwt.decorators import jwt_cookie
 
 
 from .openimisurls import openimis_urls
-from .settings import SITE_ROOT, DEBUG
+from .settings import SITE_ROOT, DEBUG, GRAPHQL_ASYNC_VIEW
+
+if GRAPHQL_ASYNC_VIEW:
+    # the async view handles the JWT cookie itself, see AsyncOpenIMISGraphQLView
+    graphql_view = csrf_exempt(AsyncOpenIMISGraphQLView.as_view(graphiql=DEBUG))
+    graphql_batch_view = csrf_exempt(AsyncOpenIMISGraphQLView.as_view(batch=True))
+else:
+    graphql_view = csrf_exempt(jwt_cookie(OpenIMISGraphQLView.as_view(graphiql=DEBUG)))
+    graphql_batch_view = csrf_exempt(jwt_cookie(OpenIMISGraphQLView.as_view(batch=True)))
 
 urlpatterns = [
     path("%sadmin/" % SITE_ROOT(), admin.site.urls),
-    path(
-        "%sgraphql" % SITE_ROOT(),
-        csrf_exempt(jwt_cookie(OpenIMISGraphQLView.as_view(graphiql=DEBUG))),
-    ),
+    path("%sgraphql" % SITE_ROOT(), graphql_view),
+    # Takes a JSON array of operations, answers with the array of their results (with their id and status)
+    path("%sgraphql/batch" % SITE_ROOT(), graphql_batch_view),
     url(r"^ht/", include("health_check.urls")),
 ] + openimis_urls()
+
+if metrics.ENABLED:
+    urlpatterns.append(path("%smetrics" % SITE_ROOT(), metrics_view))
+if tracer.get_backend("memory"):
+    urlpatterns.append(path("%stracer/traces" % SITE_ROOT(), recent_traces))
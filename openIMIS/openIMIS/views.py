@@ -1,20 +1,89 @@
-from django.db import connection, transaction
-from django.http import HttpResponseNotAllowed
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseNotAllowed, JsonResponse
 from django.http.response import HttpResponseBadRequest
+from .asyncgraphql import get_query_executor, is_read_only_operation
 from .dataloaders import get_dataloaders
+from . import db_instrumentation, metrics
+from .routers import choose_replica, mark_primary_sticky, read_from_replica
 from . import tracer
 from graphql.execution import ExecutionResult
+from graphql.execution.middleware import MiddlewareManager
+from graphql.language import ast
 
 from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.debug import DjangoDebugMiddleware
 from graphene_django.utils.utils import set_rollback
+from graphql_jwt.backends import JSONWebTokenBackend
+from graphql_jwt.decorators import jwt_cookie
 from graphql_jwt.exceptions import JSONWebTokenError
 from graphene_django.settings import graphene_settings
 from graphene_django.views import GraphQLView as BaseGraphQLView, HttpError
+import hmac
 import logging
+import os
+import time
 
 logger = logging.getLogger(__name__)
 
 
+DEBUG_MIDDLEWARE = DjangoDebugMiddleware()
+# The GraphQL middlewares which don't need the result of the next resolver to be a Promise
+PROMISE_FREE_MIDDLEWARE = frozenset({
+    "openIMIS.tracer.TracerMiddleware",
+    "openIMIS.schema.GQLUserLanguageMiddleware",
+    "graphql_jwt.middleware.JSONWebTokenMiddleware",
+})
+# Upper bound of the limit parameter of /tracer/traces
+MAX_RECENT_TRACES = 500
+
+
+def _middleware_name(middleware):
+    middleware_class = middleware if isinstance(middleware, type) else type(middleware)
+    return f"{middleware_class.__module__}.{middleware_class.__qualname__}"
+
+
+def middleware_manager(middleware):
+    """The MiddlewareManager running the middlewares of an operation, None without middleware"""
+    if not middleware:
+        return None
+    # graphql-core otherwise wraps the result of every resolver in a Promise, which costs more than the
+    # middlewares themselves on large lists. Only when they all return next()'s result as is: others (e.g. the
+    # debug middleware) chain on the Promise.
+    wrap_in_promise = not all(_middleware_name(item) in PROMISE_FREE_MIDDLEWARE for item in middleware)
+    return MiddlewareManager(*middleware, wrap_in_promise=wrap_in_promise)
+
+
+def selects_debug(document_ast):
+    """Whether an operation (or a fragment) of the document selects the _debug field of the Query"""
+    for definition in document_ast.definitions:
+        selection_set = getattr(definition, "selection_set", None)
+        if selection_set is None:
+            continue
+        for selection in selection_set.selections:
+            if isinstance(selection, ast.Field) and selection.name.value == "_debug":
+                return True
+    return False
+
+
+def get_user(request):
+    """The user authenticated by the session or by the JWT, which graphql_jwt only checks when resolving"""
+    if request.user.is_authenticated:
+        return request.user
+    try:
+        return JSONWebTokenBackend().authenticate(request)
+    except JSONWebTokenError:
+        return None
+
+
+def can_debug(request):
+    if settings.DEBUG:
+        return True
+    user = get_user(request)
+    return user is not None and user.is_staff
+
+
 def has_jwt_error(errors):
     for error in errors:
         if isinstance(getattr(error, "original_error", None), JSONWebTokenError):
@@ -23,22 +92,35 @@ def has_jwt_error(errors):
 
 
 class GraphQLView(BaseGraphQLView):
+    def dispatch(self, request, *args, **kwargs):
+        with tracer.trace(op="GraphQLView.dispatch"):
+            return super().dispatch(request, *args, **kwargs)
+
     def json_encode(self, request, d, pretty=False):
         with tracer.trace(op="GraphQLView.json_encode"):
             return super().json_encode(request, d, pretty=pretty)
 
     def _get_response(self, request, data, show_graphiql=False):
         query, variables, operation_name, id = self.get_graphql_params(request, data)
+        # The operations of a batch share the request: the errors of a mutation must not roll back the next ones
+        request.__dict__.pop(MUTATION_ERRORS_FLAG, None)
 
-        execution_result = self.execute_graphql_request(
-            request, data, query, variables, operation_name, show_graphiql
-        )
+        start = time.perf_counter()
+        with db_instrumentation.collect_query_stats() as query_stats:
+            execution_result = self.execute_graphql_request(
+                request, data, query, variables, operation_name, show_graphiql
+            )
 
         if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
             set_rollback()
 
         status_code = 200
         if execution_result:
+            try:
+                db_instrumentation.report_query_stats(operation_name, query_stats)
+            except db_instrumentation.QueryBudgetExceeded as exc:
+                execution_result.errors = [*(execution_result.errors or []), exc]
+
             response = {}
 
             if execution_result.errors:
@@ -49,10 +131,16 @@ class GraphQLView(BaseGraphQLView):
 
             if execution_result.invalid:
                 status_code = 400
+                status = "invalid"
             elif execution_result.errors and has_jwt_error(execution_result.errors):
                 status_code = 401
+                status = "unauthorized"
             else:
                 response["data"] = execution_result.data
+                status = "error" if execution_result.errors else "ok"
+            metrics.record_graphql_operation(
+                operation_name, status, time.perf_counter() - start, query_stats.count
+            )
 
             if self.batch:
                 response["id"] = id
@@ -72,14 +160,34 @@ class GraphQLView(BaseGraphQLView):
             span.set_tag("status_code", status_code)
         return result, status_code
 
+    def get_middleware(self, request, document=None):
+        middleware = super().get_middleware(request)
+        if isinstance(middleware, MiddlewareManager):
+            return middleware
+        middleware = list(middleware or [])
+        # The debug middleware wraps every resolver, only add it when the _debug field is requested
+        if document is not None and selects_debug(document.document_ast) and can_debug(request):
+            middleware.append(DEBUG_MIDDLEWARE)
+        return middleware_manager(middleware)
+
     def get_context(self, request):
-        request.dataloaders = get_dataloaders()
+        # The operations of a batch share the request: the authenticated user, the DB connection and the dataloaders
+        if not hasattr(request, "dataloaders"):
+            request.dataloaders = get_dataloaders()
         return request
 
     def parse_body(self, request):
+        # The async view inspects the body before dispatching, don't decode it twice
+        if hasattr(request, "_graphql_body"):
+            return request._graphql_body
         with tracer.trace(op="GraphQLView.parse_body") as span:
             request_json = super().parse_body(request)
-            span.set_data("Body", request_json)
+            span.set_data("Body", request_json, sensitive=True)
+            if self.batch and len(request_json) > settings.GRAPHQL_BATCH_MAX_OPERATIONS:
+                raise HttpError(HttpResponseBadRequest(
+                    f"Batch requests are limited to {settings.GRAPHQL_BATCH_MAX_OPERATIONS} operations."
+                ))
+            request._graphql_body = request_json
             return request_json
 
     def execute_graphql_request(
@@ -119,30 +227,46 @@ class GraphQLView(BaseGraphQLView):
                 # executor is not a valid argument in all backends
                 extra_options["executor"] = self.executor
 
+            operation_type = document.get_operation_type(operation_name)
+            if operation_type == "mutation":
+                # Don't serve values cached by the previous operations of the batch
+                request.__dict__.pop("dataloaders", None)
+
             options = {
                 "root_value": self.get_root_value(request),
                 "variable_values": variables,
                 "operation_name": operation_name,
                 "context_value": self.get_context(request),
-                "middleware": self.get_middleware(request),
+                "middleware": self.get_middleware(request, document),
             }
             options.update(extra_options)
 
-            operation_type = document.get_operation_type(operation_name)
-            if operation_type == "mutation" and (
-                graphene_settings.ATOMIC_MUTATIONS is True
-                or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True
-            ):
-                with transaction.atomic():
-                    result = document.execute(**options)
-                    if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
-                        transaction.set_rollback(True)
-                return result
-            with tracer.trace(op="document.execute"):
+            if operation_type == "mutation":
+                try:
+                    return self._execute_mutation(request, document, options)
+                finally:
+                    # The client reads its own writes from the primary until the replicas caught up
+                    mark_primary_sticky(request)
+            replica = choose_replica(request) if operation_type == "query" else None
+            with tracer.trace(op="document.execute"), read_from_replica(replica):
                 return document.execute(**options)
         except Exception as e:
             return ExecutionResult(errors=[e], invalid=True)
 
+    def _execute_mutation(self, request, document, options):
+        if (
+            graphene_settings.ATOMIC_MUTATIONS is True
+            or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True
+        ):
+            with transaction.atomic():
+                result = document.execute(**options)
+                # The statements of a mutation over the strict query budget were refused, don't keep half of it
+                if getattr(request, MUTATION_ERRORS_FLAG, False) is True or db_instrumentation.over_strict_budget():
+                    transaction.set_rollback(True)
+            return result
+        with tracer.trace(op="document.execute"):
+            return document.execute(**options)
+
 
 class OpenIMISGraphQLView(GraphQLView):
     def execute_graphql_request(self, *args, **kwargs):
@@ -158,3 +282,78 @@ class OpenIMISGraphQLView(GraphQLView):
                 logger.error(error.original_error)
             except AttributeError:
                 logger.error(error)
+
+
+class AsyncOpenIMISGraphQLView(OpenIMISGraphQLView):
+    """
+    ASGI flavour of the GraphQL endpoint. Read-only operations are executed in a dedicated thread pool so a single
+    worker can serve many slow queries concurrently, everything else (mutations, GraphiQL, invalid requests) goes
+    through the thread sensitive sync_to_async bridge, exactly like the sync view under ASGI.
+    The JWT cookie handling is applied here since graphql_jwt's jwt_cookie decorator only wraps sync views.
+    """
+    view_is_async = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        if self._is_read_only_request(request):
+            return await sync_to_async(
+                self._dispatch_read_only, thread_sensitive=False, executor=get_query_executor()
+            )(request, *args, **kwargs)
+        return await sync_to_async(self._dispatch_sync)(request, *args, **kwargs)
+
+    def _dispatch_sync(self, request, *args, **kwargs):
+        return jwt_cookie(super().dispatch)(request, *args, **kwargs)
+
+    def _dispatch_read_only(self, request, *args, **kwargs):
+        # Django only manages the connections of the request thread, the pool threads have to do it themselves
+        close_old_connections()
+        try:
+            return self._dispatch_sync(request, *args, **kwargs)
+        finally:
+            close_old_connections()
+
+    def _is_read_only_request(self, request):
+        if request.method.lower() not in ("get", "post"):
+            return False
+        try:
+            data = self.parse_body(request)
+        except Exception:
+            return False
+        if self.graphiql and self.can_display_graphiql(request, data):
+            return False
+        entries = data if isinstance(data, list) else [data]
+        for entry in entries:
+            try:
+                query, _, operation_name, _ = self.get_graphql_params(request, entry)
+            except Exception:
+                return False
+            if not is_read_only_operation(query, operation_name):
+                return False
+        return True
+
+
+def metrics_view(request):
+    """
+    The metrics of all the processes, in the Prometheus text format, for the scrapers sending METRICS_TOKEN or, when
+    it is not set, for the staff users
+    """
+    if settings.METRICS_TOKEN:
+        if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {settings.METRICS_TOKEN}"):
+            return HttpResponseForbidden()
+    else:
+        user = get_user(request)
+        if user is None or not user.is_staff:
+            return HttpResponseForbidden()
+    return HttpResponse(metrics.REGISTRY.exposition(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def recent_traces(request):
+    """The last traces kept by the memory tracer backend of this process (limit, 1 to 500), for the staff users"""
+    user = get_user(request)
+    if user is None or not user.is_staff:
+        return HttpResponseForbidden()
+    try:
+        limit = int(request.GET.get("limit", 50))
+    except ValueError:
+        return HttpResponseBadRequest("limit must be an integer")
+    traces = tracer.get_backend("memory").recent_traces(min(max(limit, 1), MAX_RECENT_TRACES))
+    return JsonResponse({"pid": os.getpid(), "traces": traces})
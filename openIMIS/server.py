@@ -1,7 +1,37 @@
+"""
+Production server entry point (`python server.py`, the `start` command of the Docker image).
+
+By default, serves the WSGI application with waitress in a single process, with SERVER_THREADS threads.
+With SERVER_ENGINE=gunicorn, pre-forks SERVER_WORKERS processes (one per CPU by default) so a container can use all
+its cores:
+- SERVER_WORKER_CLASS: gthread (default), sync, or uvicorn to serve the ASGI application (websockets, async views)
+- SERVER_MAX_REQUESTS / SERVER_MAX_REQUESTS_JITTER: recycle the workers after that many requests
+- SERVER_TIMEOUT / SERVER_GRACEFUL_TIMEOUT: kill unresponsive workers, delay given to finish the pending requests
+Send SIGHUP to the gunicorn master to reload the code and the configuration gracefully.
+The application is imported in each worker, after the fork, so the workers share no DB connection or thread.
+The workers share their metrics through METRICS_MULTIPROC_DIR (a temporary folder by default), emptied at start.
+"""
+import glob
+import logging
+import os
 import socket
-from waitress import serve
+import tempfile
+
+logger = logging.getLogger(__name__)
 
-from openIMIS.wsgi import application
+SERVER_ENGINE = os.environ.get("SERVER_ENGINE", "waitress").lower()
+SERVER_BIND = os.environ.get("SERVER_BIND", "0.0.0.0:8000")
+SERVER_THREADS = int(os.environ.get("SERVER_THREADS", "4"))
+SERVER_WORKERS = int(os.environ.get("SERVER_WORKERS", os.cpu_count() or 1))
+SERVER_WORKER_CLASS = os.environ.get("SERVER_WORKER_CLASS", "gthread")
+SERVER_MAX_REQUESTS = int(os.environ.get("SERVER_MAX_REQUESTS", "0"))
+SERVER_MAX_REQUESTS_JITTER = int(os.environ.get("SERVER_MAX_REQUESTS_JITTER", "0"))
+SERVER_TIMEOUT = int(os.environ.get("SERVER_TIMEOUT", "120"))
+SERVER_GRACEFUL_TIMEOUT = int(os.environ.get("SERVER_GRACEFUL_TIMEOUT", "30"))
+
+WSGI_APPLICATION = "openIMIS.wsgi:application"
+ASGI_APPLICATION = "openIMIS.asgi:application"
+UVICORN_WORKER_CLASS = "uvicorn.workers.UvicornWorker"
 
 
 def get_proxy_ip():
@@ -20,13 +50,69 @@ trusted_proxy_headers = (
     "x-forwarded-by"
 )
 
-serve_kwargs = {
-    "listen": "0.0.0.0:8000",
-}
 
-if trusted_proxy:
-    serve_kwargs["trusted_proxy"] = trusted_proxy
-    serve_kwargs["trusted_proxy_headers"] = trusted_proxy_headers
+def serve_waitress():
+    from waitress import serve
 
-if __name__ == '__main__':
+    from openIMIS.wsgi import application
+
+    serve_kwargs = {
+        "listen": SERVER_BIND,
+        "threads": SERVER_THREADS,
+    }
+    if trusted_proxy:
+        serve_kwargs["trusted_proxy"] = trusted_proxy
+        serve_kwargs["trusted_proxy_headers"] = trusted_proxy_headers
     serve(application, **serve_kwargs)
+
+
+def serve_gunicorn():
+    from gunicorn.app.base import BaseApplication
+    from gunicorn.util import import_app
+
+    worker_class = UVICORN_WORKER_CLASS if SERVER_WORKER_CLASS == "uvicorn" else SERVER_WORKER_CLASS
+    app_path = ASGI_APPLICATION if worker_class == UVICORN_WORKER_CLASS else WSGI_APPLICATION
+
+    class GunicornServer(BaseApplication):
+        def load_config(self):
+            options = {
+                "bind": SERVER_BIND,
+                "workers": SERVER_WORKERS,
+                "threads": SERVER_THREADS,
+                "worker_class": worker_class,
+                "max_requests": SERVER_MAX_REQUESTS,
+                "max_requests_jitter": SERVER_MAX_REQUESTS_JITTER,
+                "timeout": SERVER_TIMEOUT,
+                "graceful_timeout": SERVER_GRACEFUL_TIMEOUT,
+                "preload_app": False,
+            }
+            if trusted_proxy:
+                options["forwarded_allow_ips"] = trusted_proxy
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return import_app(app_path)
+
+    # The values of the previous run would be added to the new ones
+    metrics_dir = os.environ.setdefault(
+        "METRICS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "openimis-metrics")
+    )
+    for path in glob.glob(os.path.join(metrics_dir, "metrics-*.json")):
+        os.remove(path)
+
+    if (
+        SERVER_WORKERS > 1
+        and os.environ.get("SCHEDULER_AUTOSTART", "True").lower() == "true"
+        and os.environ.get("SCHEDULER_DEDICATED", "False").lower() != "true"
+    ):
+        logger.warning("SCHEDULER_AUTOSTART is enabled: each of the %s workers runs the scheduled jobs, "
+                       "set SCHEDULER_DEDICATED=True and run `manage.py run_scheduler` separately", SERVER_WORKERS)
+    GunicornServer().run()
+
+
+if __name__ == '__main__':
+    if SERVER_ENGINE == "gunicorn":
+        serve_gunicorn()
+    else:
+        serve_waitress()
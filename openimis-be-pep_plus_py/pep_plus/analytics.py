@@ -0,0 +1,225 @@
+"""
+PEP+ Analytics ETL
+Fills the star schema (DimPeriodo, DimDistrito, DimModulo and the Fact* models) from the transactional tables.
+Each run recomputes the facts of the last analytics_etl_months months (sessions, attendance and referrals can still
+be recorded or corrected for past sessions), older periods are only recomputed by a full refresh.
+analytics_summary() serves the monthly totals of the facts to the dashboards.
+"""
+import datetime
+import logging
+
+from django.db import router, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth
+from location.models import Location
+from openIMIS.cache import get_or_compute
+
+from .apps import PepPlusConfig
+from .models import (
+    SessaoPEP, PresencaSessao, EncaminhamentoSessao, ModuloEducacional,
+    DimPeriodo, DimDistrito, DimModulo, FactSessao, FactPresenca, FactEncaminhamento
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _window_start(months):
+    today = datetime.date.today()
+    month_index = today.year * 12 + today.month - 1 - months
+    return datetime.date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def _session_facts(start):
+    sessions = SessaoPEP.objects.filter(validity_to__isnull=True)
+    if start:
+        sessions = sessions.filter(data_sessao__gte=start)
+    return sessions.annotate(periodo=TruncMonth('data_sessao')) \
+        .values('periodo', 'distrito_id', 'modulo_id') \
+        .annotate(
+            sessoes_planeadas=Count('id', filter=Q(status='PLAN')),
+            sessoes_executadas=Count('id', filter=Q(status='EXEC')),
+            sessoes_canceladas=Count('id', filter=Q(status='CANC')),
+            sessoes_supervisionadas=Count('id', filter=Q(tem_supervisao=True)),
+            familias_esperadas=Sum('numero_familias'),
+        ).order_by()
+
+
+def _attendance_facts(start):
+    attendances = PresencaSessao.objects.filter(validity_to__isnull=True, sessao__validity_to__isnull=True)
+    if start:
+        attendances = attendances.filter(sessao__data_sessao__gte=start)
+    return attendances.annotate(periodo=TruncMonth('sessao__data_sessao')) \
+        .values('periodo', 'sessao__distrito_id', 'sessao__modulo_id') \
+        .annotate(
+            presentes=Count('id', filter=Q(estado='PRES')),
+            ausentes=Count('id', filter=Q(estado='AUSE')),
+            justificados=Count('id', filter=Q(estado='JUST')),
+            familias_distintas=Count('familia_id', distinct=True),
+        ).order_by()
+
+
+def _referral_facts(start):
+    referrals = EncaminhamentoSessao.objects.filter(validity_to__isnull=True, sessao__validity_to__isnull=True)
+    if start:
+        referrals = referrals.filter(sessao__data_sessao__gte=start)
+    return referrals.annotate(periodo=TruncMonth('sessao__data_sessao')) \
+        .values('periodo', 'sessao__distrito_id', 'sessao__modulo_id', 'status') \
+        .annotate(total=Count('id')).order_by()
+
+
+def _month(value):
+    # TruncMonth returns a datetime on some backends
+    if isinstance(value, datetime.datetime):
+        value = value.date()
+    return value.replace(day=1)
+
+
+def _load_dimensions(periods, distrito_ids, modulo_ids):
+    """Creates or refreshes the dimension rows and returns them by natural key"""
+    dim_periods = {}
+    for period in periods:
+        dim_periods[period], _ = DimPeriodo.objects.get_or_create(
+            data_inicio=period,
+            defaults={'ano': period.year, 'mes': period.month, 'bimestre': f"BIM{(period.month - 1) // 2 + 1}"},
+        )
+
+    dim_districts = {}
+    for distrito in Location.objects.filter(id__in=distrito_ids).select_related('parent'):
+        dim_districts[distrito.id], _ = DimDistrito.objects.update_or_create(
+            distrito_id=distrito.id,
+            defaults={
+                'codigo': distrito.code,
+                'nome': distrito.name,
+                'regiao_id': distrito.parent_id,
+                'regiao_nome': distrito.parent.name if distrito.parent else None,
+            },
+        )
+
+    dim_modules = {}
+    for modulo in ModuloEducacional.objects.filter(id__in=modulo_ids):
+        dim_modules[modulo.id], _ = DimModulo.objects.update_or_create(
+            modulo_id=modulo.id,
+            defaults={'codigo': modulo.codigo, 'nome': modulo.nome, 'ordem': modulo.ordem},
+        )
+    return dim_periods, dim_districts, dim_modules
+
+
+def refresh_analytics(months=None, full=False):
+    """
+    Recomputes the facts of the periods starting `months` months before the current one (analytics_etl_months by
+    default), or of all the periods if `full`. Returns the number of facts.
+    """
+    if months is None:
+        months = PepPlusConfig.analytics_etl_months or 0
+    start = None if full else _window_start(months)
+
+    session_rows = list(_session_facts(start))
+    attendance_rows = list(_attendance_facts(start))
+    referral_rows = list(_referral_facts(start))
+
+    periods = {_month(row['periodo']) for row in session_rows + attendance_rows + referral_rows}
+    distrito_ids = {row['distrito_id'] for row in session_rows} \
+        | {row['sessao__distrito_id'] for row in attendance_rows + referral_rows}
+    modulo_ids = {row['modulo_id'] for row in session_rows} \
+        | {row['sessao__modulo_id'] for row in attendance_rows + referral_rows}
+
+    with transaction.atomic(using=router.db_for_write(FactSessao)):
+        dim_periods, dim_districts, dim_modules = _load_dimensions(periods, distrito_ids, modulo_ids)
+
+        for fact_model in (FactSessao, FactPresenca, FactEncaminhamento):
+            facts = fact_model.objects.all()
+            if start:
+                facts = facts.filter(periodo__data_inicio__gte=start)
+            facts.delete()
+
+        FactSessao.objects.bulk_create([
+            FactSessao(
+                periodo=dim_periods[_month(row['periodo'])],
+                distrito=dim_districts[row['distrito_id']],
+                modulo=dim_modules[row['modulo_id']],
+                sessoes_planeadas=row['sessoes_planeadas'],
+                sessoes_executadas=row['sessoes_executadas'],
+                sessoes_canceladas=row['sessoes_canceladas'],
+                sessoes_supervisionadas=row['sessoes_supervisionadas'],
+                familias_esperadas=row['familias_esperadas'] or 0,
+            )
+            for row in session_rows
+        ])
+        FactPresenca.objects.bulk_create([
+            FactPresenca(
+                periodo=dim_periods[_month(row['periodo'])],
+                distrito=dim_districts[row['sessao__distrito_id']],
+                modulo=dim_modules[row['sessao__modulo_id']],
+                presentes=row['presentes'],
+                ausentes=row['ausentes'],
+                justificados=row['justificados'],
+                familias_distintas=row['familias_distintas'],
+            )
+            for row in attendance_rows
+        ])
+        FactEncaminhamento.objects.bulk_create([
+            FactEncaminhamento(
+                periodo=dim_periods[_month(row['periodo'])],
+                distrito=dim_districts[row['sessao__distrito_id']],
+                modulo=dim_modules[row['sessao__modulo_id']],
+                status=row['status'],
+                total=row['total'],
+            )
+            for row in referral_rows
+        ])
+
+    logger.info(
+        f"PEP+ analytics refreshed from {start or 'the beginning'}: {len(session_rows)} session, "
+        f"{len(attendance_rows)} attendance and {len(referral_rows)} referral facts"
+    )
+    # Reported in the run history of the scheduled jobs
+    return len(session_rows) + len(attendance_rows) + len(referral_rows)
+
+
+def _summary(distrito_id, start):
+    filters = {'periodo__data_inicio__gte': start}
+    if distrito_id:
+        filters['distrito__distrito_id'] = distrito_id
+    periods = {}
+
+    def period(row):
+        return periods.setdefault(row['periodo__data_inicio'], {
+            'periodo': row['periodo__data_inicio'],
+            'sessoes_planeadas': 0, 'sessoes_executadas': 0, 'sessoes_canceladas': 0, 'familias_esperadas': 0,
+            'presentes': 0, 'ausentes': 0, 'justificados': 0, 'encaminhamentos': 0,
+        })
+
+    for row in FactSessao.objects.filter(**filters).values('periodo__data_inicio').annotate(
+        planeadas=Sum('sessoes_planeadas'), executadas=Sum('sessoes_executadas'),
+        canceladas=Sum('sessoes_canceladas'), familias=Sum('familias_esperadas'),
+    ).order_by():
+        period(row).update(
+            sessoes_planeadas=row['planeadas'], sessoes_executadas=row['executadas'],
+            sessoes_canceladas=row['canceladas'], familias_esperadas=row['familias'],
+        )
+    for row in FactPresenca.objects.filter(**filters).values('periodo__data_inicio').annotate(
+        total_presentes=Sum('presentes'), total_ausentes=Sum('ausentes'), total_justificados=Sum('justificados'),
+    ).order_by():
+        period(row).update(
+            presentes=row['total_presentes'], ausentes=row['total_ausentes'], justificados=row['total_justificados'],
+        )
+    for row in FactEncaminhamento.objects.filter(**filters).values('periodo__data_inicio').annotate(
+        total_encaminhamentos=Sum('total'),
+    ).order_by():
+        period(row)['encaminhamentos'] = row['total_encaminhamentos']
+    return [periods[key] for key in sorted(periods)]
+
+
+def analytics_summary(distrito_id=None, months=12):
+    """
+    Monthly totals of the sessions, attendance and referrals of the last `months` months, of a district or of all.
+    The facts only change when the ETL runs: the totals are cached for analytics_etl_interval_minutes, a single worker
+    recomputes them when they expire while the others keep serving the previous ones.
+    """
+    start = _window_start(months)
+    timeout = (PepPlusConfig.analytics_etl_interval_minutes or 30) * 60
+    return get_or_compute(
+        f"pep_plus_analytics_summary:{distrito_id or 'all'}:{start.isoformat()}",
+        lambda: _summary(distrito_id, start),
+        timeout,
+    )
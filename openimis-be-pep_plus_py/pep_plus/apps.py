@@ -7,6 +7,8 @@ DEFAULT_CONFIG = {
     "gql_mutation_create_pep_session_perms": ["159002"],
     "gql_mutation_update_pep_session_perms": ["159003"],
     "gql_mutation_delete_pep_session_perms": ["159004"],
+    "analytics_etl_interval_minutes": 30,
+    "analytics_etl_months": 3,
 }
 
 
@@ -14,6 +16,23 @@ class PepPlusConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = MODULE_NAME
 
+    # Stored in the dashboard_db database when configured, see openIMIS.routers.DashboardDatabaseRouter
+    dashboard_db_models = [
+        "DimPeriodo", "DimDistrito", "DimModulo", "FactSessao", "FactPresenca", "FactEncaminhamento",
+    ]
+
+    gql_query_pep_sessions_perms = []
+    analytics_etl_interval_minutes = None
+    # Number of months, before the current one, recomputed by each run of the analytics ETL
+    analytics_etl_months = None
+
     def ready(self):
         from core.models import ModuleConfiguration
         cfg = ModuleConfiguration.get_or_default(self.name, DEFAULT_CONFIG)
+        self.__load_config(cfg)
+
+    @classmethod
+    def __load_config(cls, cfg):
+        for field in cfg:
+            if hasattr(PepPlusConfig, field):
+                setattr(PepPlusConfig, field, cfg[field])
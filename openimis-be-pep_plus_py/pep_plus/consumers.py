@@ -0,0 +1,75 @@
+"""
+PEP+ Websocket consumers
+Lets the clients wait for mutation results and session status changes instead of polling mutationLogs
+"""
+import logging
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from graphql_jwt.settings import jwt_settings
+from graphql_jwt.shortcuts import get_user_by_token
+from location.models import UserDistrict
+
+from .apps import PepPlusConfig
+from .notifications import ALL_DISTRICTS_SESSIONS_GROUP, district_sessions_group, user_group
+
+logger = logging.getLogger(__name__)
+
+
+class PepPlusEventsConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Sends the events published by notifications.py as JSON messages.
+    The user is taken from the session or from the JWT cookie. A token in the URL would end up in the access logs of
+    the proxies, it is not accepted.
+    The session status changes are only sent to the users allowed to query the sessions, for their districts.
+    """
+
+    async def connect(self):
+        self.subscribed_groups = []
+        if self.channel_layer is None:
+            logger.warning("PEP+ websocket refused: no channel layer configured (CHANNELS_BACKEND)")
+            await self.close()
+            return
+
+        user = await self._get_user()
+        if user is None or not user.is_authenticated:
+            await self.close()
+            return
+
+        self.subscribed_groups = [user_group(user.id), *await self._session_groups(user)]
+        for group in self.subscribed_groups:
+            await self.channel_layer.group_add(group, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        for group in self.subscribed_groups:
+            await self.channel_layer.group_discard(group, self.channel_name)
+
+    async def pep_plus_event(self, event):
+        await self.send_json(event["payload"])
+
+    async def _get_user(self):
+        user = self.scope.get("user")
+        if user is not None and user.is_authenticated:
+            return user
+
+        token = self.scope.get("cookies", {}).get(jwt_settings.JWT_COOKIE_NAME)
+        if not token:
+            return None
+        try:
+            return await database_sync_to_async(get_user_by_token)(token)
+        except Exception as exc:
+            logger.debug(f"PEP+ websocket refused, invalid token: {exc}")
+            return None
+
+    @staticmethod
+    @database_sync_to_async
+    def _session_groups(user):
+        if not user.has_perms(PepPlusConfig.gql_query_pep_sessions_perms):
+            return []
+        if user.is_superuser:
+            return [ALL_DISTRICTS_SESSIONS_GROUP]
+        return [
+            district_sessions_group(user_district.location_id)
+            for user_district in UserDistrict.get_user_districts(user._u)
+        ]
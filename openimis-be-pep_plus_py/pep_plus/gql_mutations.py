@@ -14,6 +14,7 @@ from .gql_queries import (
     PresencaSessaoGQLType, ExecucaoSessaoGQLType, SupervisaoSessaoGQLType,
     RelatorioDistritalBimestralGQLType, EncaminhamentoSessaoGQLType
 )
+from .notifications import publish_mutation_result
 from .services import (
     ModuloEducacionalService, GrupoFamiliarService, SessaoPEPService,
     PresencaSessaoService, ExecucaoSessaoService, SupervisaoSessaoService,
@@ -42,6 +43,7 @@ class CreateModuloEducacionalMutation(OpenIMISMutation):
         pass
 
     @classmethod
+    @publish_mutation_result
     def async_mutate(cls, user, **data):
         try:
             modulo = ModuloEducacionalService.create(data, user)
@@ -73,6 +75,7 @@ class UpdateModuloEducacionalMutation(OpenIMISMutation):
         pass
 
     @classmethod
+    @publish_mutation_result
     def async_mutate(cls, user, **data):
         try:
             modulo_id = data.pop('id')
@@ -94,6 +97,7 @@ class DeleteModuloEducacionalMutation(OpenIMISMutation):
         id = graphene.Int(required=True)
 
     @classmethod
+    @publish_mutation_result
     def async_mutate(cls, user, **data):
         try:
             ModuloEducacionalService.delete(data['id'], user)
@@ -126,6 +130,7 @@ class CreateGrupoFamiliarMutation(OpenIMISMutation):
         pass
 
     @classmethod
+    @publish_mutation_result
     def async_mutate(cls, user, **data):
         try:
             grupo = GrupoFamiliarService.create(data, user)
@@ -157,6 +162,7 @@ class UpdateGrupoFamiliarMutation(OpenIMISMutation):
         pass
 
     @classmethod
+    @publish_mutation_result
     def async_mutate(cls, user, **data):
         try:
             grupo_id = data.pop('id')
@@ -178,6 +184,7 @@ class DeleteGrupoFamiliarMutation(OpenIMISMutation):
         id = graphene.Int(required=True)
 
     @classmethod
+    @publish_mutation_result
     def async_mutate(cls, user, **data):
         try:
             GrupoFamiliarService.delete(data['id'], user)
@@ -221,6 +228,7 @@ class CreateSessaoPEPMutation(OpenIMISMutation):
         pass
 
     @classmethod
+    @publish_mutation_result
     def async_mutate(cls, user, **data):
         try:
             sessao = SessaoPEPService.create(data, user)
@@ -262,6 +270,7 @@ class UpdateSessaoPEPMutation(OpenIMISMutation):
         pass
 
     @classmethod
+    @publish_mutation_result
     def async_mutate(cls, user, **data):
         try:
             sessao_id = data.pop('id')
@@ -283,6 +292,7 @@ class DeleteSessaoPEPMutation(OpenIMISMutation):
         id = graphene.Int(required=True)
 
     @classmethod
+    @publish_mutation_result
     def async_mutate(cls, user, **data):
         try:
             SessaoPEPService.delete(data['id'], user)
@@ -316,6 +326,7 @@ class CreatePresencaSessaoMutation(OpenIMISMutation):
         pass
 
     @classmethod
+    @publish_mutation_result
     def async_mutate(cls, user, **data):
         try:
             presenca = PresencaSessaoService.create(data, user)
@@ -344,6 +355,7 @@ class UpdatePresencaSessaoMutation(OpenIMISMutation):
         pass
 
     @classmethod
+    @publish_mutation_result
     def async_mutate(cls, user, **data):
         try:
             presenca_id = data.pop('id')
@@ -365,6 +377,7 @@ class DeletePresencaSessaoMutation(OpenIMISMutation):
         id = graphene.Int(required=True)
 
     @classmethod
+    @publish_mutation_result
     def async_mutate(cls, user, **data):
         try:
             PresencaSessaoService.delete(data['id'], user)
@@ -403,6 +416,7 @@ class CreateExecucaoSessaoMutation(OpenIMISMutation):
         pass
 
     @classmethod
+    @publish_mutation_result
     def async_mutate(cls, user, **data):
         try:
             execucao = ExecucaoSessaoService.create(data, user)
@@ -436,6 +450,7 @@ class UpdateExecucaoSessaoMutation(OpenIMISMutation):
         pass
 
     @classmethod
+    @publish_mutation_result
     def async_mutate(cls, user, **data):
         try:
             execucao_id = data.pop('id')
@@ -473,6 +488,7 @@ class CreateSupervisaoSessaoMutation(OpenIMISMutation):
         pass
 
     @classmethod
+    @publish_mutation_result
     def async_mutate(cls, user, **data):
         try:
             supervisao = SupervisaoSessaoService.create(data, user)
@@ -502,6 +518,7 @@ class UpdateSupervisaoSessaoMutation(OpenIMISMutation):
         pass
 
     @classmethod
+    @publish_mutation_result
     def async_mutate(cls, user, **data):
         try:
             supervisao_id = data.pop('id')
@@ -537,6 +554,7 @@ class CreateEncaminhamentoMutation(OpenIMISMutation):
         pass
 
     @classmethod
+    @publish_mutation_result
     def async_mutate(cls, user, **data):
         try:
             encaminhamento = EncaminhamentoService.create(data, user)
@@ -565,6 +583,7 @@ class UpdateEncaminhamentoMutation(OpenIMISMutation):
         pass
 
     @classmethod
+    @publish_mutation_result
     def async_mutate(cls, user, **data):
         try:
             encaminhamento_id = data.pop('id')
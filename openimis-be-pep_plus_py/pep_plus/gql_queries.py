@@ -3,15 +3,21 @@ PEP+ GraphQL Queries
 Implements READ operations for all PEP+ entities
 """
 import graphene
+from django.core.exceptions import PermissionDenied
 from graphene_django import DjangoObjectType
 from core.schema import OrderedDjangoFilterConnectionField
 from core import ExtendedConnection
+from .analytics import analytics_summary
+from .apps import PepPlusConfig
 from .models import (
     ModuloEducacional, GrupoFamiliar, SessaoPEP, PresencaSessao,
     ExecucaoSessao, SupervisaoSessao, RelatorioDistritalBimestral,
     EncaminhamentoSessao
 )
 
+# Bounds the months of the analytics summary, each window is computed and cached separately
+MAX_RESUMO_MESES = 36
+
 
 class ModuloEducacionalGQLType(DjangoObjectType):
     """GraphQL Type for Educational Module"""
@@ -150,6 +156,20 @@ class EncaminhamentoSessaoGQLType(DjangoObjectType):
         connection_class = ExtendedConnection
 
 
+class ResumoAnaliticoGQLType(graphene.ObjectType):
+    """Monthly PEP+ totals, from the analytics star schema"""
+
+    periodo = graphene.Date()
+    sessoes_planeadas = graphene.Int()
+    sessoes_executadas = graphene.Int()
+    sessoes_canceladas = graphene.Int()
+    familias_esperadas = graphene.Int()
+    presentes = graphene.Int()
+    ausentes = graphene.Int()
+    justificados = graphene.Int()
+    encaminhamentos = graphene.Int()
+
+
 class Query(graphene.ObjectType):
     """Root Query for PEP+ module"""
 
@@ -209,6 +229,13 @@ class Query(graphene.ObjectType):
         orderBy=graphene.List(of_type=graphene.String)
     )
 
+    # Analytics
+    resumo_analitico = graphene.List(
+        ResumoAnaliticoGQLType,
+        distrito_id=graphene.Int(),
+        meses=graphene.Int(default_value=12),
+    )
+
     def resolve_modulos_educacionais(self, info, **kwargs):
         """Resolve educational modules query"""
         return ModuloEducacional.objects.filter(validity_to__isnull=True)
@@ -240,3 +267,9 @@ class Query(graphene.ObjectType):
     def resolve_encaminhamentos_sessao(self, info, **kwargs):
         """Resolve referrals query"""
         return EncaminhamentoSessao.objects.filter(validity_to__isnull=True)
+
+    def resolve_resumo_analitico(self, info, distrito_id=None, meses=12):
+        """Resolve the monthly analytics totals"""
+        if not info.context.user.has_perms(PepPlusConfig.gql_query_pep_sessions_perms):
+            raise PermissionDenied("User does not have permission to view the PEP+ analytics")
+        return analytics_summary(distrito_id, min(max(meses, 1), MAX_RESUMO_MESES))
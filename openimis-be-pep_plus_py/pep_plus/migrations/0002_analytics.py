@@ -0,0 +1,111 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pep_plus', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DimDistrito',
+            fields=[
+                ('id', models.AutoField(db_column='DimDistritoID', primary_key=True, serialize=False)),
+                ('distrito_id', models.IntegerField(db_column='DistritoID', unique=True)),
+                ('codigo', models.CharField(db_column='Codigo', max_length=50)),
+                ('nome', models.CharField(db_column='Nome', max_length=255)),
+                ('regiao_id', models.IntegerField(blank=True, db_column='RegiaoID', null=True)),
+                ('regiao_nome', models.CharField(blank=True, db_column='RegiaoNome', max_length=255, null=True)),
+            ],
+            options={
+                'db_table': 'tblDimDistritoPEP',
+                'managed': True,
+            },
+        ),
+        migrations.CreateModel(
+            name='DimModulo',
+            fields=[
+                ('id', models.AutoField(db_column='DimModuloID', primary_key=True, serialize=False)),
+                ('modulo_id', models.IntegerField(db_column='ModuloID', unique=True)),
+                ('codigo', models.CharField(db_column='Codigo', max_length=50)),
+                ('nome', models.CharField(db_column='Nome', max_length=255)),
+                ('ordem', models.IntegerField(db_column='Ordem', default=0)),
+            ],
+            options={
+                'db_table': 'tblDimModuloPEP',
+                'managed': True,
+            },
+        ),
+        migrations.CreateModel(
+            name='DimPeriodo',
+            fields=[
+                ('id', models.AutoField(db_column='PeriodoID', primary_key=True, serialize=False)),
+                ('data_inicio', models.DateField(db_column='DataInicio', unique=True)),
+                ('ano', models.IntegerField(db_column='Ano')),
+                ('mes', models.IntegerField(db_column='Mes')),
+                ('bimestre', models.CharField(choices=[('BIM1', '1º Bimestre (Jan-Fev)'), ('BIM2', '2º Bimestre (Mar-Abr)'), ('BIM3', '3º Bimestre (Mai-Jun)'), ('BIM4', '4º Bimestre (Jul-Ago)'), ('BIM5', '5º Bimestre (Set-Out)'), ('BIM6', '6º Bimestre (Nov-Dez)')], db_column='Bimestre', max_length=4)),
+            ],
+            options={
+                'db_table': 'tblDimPeriodoPEP',
+                'managed': True,
+            },
+        ),
+        migrations.CreateModel(
+            name='FactSessao',
+            fields=[
+                ('id', models.BigAutoField(db_column='FactSessaoID', primary_key=True, serialize=False)),
+                ('sessoes_planeadas', models.IntegerField(db_column='SessoesPlaneadas', default=0)),
+                ('sessoes_executadas', models.IntegerField(db_column='SessoesExecutadas', default=0)),
+                ('sessoes_canceladas', models.IntegerField(db_column='SessoesCanceladas', default=0)),
+                ('sessoes_supervisionadas', models.IntegerField(db_column='SessoesSupervisionadas', default=0)),
+                ('familias_esperadas', models.IntegerField(db_column='FamiliasEsperadas', default=0)),
+                ('data_atualizacao', models.DateTimeField(auto_now=True, db_column='DataAtualizacao')),
+                ('distrito', models.ForeignKey(db_column='DimDistritoID', on_delete=django.db.models.deletion.CASCADE, to='pep_plus.dimdistrito')),
+                ('modulo', models.ForeignKey(db_column='DimModuloID', on_delete=django.db.models.deletion.CASCADE, to='pep_plus.dimmodulo')),
+                ('periodo', models.ForeignKey(db_column='PeriodoID', on_delete=django.db.models.deletion.CASCADE, to='pep_plus.dimperiodo')),
+            ],
+            options={
+                'db_table': 'tblFactSessaoPEP',
+                'managed': True,
+                'unique_together': {('periodo', 'distrito', 'modulo')},
+            },
+        ),
+        migrations.CreateModel(
+            name='FactPresenca',
+            fields=[
+                ('id', models.BigAutoField(db_column='FactPresencaID', primary_key=True, serialize=False)),
+                ('presentes', models.IntegerField(db_column='Presentes', default=0)),
+                ('ausentes', models.IntegerField(db_column='Ausentes', default=0)),
+                ('justificados', models.IntegerField(db_column='Justificados', default=0)),
+                ('familias_distintas', models.IntegerField(db_column='FamiliasDistintas', default=0)),
+                ('data_atualizacao', models.DateTimeField(auto_now=True, db_column='DataAtualizacao')),
+                ('distrito', models.ForeignKey(db_column='DimDistritoID', on_delete=django.db.models.deletion.CASCADE, to='pep_plus.dimdistrito')),
+                ('modulo', models.ForeignKey(db_column='DimModuloID', on_delete=django.db.models.deletion.CASCADE, to='pep_plus.dimmodulo')),
+                ('periodo', models.ForeignKey(db_column='PeriodoID', on_delete=django.db.models.deletion.CASCADE, to='pep_plus.dimperiodo')),
+            ],
+            options={
+                'db_table': 'tblFactPresencaPEP',
+                'managed': True,
+                'unique_together': {('periodo', 'distrito', 'modulo')},
+            },
+        ),
+        migrations.CreateModel(
+            name='FactEncaminhamento',
+            fields=[
+                ('id', models.BigAutoField(db_column='FactEncaminhamentoID', primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('PEND', 'Pendente'), ('PROC', 'Em Processo'), ('CONC', 'Concluído'), ('CANC', 'Cancelado')], db_column='Status', max_length=4)),
+                ('total', models.IntegerField(db_column='Total', default=0)),
+                ('data_atualizacao', models.DateTimeField(auto_now=True, db_column='DataAtualizacao')),
+                ('distrito', models.ForeignKey(db_column='DimDistritoID', on_delete=django.db.models.deletion.CASCADE, to='pep_plus.dimdistrito')),
+                ('modulo', models.ForeignKey(db_column='DimModuloID', on_delete=django.db.models.deletion.CASCADE, to='pep_plus.dimmodulo')),
+                ('periodo', models.ForeignKey(db_column='PeriodoID', on_delete=django.db.models.deletion.CASCADE, to='pep_plus.dimperiodo')),
+            ],
+            options={
+                'db_table': 'tblFactEncaminhamentoPEP',
+                'managed': True,
+                'unique_together': {('periodo', 'distrito', 'modulo', 'status')},
+            },
+        ),
+    ]
@@ -338,3 +338,126 @@ class EncaminhamentoSessao(core_models.VersionedModel):
 
     def __str__(self):
         return f"{self.codigo_encaminhamento} - {self.nome_familia}"
+
+
+# Analytics star schema
+# Stored in the dashboard_db database when it is configured (see PepPlusConfig.dashboard_db_models) and filled by
+# analytics.refresh_analytics, so the dashboards never query the transactional tables. The dimensions keep the ids
+# of the transactional rows instead of foreign keys since both may live in different databases.
+
+class DimPeriodo(models.Model):
+    """
+    Period dimension - one row per month
+    """
+    id = models.AutoField(db_column='PeriodoID', primary_key=True)
+    data_inicio = models.DateField(db_column='DataInicio', unique=True)
+    ano = models.IntegerField(db_column='Ano')
+    mes = models.IntegerField(db_column='Mes')
+    bimestre = models.CharField(db_column='Bimestre', max_length=4,
+                                choices=RelatorioDistritalBimestral.PERIODO_CHOICES)
+
+    class Meta:
+        managed = True
+        db_table = 'tblDimPeriodoPEP'
+
+    def __str__(self):
+        return f"{self.ano}-{self.mes:02d}"
+
+
+class DimDistrito(models.Model):
+    """
+    District dimension, with its region for the national roll-ups
+    """
+    id = models.AutoField(db_column='DimDistritoID', primary_key=True)
+    distrito_id = models.IntegerField(db_column='DistritoID', unique=True)
+    codigo = models.CharField(db_column='Codigo', max_length=50)
+    nome = models.CharField(db_column='Nome', max_length=255)
+    regiao_id = models.IntegerField(db_column='RegiaoID', null=True, blank=True)
+    regiao_nome = models.CharField(db_column='RegiaoNome', max_length=255, null=True, blank=True)
+
+    class Meta:
+        managed = True
+        db_table = 'tblDimDistritoPEP'
+
+    def __str__(self):
+        return f"{self.codigo} - {self.nome}"
+
+
+class DimModulo(models.Model):
+    """
+    Educational module dimension
+    """
+    id = models.AutoField(db_column='DimModuloID', primary_key=True)
+    modulo_id = models.IntegerField(db_column='ModuloID', unique=True)
+    codigo = models.CharField(db_column='Codigo', max_length=50)
+    nome = models.CharField(db_column='Nome', max_length=255)
+    ordem = models.IntegerField(db_column='Ordem', default=0)
+
+    class Meta:
+        managed = True
+        db_table = 'tblDimModuloPEP'
+
+    def __str__(self):
+        return f"{self.codigo} - {self.nome}"
+
+
+class FactSessao(models.Model):
+    """
+    Sessions per period, district and module
+    """
+    id = models.BigAutoField(db_column='FactSessaoID', primary_key=True)
+    periodo = models.ForeignKey(DimPeriodo, db_column='PeriodoID', on_delete=models.CASCADE)
+    distrito = models.ForeignKey(DimDistrito, db_column='DimDistritoID', on_delete=models.CASCADE)
+    modulo = models.ForeignKey(DimModulo, db_column='DimModuloID', on_delete=models.CASCADE)
+
+    sessoes_planeadas = models.IntegerField(db_column='SessoesPlaneadas', default=0)
+    sessoes_executadas = models.IntegerField(db_column='SessoesExecutadas', default=0)
+    sessoes_canceladas = models.IntegerField(db_column='SessoesCanceladas', default=0)
+    sessoes_supervisionadas = models.IntegerField(db_column='SessoesSupervisionadas', default=0)
+    familias_esperadas = models.IntegerField(db_column='FamiliasEsperadas', default=0)
+    data_atualizacao = models.DateTimeField(db_column='DataAtualizacao', auto_now=True)
+
+    class Meta:
+        managed = True
+        db_table = 'tblFactSessaoPEP'
+        unique_together = [['periodo', 'distrito', 'modulo']]
+
+
+class FactPresenca(models.Model):
+    """
+    Attendance per period, district and module
+    """
+    id = models.BigAutoField(db_column='FactPresencaID', primary_key=True)
+    periodo = models.ForeignKey(DimPeriodo, db_column='PeriodoID', on_delete=models.CASCADE)
+    distrito = models.ForeignKey(DimDistrito, db_column='DimDistritoID', on_delete=models.CASCADE)
+    modulo = models.ForeignKey(DimModulo, db_column='DimModuloID', on_delete=models.CASCADE)
+
+    presentes = models.IntegerField(db_column='Presentes', default=0)
+    ausentes = models.IntegerField(db_column='Ausentes', default=0)
+    justificados = models.IntegerField(db_column='Justificados', default=0)
+    familias_distintas = models.IntegerField(db_column='FamiliasDistintas', default=0)
+    data_atualizacao = models.DateTimeField(db_column='DataAtualizacao', auto_now=True)
+
+    class Meta:
+        managed = True
+        db_table = 'tblFactPresencaPEP'
+        unique_together = [['periodo', 'distrito', 'modulo']]
+
+
+class FactEncaminhamento(models.Model):
+    """
+    Referrals per period (of the session), district, module and status
+    """
+    id = models.BigAutoField(db_column='FactEncaminhamentoID', primary_key=True)
+    periodo = models.ForeignKey(DimPeriodo, db_column='PeriodoID', on_delete=models.CASCADE)
+    distrito = models.ForeignKey(DimDistrito, db_column='DimDistritoID', on_delete=models.CASCADE)
+    modulo = models.ForeignKey(DimModulo, db_column='DimModuloID', on_delete=models.CASCADE)
+    status = models.CharField(db_column='Status', max_length=4, choices=EncaminhamentoSessao.STATUS_CHOICES)
+
+    total = models.IntegerField(db_column='Total', default=0)
+    data_atualizacao = models.DateTimeField(db_column='DataAtualizacao', auto_now=True)
+
+    class Meta:
+        managed = True
+        db_table = 'tblFactEncaminhamentoPEP'
+        unique_together = [['periodo', 'distrito', 'modulo', 'status']]
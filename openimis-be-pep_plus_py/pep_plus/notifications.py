@@ -0,0 +1,81 @@
+"""
+PEP+ Notifications
+Pushes mutation results and session status changes to the websocket clients (see consumers.py)
+through the channel layer configured by CHANNELS_BACKEND.
+"""
+import functools
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+EVENT_TYPE = "pep_plus.event"
+# Session status changes of all the districts, for the users who have rights on every district (administrators)
+ALL_DISTRICTS_SESSIONS_GROUP = "pep_plus.sessions.all"
+
+
+def user_group(user_id):
+    """Group receiving the mutation results of a single user"""
+    return f"pep_plus.user.{user_id}"
+
+
+def district_sessions_group(district_id):
+    """Group receiving the session status changes of a single district"""
+    return f"pep_plus.sessions.district.{district_id}"
+
+
+def _group_send(group, payload):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        # No CHANNEL_LAYERS configured, nobody can be listening
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(group, {"type": EVENT_TYPE, "payload": payload})
+    except Exception as exc:
+        logger.warning(f"Failed to publish PEP+ event to {group}: {exc}")
+
+
+def publish_mutation_result(async_mutate):
+    """
+    Decorates the async_mutate of PEP+ mutations to notify the user once the mutation is processed.
+    async_mutate is called both by the synchronous mutations and by the celery worker, so the notification is
+    sent in both cases.
+    """
+    @functools.wraps(async_mutate)
+    def wrapper(cls, user, **data):
+        errors = async_mutate(cls, user, **data)
+        if user is not None:
+            payload = {
+                "event": "mutation",
+                "clientMutationId": data.get("client_mutation_id"),
+                "mutationClass": cls._mutation_class,
+                "status": "ERROR" if errors else "SUCCESS",
+                "errors": [error.get("message") for error in errors or [] if isinstance(error, dict)],
+            }
+            group = user_group(user.id)
+            transaction.on_commit(lambda: _group_send(group, payload))
+        return errors
+
+    return wrapper
+
+
+def publish_session_status_change(sessao, previous_status):
+    payload = {
+        "event": "sessionStatus",
+        "id": sessao.id,
+        "uuid": str(sessao.uuid),
+        "codigoSessao": sessao.codigo_sessao,
+        "distritoId": sessao.distrito_id,
+        "previousStatus": previous_status,
+        "status": sessao.status,
+    }
+    groups = (district_sessions_group(sessao.distrito_id), ALL_DISTRICTS_SESSIONS_GROUP)
+
+    def send():
+        for group in groups:
+            _group_send(group, payload)
+
+    transaction.on_commit(send)
@@ -0,0 +1,11 @@
+"""
+PEP+ Websocket routing
+Discovered by openIMIS.asgi through websocket_urlpatterns
+"""
+from django.urls import path
+
+from .consumers import PepPlusEventsConsumer
+
+websocket_urlpatterns = [
+    path("pep_plus/events/", PepPlusEventsConsumer.as_asgi()),
+]
@@ -0,0 +1,19 @@
+"""
+PEP+ Scheduled tasks
+Registered by apscheduler_runner when the scheduler starts
+"""
+from .apps import PepPlusConfig
+
+
+def schedule_tasks(scheduler):
+    scheduler.add_job(
+        "pep_plus.analytics:refresh_analytics",
+        trigger="interval",
+        minutes=PepPlusConfig.analytics_etl_interval_minutes,
+        id="pep_plus_refresh_analytics",
+        # a process of its own when SCHEDULER_PROCESS_POOL_WORKERS is set, threads otherwise
+        executor="processpool",
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+    )
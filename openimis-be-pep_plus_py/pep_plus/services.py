@@ -10,6 +10,7 @@ from .models import (
     ExecucaoSessao, SupervisaoSessao, RelatorioDistritalBimestral,
     EncaminhamentoSessao
 )
+from .notifications import publish_session_status_change
 from .validations import (
     validate_sessao_planeamento, validate_presenca_sessao,
     validate_execucao_sessao, validate_supervisao_sessao,
@@ -216,6 +217,7 @@ class SessaoPEPService(BaseService):
         if errors:
             raise ValidationError(errors)
 
+        previous_status = sessao.status
         with transaction.atomic():
             sessao.coordenador_distrital_id = data.get('coordenador_distrital_id', sessao.coordenador_distrital_id)
             sessao.tecnico_social_id = data.get('tecnico_social_id', sessao.tecnico_social_id)
@@ -235,6 +237,8 @@ class SessaoPEPService(BaseService):
             sessao.status = data.get('status', sessao.status)
             sessao.audit_user_id = user.id_for_audit
             sessao.save()
+            if sessao.status != previous_status:
+                publish_session_status_change(sessao, previous_status)
             return sessao
 
     @classmethod
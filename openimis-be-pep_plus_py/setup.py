@@ -19,6 +19,7 @@ setup(
     author='openIMIS Team',
     author_email='info@openimis.org',
     install_requires=[
+        'channels',
         'django',
         'django-db-signals',
         'djangorestframework',
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+"""
+Measure the Celery task round trip of a CELERY_MODE: the time to enqueue a task, the time from its enqueue to its
+result one task at a time (latency), and the throughput of --tasks tasks enqueued at once, of a --task:
+- echo: returns the length of a --payload bytes argument (a bulk job payload)
+- mutation: shaped like core's openimis_mutation_async, a JSON mutation input (with a --payload bytes field) parsed
+  and written to the database in a transaction, which is rolled back so the benchmark leaves no rows
+
+The local and broker modes run a worker in this process (--concurrency threads). Their results are stored in a
+temporary folder unless CELERY_RESULT_BACKEND is set.
+
+Usage, from the openIMIS folder:
+    python ../script/celery_benchmark.py [--mode local] [--task echo] [--tasks 200] [--payload 1000] [--concurrency 4]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--mode", choices=("eager", "local", "broker"), default=os.environ.get("CELERY_MODE", "local"))
+parser.add_argument("--task", choices=("echo", "mutation"), default="echo")
+parser.add_argument("--tasks", type=int, default=200)
+parser.add_argument("--latency-runs", type=int, default=50)
+parser.add_argument("--payload", type=int, default=1000)
+parser.add_argument("--concurrency", type=int, default=4)
+args = parser.parse_args()
+
+sys.path.insert(0, os.getcwd())
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "openIMIS.settings")
+os.environ["SCHEDULER_AUTOSTART"] = "False"
+os.environ["CELERY_MODE"] = args.mode
+if args.mode == "local":
+    os.environ.setdefault("CELERY_LOCAL_DIR", tempfile.mkdtemp(prefix="openimis-celery-"))
+if args.mode != "eager":
+    os.environ.setdefault("CELERY_RESULT_BACKEND", f"file://{tempfile.mkdtemp(prefix='openimis-celery-results-')}")
+
+import django  # noqa: E402
+
+django.setup()
+
+from celery.contrib.testing.worker import start_worker  # noqa: E402
+from django.contrib.auth.models import Group  # noqa: E402
+from django.db import transaction  # noqa: E402
+
+from openIMIS.celery import app  # noqa: E402
+
+
+@app.task(name="openIMIS.celery_benchmark.echo")
+def echo(payload):
+    return len(payload)
+
+
+@app.task(name="openIMIS.celery_benchmark.mutation")
+def mutation(mutation_json):
+    data = json.loads(mutation_json)
+    with transaction.atomic():
+        group = Group.objects.create(name=data["clientMutationId"])
+        Group.objects.filter(id=group.id).update(name=data["input"]["name"][:150])
+        transaction.set_rollback(True)
+    return len(mutation_json)
+
+
+def mutation_payload(index, payload):
+    return json.dumps({
+        "clientMutationId": f"celery-benchmark-{os.getpid()}-{index}-{time.perf_counter_ns()}",
+        "clientMutationLabel": "Celery benchmark",
+        "input": {"name": payload},
+    })
+
+
+def measure(payload):
+    task = mutation if args.task == "mutation" else echo
+    if args.task == "mutation":
+        payloads = [mutation_payload(index, payload) for index in range(args.latency_runs + args.tasks)]
+    else:
+        payloads = [payload] * (args.latency_runs + args.tasks)
+    enqueue_timings = []
+    latencies = []
+    for index in range(args.latency_runs):
+        start = time.perf_counter()
+        result = task.delay(payloads[index])
+        enqueue_timings.append(time.perf_counter() - start)
+        assert result.get(timeout=30, interval=0.005) == len(payloads[index])
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    results = [task.delay(task_payload) for task_payload in payloads[args.latency_runs:]]
+    for result in results:
+        result.get(timeout=60, interval=0.005)
+    throughput = args.tasks / (time.perf_counter() - start)
+    return statistics.median(enqueue_timings) * 1000, statistics.median(latencies) * 1000, throughput
+
+
+if __name__ == "__main__":
+    payload = "x" * args.payload
+    if args.mode == "eager":
+        enqueue_ms, latency_ms, throughput = measure(payload)
+    else:
+        with start_worker(app, pool="threads", concurrency=args.concurrency, perform_ping_check=False):
+            enqueue_ms, latency_ms, throughput = measure(payload)
+
+    print(f"CELERY_MODE={args.mode}, {args.task} task, {args.payload} bytes payload, broker {app.conf.broker_url}")
+    print(f"{'enqueue (median)':>20}: {enqueue_ms:8.2f}ms")
+    print(f"{'round trip (median)':>20}: {latency_ms:8.2f}ms")
+    workers = "in this thread" if args.mode == "eager" else f"{args.concurrency} worker threads"
+    print(f"{'throughput':>20}: {throughput:8.0f} tasks/s ({args.tasks} tasks, {workers})")
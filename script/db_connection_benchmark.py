@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+"""
+Measure the latency of short requests against the default database with and without persistent connections.
+
+Each simulated request goes through Django's request_started/request_finished signals (which open, health check
+and close the connections according to CONN_MAX_AGE) and runs a single SELECT 1.
+
+Usage, from the openIMIS folder with the usual DB_* environment variables:
+    python ../script/db_connection_benchmark.py [--requests 500] [--threads 4] [--max-age 0 60]
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.getcwd())
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "openIMIS.settings")
+os.environ["SCHEDULER_AUTOSTART"] = "False"
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.signals import request_finished, request_started  # noqa: E402
+from django.db import connection, connections  # noqa: E402
+
+
+def simulate_requests(count, max_age, latencies):
+    connection.settings_dict["CONN_MAX_AGE"] = max_age
+    for _ in range(count):
+        start = time.perf_counter()
+        request_started.send(sender=None)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+        request_finished.send(sender=None)
+        latencies.append((time.perf_counter() - start) * 1000)
+    connections.close_all()
+
+
+def run(requests, threads, max_age):
+    latencies = []
+    workers = [
+        threading.Thread(target=simulate_requests, args=(requests // threads, max_age, latencies))
+        for _ in range(threads)
+    ]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    print(
+        f"CONN_MAX_AGE={max_age!s:>5} requests={len(latencies)} throughput={len(latencies) / elapsed:8.1f}/s "
+        f"mean={statistics.mean(latencies):7.2f}ms p50={latencies[len(latencies) // 2]:7.2f}ms "
+        f"p95={latencies[int(len(latencies) * 0.95)]:7.2f}ms"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--max-age", nargs="+", default=["0", "60"],
+                        help="CONN_MAX_AGE values to compare, 'None' for unlimited")
+    args = parser.parse_args()
+
+    print(f"{connection.vendor} {connection.settings_dict['HOST']}:{connection.settings_dict['PORT']}, "
+          f"health checks {connection.settings_dict.get('CONN_HEALTH_CHECKS')}")
+    for value in args.max_age:
+        run(args.requests, args.threads, None if value.lower() == "none" else int(value))
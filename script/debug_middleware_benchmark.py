@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+"""
+Measure the overhead of graphene_django's DjangoDebugMiddleware on a large connection-like result: a list of --items
+objects with --fields scalar fields each, loaded with --statements SQL statements, with the GRAPHENE["MIDDLEWARE"] of the
+settings.
+
+Compares the execution with the configured middlewares (what the GraphQL view runs when _debug isn't selected) and with
+DjangoDebugMiddleware added (what every operation used to run, it also records every SQL statement).
+
+Usage, from the openIMIS folder:
+    python ../script/debug_middleware_benchmark.py [--items 100] [--fields 20] [--runs 50] [--statements 50]
+"""
+import argparse
+
+from graphql_benchmark import build_schema, measure  # Sets Django up
+
+from graphene_django.debug import DjangoDebugMiddleware  # noqa: E402
+from graphene_django.settings import graphene_settings  # noqa: E402
+from graphene_django.views import instantiate_middleware  # noqa: E402
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--fields", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--statements", type=int, default=50)
+    args = parser.parse_args()
+
+    schema, query = build_schema(args.fields, statements=args.statements)
+    variables = {"count": args.items}
+    resolved_fields = args.items * args.fields + 1
+    middleware = [
+        middleware for middleware in instantiate_middleware(graphene_settings.MIDDLEWARE)
+        if not isinstance(middleware, DjangoDebugMiddleware)
+    ]
+
+    without_debug = measure(schema, query, variables, args.runs, middleware)
+    with_debug = measure(schema, query, variables, args.runs, middleware + [DjangoDebugMiddleware()])
+    overhead_us = (with_debug - without_debug) * 1000 / resolved_fields
+
+    print(f"{resolved_fields} resolved fields, {args.statements} SQL statements, best of {args.runs} runs")
+    print(f"{'configured middlewares':>32}: {without_debug:8.2f}ms")
+    print(
+        f"{'with DjangoDebugMiddleware':>32}: {with_debug:8.2f}ms "
+        f"({with_debug - without_debug:+.2f}ms per operation, {overhead_us:+.2f}us per field)"
+    )
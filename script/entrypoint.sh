@@ -6,8 +6,9 @@ show_help() {
   Commands
   ---------------------------------------------------------------
 
-  start            : start django
-  worker           : start Celery worker
+  start            : start django (waitress, or gunicorn workers with SERVER_ENGINE=gunicorn)
+  worker           : start Celery worker, consuming CELERY_WORKER_QUEUES (default: interactive,bulk,reports)
+  scheduler        : run the scheduled jobs (manage.py run_scheduler), with SCHEDULER_DEDICATED=True for the others
   start_asgi       : use daphne -b ASGI_IP:WSGI_PORT -p SERVER_PORT  ASGI_APPLICATION
   start_wsgi       : use gunicorn -b WSGI_IP:WSGI_PORT -w WSGI_WORKERS WSGI_APPLICATION
   manage           : run django manage.py
@@ -117,7 +118,11 @@ case "$1" in
   "worker" )
     echo "Starting Celery with url ${CELERY_BROKER_URL} ${DB_NAME}..."
     echo "Settings module: $DJANGO_SETTINGS_MODULE"
-    celery -A openIMIS worker --loglevel=DEBUG
+    celery -A openIMIS worker --loglevel=DEBUG -Q "${CELERY_WORKER_QUEUES:-interactive,bulk,reports}"
+  ;;
+  "scheduler" )
+    echo "Starting the scheduler..."
+    python manage.py run_scheduler
   ;;
   "manage" )
     ./manage.py "${@:2}"
@@ -0,0 +1,70 @@
+"""
+Shared setup of the GraphQL middleware benchmarks (debug_middleware_benchmark.py, resolver_tracing_benchmark.py): a
+connection-like schema and the timing of its execution with the middlewares set up as openIMIS.views.GraphQLView does.
+
+Importing it sets Django up with the openIMIS settings, the benchmarks are run from the openIMIS folder.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.getcwd())
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "openIMIS.settings")
+os.environ["SCHEDULER_AUTOSTART"] = "False"
+
+import django  # noqa: E402
+
+django.setup()
+
+import graphene  # noqa: E402
+from django.contrib.auth.models import AnonymousUser  # noqa: E402
+from django.db import connection  # noqa: E402
+
+from openIMIS.views import middleware_manager  # noqa: E402
+
+
+def build_schema(fields, statements=0, computed=False):
+    """
+    A Query with a list of items of `fields` scalar fields, loaded with `statements` SQL statements. With `computed`,
+    the items also have a field with a custom resolver.
+    """
+    field_names = [f"field{index}" for index in range(fields)]
+    attributes = {name: graphene.String() for name in field_names}
+    selection = list(field_names)
+    if computed:
+        attributes["computed"] = graphene.String()
+        attributes["resolve_computed"] = lambda root, info: root["field0"].upper()
+        selection.append("computed")
+    Item = type("Item", (graphene.ObjectType,), attributes)
+
+    class Query(graphene.ObjectType):
+        items = graphene.List(Item, count=graphene.Int())
+
+        def resolve_items(self, info, count):
+            if statements:
+                with connection.cursor() as cursor:
+                    for index in range(statements):
+                        cursor.execute("SELECT %s", [index])
+            return [{name: f"value {item}" for name in field_names} for item in range(count)]
+
+    query = "query Items($count: Int) { items(count: $count) { %s } }" % " ".join(selection)
+    return graphene.Schema(query=Query), query
+
+
+class Context:
+    user = AnonymousUser()
+    COOKIES = {}
+    META = {}
+
+
+def measure(schema, query, variables, runs, middleware):
+    """The fastest execution in milliseconds, the fastest run is the least disturbed by the other processes"""
+    middleware = middleware_manager(middleware)
+    schema.execute(query, variables=variables, context_value=Context(), middleware=middleware)  # warm up
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = schema.execute(query, variables=variables, context_value=Context(), middleware=middleware)
+        timings.append(time.perf_counter() - start)
+        assert not result.errors, result.errors
+    return min(timings) * 1000
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+"""
+Measure the overhead of openIMIS.tracer.TracerMiddleware on a large connection-like result: a list of --items
+objects with --fields scalar fields and one field with a custom resolver each.
+
+Compares the execution without middleware, with the middleware and no tracer backend (the production default
+without Sentry), and with the memory backend at 100% and --sample-rate head sampling. The budget is the maximum
+accepted overhead of the middleware without backend, in microseconds per resolved field.
+
+Usage, from the openIMIS folder:
+    python ../script/resolver_tracing_benchmark.py [--items 100] [--fields 20] [--runs 50] [--budget-us 2]
+"""
+import argparse
+import sys
+
+from graphql_benchmark import build_schema, measure
+from openIMIS import tracer
+from openIMIS.tracer_backends import MemoryBackend
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--fields", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--sample-rate", type=float, default=0.1)
+    parser.add_argument("--budget-us", type=float, default=2.0)
+    args = parser.parse_args()
+
+    schema, query = build_schema(args.fields, computed=True)
+    variables = {"count": args.items}
+    resolved_fields = args.items * (args.fields + 1) + 1
+
+    tracer.BACKENDS = []
+    baseline = measure(schema, query, variables, args.runs, [])
+    results = {"no backend": measure(schema, query, variables, args.runs, [tracer.TracerMiddleware()])}
+    tracer.BACKENDS = [MemoryBackend(100000)]
+    results["memory backend"] = measure(schema, query, variables, args.runs, [tracer.TracerMiddleware()])
+    tracer.GRAPHQL_TRACE_SAMPLE_RATE = args.sample_rate
+    results[f"memory backend, {args.sample_rate:.0%} sampled"] = measure(
+        schema, query, variables, args.runs, [tracer.TracerMiddleware()]
+    )
+
+    print(f"{resolved_fields} resolved fields, best of {args.runs} runs")
+    print(f"{'without middleware':>32}: {baseline:8.2f}ms")
+    for name, duration in results.items():
+        overhead_us = (duration - baseline) * 1000 / resolved_fields
+        print(f"{name:>32}: {duration:8.2f}ms ({overhead_us:+.2f}us per field)")
+
+    overhead_us = (results["no backend"] - baseline) * 1000 / resolved_fields
+    if overhead_us > args.budget_us:
+        sys.exit(f"Tracing overhead without backend is {overhead_us:.2f}us per field, over the {args.budget_us}us budget")